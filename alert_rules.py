@@ -0,0 +1,312 @@
+"""指标提醒规则引擎 (代替各脚本里写死的 print 提醒)
+
+规则是一行文本: <对象> <指标>[窗口] <比较符> <阈值>[%]，例如
+    BTC-USD bias > 60%          乖离率 (相对 MA200) 超过 60%
+    NVDA rsi14 < 30             14 日 RSI 低于 30
+    ^GSPC drawdown < -20%       距历史最高点回撤超过 20%
+    ETH-USD change7 < -15%      7 日涨跌幅
+    portfolio drawdown < -15%   整个账户净值 (市值 / 累计投入) 的回撤
+
+- 编译: 按对象分组，同一对象的规则共用一次指标计算，所有阈值用一次 numpy 比较完成
+- 增量: 记录每个对象上次评估时的最后一根 K 线，没有新 K 线 (且没有新规则) 的对象直接跳过
+- 边沿触发: 条件从 "不满足" 变为 "满足" 时才推送一次，持续满足不重复推送，恢复后再次满足会重新提醒；
+  推送成功后才把规则记为已触发 (推送失败下次重试)，--dry-run 不改动状态文件
+
+命令行 (适合放进 crontab): python alert_rules.py [--rules alert_rules.txt] [--dry-run]
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+import bark
+import portfolio_store
+import price_store
+from xirr_solver import holdings_value_curve
+
+# --- 配置区域 ---
+RULES_PATH = os.environ.get("ALERT_RULES", "alert_rules.txt")
+STATE_PATH = os.path.join(price_store.STORE_DIR, "alerts_state.json")
+PORTFOLIO = 'portfolio'  # 规则里表示整个账户的对象名
+FX_TICKER = "CNY=X"
+
+# 没有规则文件时使用: 与 crypto_analysis / Dashboard 里原来写死的提醒阈值一致
+DEFAULT_RULES = [
+    "BTC-USD bias > 60%",
+    "BTC-USD drawdown < -50%",
+    "ETH-USD bias > 80%",
+    "ETH-USD drawdown < -60%",
+    "^GSPC rsi14 > 70",
+    "^GSPC rsi14 < 30",
+    "portfolio drawdown < -15%",
+]
+
+# 指标名 -> (说明, 默认窗口)；窗口为 None 的指标不接受数字后缀
+INDICATORS = {
+    'close': ('收盘价', None),
+    'ma200': ('MA200', None),
+    'bias': ('乖离率', None),
+    'drawdown': ('回撤', None),
+    'rsi': ('RSI', 14),
+    'change': ('涨跌幅', 1),
+}
+PORTFOLIO_INDICATORS = {'value', 'profit', 'drawdown', 'change'}
+PORTFOLIO_NAMES = {'value': '账户市值', 'profit': '浮盈比例'}
+PERCENT_INDICATORS = {'bias', 'drawdown', 'change', 'profit'}
+
+_RULE_RE = re.compile(r'^\s*(\S+)\s+([a-zA-Z]+)(\d*)\s*(>=|<=|>|<)\s*([-+]?\d*\.?\d+)\s*(%?)\s*$')
+
+
+# --- 编译 ---
+def parse_rule(text):
+    """解析一行规则，返回规则 dict；格式不对时抛 ValueError"""
+    m = _RULE_RE.match(text)
+    if not m:
+        raise ValueError(f"无法解析的规则: {text!r} (格式: <代码> <指标> <比较符> <阈值>，如 'NVDA rsi14 < 30')")
+    target, indicator, window, op, value, percent = m.groups()
+    target = PORTFOLIO if target.lower() == PORTFOLIO else target.upper()
+    indicator = indicator.lower()
+    if target == PORTFOLIO:
+        if indicator not in PORTFOLIO_INDICATORS:
+            raise ValueError(f"账户规则只支持: {', '.join(sorted(PORTFOLIO_INDICATORS))} ({text!r})")
+        default_window = 1 if indicator == 'change' else None
+    elif indicator not in INDICATORS:
+        raise ValueError(f"未知的指标: {indicator} (可选 {', '.join(INDICATORS)})")
+    else:
+        default_window = INDICATORS[indicator][1]
+    if window and default_window is None:
+        raise ValueError(f"指标 {indicator} 不接受窗口参数 ({text!r})")
+    threshold = float(value) / 100 if percent else float(value)
+    return {
+        'id': f"{target} {indicator}{window} {op} {value}{percent}",  # 规范化后的文本，作为状态的 key
+        'target': target,
+        'indicator': indicator,
+        'window': int(window) if window else default_window,
+        'op': op,
+        'threshold': threshold,
+    }
+
+
+def compile_rules(lines):
+    """多行规则 -> {对象: 规则列表}；空行和 # 开头的注释忽略"""
+    plan = {}
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if line:
+            rule = parse_rule(line)
+            plan.setdefault(rule['target'], []).append(rule)
+    return plan
+
+
+def load_rules(path=None):
+    path = path or RULES_PATH
+    if not os.path.exists(path):
+        return compile_rules(DEFAULT_RULES)
+    with open(path, encoding="utf-8") as f:
+        return compile_rules(f.readlines())
+
+
+# --- 指标 (只取最新一根 K 线上的值) ---
+def _latest_ticker_values(daily, specs):
+    """在日线尾部计算各指标的最新值；RSI / 涨跌幅只需要最后 窗口+1 根，不用整段重算"""
+    close = daily['Close'].dropna()
+    out = {}
+    for indicator, window in specs:
+        if indicator == 'close':
+            v = close.iloc[-1]
+        elif indicator in ('ma200', 'bias', 'drawdown'):
+            v = daily[{'ma200': 'MA200', 'bias': 'Bias', 'drawdown': 'Drawdown'}[indicator]].iloc[-1]
+        elif indicator == 'rsi':
+            delta = close.iloc[-(window + 1):].diff().iloc[1:]
+            gain, loss = delta.clip(lower=0).mean(), (-delta.clip(upper=0)).mean()
+            v = np.nan if len(delta) < window else (100.0 if loss == 0 else 100 - 100 / (1 + gain / loss))
+        else:  # change
+            v = close.iloc[-1] / close.iloc[-(window + 1)] - 1 if len(close) > window else np.nan
+        out[(indicator, window)] = float(v)
+    return out
+
+
+def portfolio_curve(portfolio=portfolio_store.DEFAULT_PORTFOLIO, refresh=True):
+    """账户每日市值 (CNY) 与累计投入，返回 DataFrame: value / invested / nav (= value / invested)"""
+    trades = portfolio_store.load_trades(portfolio).dropna(subset=['Cost_CNY'])
+    if trades.empty:
+        return pd.DataFrame(columns=['value', 'invested', 'nav'])
+    tickers = trades['Ticker'].unique().tolist()
+    prices = price_store.load_close_panel(tickers, 'max', basis='price', refresh=refresh)
+    fx = price_store.load_bars(FX_TICKER, 'max', resolution='1d', refresh=refresh)
+    fx = fx['Close'] if not fx.empty else 7.2
+    start = pd.to_datetime(trades['Date']).min()
+    value = holdings_value_curve(trades, prices[prices.index >= start], fx)
+    invested = trades.assign(Date=pd.to_datetime(trades['Date']).dt.normalize()).groupby('Date')['Cost_CNY'].sum()
+    invested = invested.cumsum().reindex(value.index.union(invested.index)).ffill().reindex(value.index)
+    out = pd.DataFrame({'value': value, 'invested': invested}).dropna()
+    out['nav'] = out['value'] / out['invested']
+    return out
+
+
+def _latest_portfolio_values(curve, specs):
+    out = {}
+    nav = curve['nav']
+    for indicator, window in specs:
+        if indicator == 'value':
+            v = curve['value'].iloc[-1]
+        elif indicator == 'profit':
+            v = nav.iloc[-1] - 1
+        elif indicator == 'drawdown':
+            # 净值 (市值 / 累计投入) 的回撤: 定投追加的资金不会被当成 "上涨"
+            v = nav.iloc[-1] / nav.cummax().iloc[-1] - 1
+        else:
+            v = nav.iloc[-1] / nav.iloc[-(window + 1)] - 1 if len(nav) > window else np.nan
+        out[(indicator, window)] = float(v)
+    return out
+
+
+def check(rules, values):
+    """一个对象的全部规则一次向量化比较，返回每条规则是否满足 (NaN 视为不满足)"""
+    v = np.array([values[(r['indicator'], r['window'])] for r in rules], dtype=float)
+    thr = np.array([r['threshold'] for r in rules], dtype=float)
+    ops = np.array([r['op'] for r in rules])
+    # 统一成 "大于" 比较: a < b 等价于 -a > -b
+    sign = np.where(np.isin(ops, ['>', '>=']), 1.0, -1.0)
+    strict = np.isin(ops, ['>', '<'])
+    with np.errstate(invalid='ignore'):
+        hit = np.where(strict, sign * v > sign * thr, sign * v >= sign * thr)
+    return hit & ~np.isnan(v), v
+
+
+# --- 状态 ---
+def _read_state(path=None):
+    try:
+        with open(path or STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'bars': {}, 'rules': {}}
+
+
+def _write_state(state, path=None):
+    path = path or STATE_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def format_value(rule, value):
+    if rule['indicator'] in PERCENT_INDICATORS:
+        return f"{value:+.2%}"
+    if rule['indicator'] == 'value':
+        return f"¥{value:,.0f}"
+    return f"{value:,.2f}"
+
+
+def describe(rule):
+    name = PORTFOLIO_NAMES.get(rule['indicator']) or INDICATORS.get(rule['indicator'], (rule['indicator'],))[0]
+    if rule['indicator'] in ('rsi', 'change'):
+        name = f"{rule['window']}日{name}"
+    target = "我的账户" if rule['target'] == PORTFOLIO else rule['target']
+    thr = f"{rule['threshold']:.0%}" if rule['indicator'] in PERCENT_INDICATORS else f"{rule['threshold']:g}"
+    return f"{target} {name} {rule['op']} {thr}"
+
+
+def evaluate(plan, refresh=True, state_path=None, dry_run=False):
+    """评估所有有新 K 线的对象，返回本次新触发的提醒列表 (规则 + 当前值 + K 线日期)
+
+    没触发的规则直接保存状态 (dry_run 时不保存)；新触发的规则要等推送成功后由 mark_fired 保存，
+    在那之前所属对象的 K 线也不记为已评估，推送失败时下次运行会再次触发。
+    """
+    state = _read_state(state_path)
+    fired = []
+    curve = None
+    for target, rules in plan.items():
+        try:
+            if target == PORTFOLIO:
+                curve = portfolio_curve(refresh=refresh)
+                if curve.empty:
+                    continue
+                # 账本变化 (新增交易) 也算 "新数据"
+                bar = f"{curve.index[-1].date()}|{curve['invested'].iloc[-1]:.2f}"
+            else:
+                daily = price_store.load_bars(target, 'max', resolution='1d', refresh=refresh)
+                if daily.empty:
+                    print(f"⚠️ {target} 没有数据，跳过")
+                    continue
+                bar = str(daily.index[-1].date())
+        except Exception as e:
+            print(f"⚠️ {target} 数据获取失败: {e}")
+            continue
+
+        known = all(r['id'] in state['rules'] for r in rules)
+        if state['bars'].get(target) == bar and known:
+            continue  # 没有新 K 线，结果不会变
+
+        specs = list(dict.fromkeys((r['indicator'], r['window']) for r in rules))
+        if target == PORTFOLIO:
+            values = _latest_portfolio_values(curve, specs)
+        else:
+            values = _latest_ticker_values(daily, specs)
+        hits, current = check(rules, values)
+        pending = False
+        for rule, hit, v in zip(rules, hits, current):
+            prev = state['rules'].get(rule['id'], {}).get('active', False)
+            entry = {'active': bool(hit), 'value': None if np.isnan(v) else float(v), 'bar': bar.split('|')[0]}
+            if hit and not prev:
+                entry['fired_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+                fired.append({'rule': rule, 'value': v, 'bar': entry['bar'], 'key': bar, 'entry': entry})
+                pending = True
+                continue
+            if 'fired_at' in state['rules'].get(rule['id'], {}):
+                entry['fired_at'] = state['rules'][rule['id']]['fired_at']
+            state['rules'][rule['id']] = entry
+        if not pending:
+            state['bars'][target] = bar
+
+    if not dry_run:
+        _write_state(state, state_path)
+    return fired
+
+
+def mark_fired(fired, state_path=None):
+    """推送成功后把新触发的规则记为已触发 (持续满足期间不再重复推送)"""
+    if not fired:
+        return
+    state = _read_state(state_path)
+    for f in fired:
+        state['rules'][f['rule']['id']] = f['entry']
+        state['bars'][f['rule']['target']] = f['key']
+    _write_state(state, state_path)
+
+
+def notify(fired):
+    """把本次触发的提醒合并成一条 Bark 推送"""
+    if not fired:
+        return False
+    lines = [f"{describe(f['rule'])} (当前 {format_value(f['rule'], f['value'])}, {f['bar']})" for f in fired]
+    return bark.push(f"🔔 指标提醒 ({len(fired)})", "\n".join(lines), group="指标提醒", sound="alarm",
+                     level="timeSensitive")
+
+
+def run(rules_path=None, dry_run=False, refresh=True, state_path=None):
+    plan = load_rules(rules_path)
+    fired = evaluate(plan, refresh=refresh, state_path=state_path, dry_run=dry_run)
+    for f in fired:
+        print(f"🔔 {describe(f['rule'])} (当前 {format_value(f['rule'], f['value'])}, {f['bar']})")
+    if not fired:
+        print("✅ 没有新的提醒")
+    elif not dry_run:
+        if notify(fired):
+            mark_fired(fired, state_path)
+        else:
+            print("⚠️ 推送失败，下次运行时重新提醒")
+    return fired
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按规则检查指标，条件新满足时推送 Bark 提醒")
+    parser.add_argument("--rules", default=None, help=f"规则文件 (默认 {RULES_PATH}，不存在时使用内置规则)")
+    parser.add_argument("--dry-run", action="store_true", help="只打印，不推送也不改动提醒状态")
+    a = parser.parse_args()
+    run(a.rules, a.dry_run)
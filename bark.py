@@ -0,0 +1,38 @@
+"""Bark 推送 (iPhone 通知)，日报和指标提醒共用"""
+import os
+
+import requests
+
+# --- 配置区域 ---
+BARK_URL = "https://api.day.app/push"
+BARK_KEY = os.environ.get("BARK_KEY", "qCYBDbni3Wp4r3FjypKQEJ")  # 🔴 记得把这里换回你的 Key！
+ICON_PROFIT = "https://cdn-icons-png.flaticon.com/512/3177/3177440.png"  # 红色钱袋
+ICON_LOSS = "https://cdn-icons-png.flaticon.com/512/2567/2567520.png"  # 绿色折线
+
+
+def push(title, body, group="长期定投监控", icon=None, url=None, sound="glass", level="active", badge=1,
+         device_key=None):
+    """发送一条 Bark 通知 (device_key 默认 BARK_KEY)，返回是否发送成功 (失败只打印，不抛异常，不影响调用方的主流程)"""
+    payload = {
+        "device_key": device_key or BARK_KEY,
+        "title": title,
+        "body": body,
+        "group": group,
+        "sound": sound,
+        "level": level,
+        "isArchive": 1,
+        "badge": badge,
+    }
+    if icon:
+        payload["icon"] = icon
+    if url:
+        payload["url"] = url  # 点击跳转
+
+    try:
+        headers = {'Content-Type': 'application/json; charset=utf-8'}
+        requests.post(BARK_URL, json=payload, headers=headers, timeout=10)
+        print("✅ 推送已发送！")
+        return True
+    except Exception as e:
+        print(f"❌ 推送失败: {e}")
+        return False
@@ -0,0 +1,204 @@
+"""反事实定投对比: 如果每一笔钱都在同一天买了 SPY (或其他基准)，现在会怎样？
+
+账本里的每一笔现金流 (买入 = 投入 Cost_CNY + 手续费，卖出 = 同样多的人民币从基准里取出) 按当天的汇率和
+基准收盘价换算成基准份额，得到一条 "平行宇宙" 的市值曲线，再和真实组合比较市值、XIRR 和超额收益。
+
+全部向量化:
+- 换算份额: (交易数 × 基准数) 一次 searchsorted 取价 + 一次广播除法
+- 市值曲线: 份额累加后按日期取位置，乘以价格和汇率
+- XIRR: 每个观察日 (月末) × 每条曲线 是一条现金流序列，一起交给 xirr_solver.xirr_batch
+增量: BenchmarkTracker 记住每条序列上次求解时的现金流签名和期末市值，新交易 / 新行情只让签名变了的
+(通常是最近一两个月末) 重新求解。
+
+命令行: python benchmark_dca.py [SPY QQQ ...]
+"""
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+import perf_monitor
+from data_client import fetch_bars, fetch_panel
+from xirr_solver import holdings_value_curve, xirr_batch
+
+# --- 配置区域 ---
+DEFAULT_BENCHMARKS = ['SPY']
+ACTUAL = '我的组合'  # 真实组合在结果表里的列名
+FX_TICKER = 'CNY=X'
+
+
+def _trade_flows(trades):
+    """按日期排序的 (日期, 投入金额 CNY)；投入 = Cost_CNY + 手续费，卖出为负"""
+    trades = trades.dropna(subset=['Cost_CNY']).assign(Date=pd.to_datetime(trades['Date']).dt.normalize())
+    trades = trades.sort_values('Date', kind='stable')
+    fee = trades['Fee_CNY'].fillna(0.0) if 'Fee_CNY' in trades.columns else 0.0
+    return trades, (trades['Cost_CNY'] + fee).to_numpy(dtype=float)
+
+
+def _asof(series_or_frame, dates):
+    """dates 当天或之前最近的值 (早于第一条数据时用第一条)"""
+    frame = series_or_frame.sort_index().ffill().bfill()
+    pos = np.clip(frame.index.searchsorted(dates, side='right') - 1, 0, len(frame) - 1)
+    return frame.to_numpy(dtype=float)[pos]
+
+
+def replay(trades, prices, fx, benchmarks):
+    """每笔现金流换算成各基准的份额: 行为交易 (按日期排序)、列为基准"""
+    missing = [b for b in benchmarks if b not in prices.columns or prices[b].dropna().empty]
+    if missing:
+        raise ValueError(f"没有基准的价格: {', '.join(missing)}")
+    trades, flows = _trade_flows(trades)
+    dates = trades['Date'].to_numpy()
+    px = _asof(prices[benchmarks], dates)
+    rate = _asof(fx, dates) if isinstance(fx, pd.Series) else np.full(len(dates), float(fx))
+    return pd.DataFrame(flows[:, None] / (rate[:, None] * px), index=trades['Date'], columns=benchmarks)
+
+
+def value_curves(trades, prices, fx, benchmarks):
+    """每天的市值 (CNY): 真实组合 + 各基准的反事实组合，列为 [ACTUAL] + benchmarks"""
+    shares = replay(trades, prices, fx, benchmarks)
+    prices = prices.sort_index().ffill()
+    days = prices.index
+    cum = np.vstack([np.zeros((1, len(benchmarks))), shares.to_numpy().cumsum(axis=0)])
+    held = cum[shares.index.searchsorted(days, side='right')]  # 每天之前 (含当天) 的累计份额
+    rate = _asof(fx, days) if isinstance(fx, pd.Series) else np.full(len(days), float(fx))
+    bench = held * _asof(prices[benchmarks], days) * rate[:, None]
+    out = pd.DataFrame(bench, index=days, columns=benchmarks)
+    out.insert(0, ACTUAL, holdings_value_curve(trades, prices, fx).reindex(days))
+    first = shares.index[0]
+    return out[out.index >= first]
+
+
+def _observations(curves, freq):
+    obs = curves.dropna(how='all').resample(freq).last().dropna(how='all')
+    # resample 的标签是自然月末，换成当月最后一个有数据的日期 (与 xirr_solver.xirr_curve 一致)
+    # 最后一期的标签会落到最新一天，所以最新市值总在最后一行
+    obs.index = curves.index[curves.index.searchsorted(obs.index, side='right') - 1]
+    return obs
+
+
+class BenchmarkTracker:
+    """缓存每条 (观察日, 曲线) 序列的 XIRR；签名 (交易笔数, 累计投入, 按日期加权的累计投入, 期末市值) 不变就复用"""
+
+    def __init__(self):
+        self._rates = {}  # (曲线, 观察日) -> (签名, rate)
+        self._lock = threading.Lock()
+        self.last_solved = 0  # 上次 compare 实际求解的序列数 (调试 / 基准测试用)
+
+    def xirr_table(self, trades, obs):
+        """obs: 观察日 × 曲线 的市值表 -> 同形状的 XIRR 表"""
+        trades, flows = _trade_flows(trades)
+        dates = trades['Date'].to_numpy()
+        day_num = dates.astype('datetime64[D]').astype(np.int64)
+        n = dates.searchsorted(obs.index.to_numpy(), side='right')
+        cum = np.r_[0.0, flows.cumsum()][n]
+        cum_w = np.r_[0.0, (flows * day_num).cumsum()][n]
+
+        out = pd.DataFrame(np.nan, index=obs.index, columns=obs.columns)
+        todo = []  # (行, 列, 签名)
+        with self._lock:
+            for j, col in enumerate(obs.columns):
+                for i, when in enumerate(obs.index):
+                    value = obs.iat[i, j]
+                    if n[i] == 0 or value != value:
+                        continue
+                    sig = (int(n[i]), round(cum[i], 6), round(cum_w[i], 2), round(float(value), 6))
+                    hit = self._rates.get((col, when))
+                    if hit is not None and hit[0] == sig:
+                        out.iat[i, j] = hit[1]
+                    else:
+                        todo.append((i, j, sig))
+        self.last_solved = len(todo)
+        if not todo:
+            return out
+
+        rows, cols = np.array([t[0] for t in todo]), np.array([t[1] for t in todo])
+        counts = n[rows]
+        series = np.repeat(np.arange(len(todo)), counts)
+        pos = np.concatenate([np.arange(k) for k in counts])
+        result = xirr_batch(pd.concat([
+            pd.DataFrame({'Series': series, 'Date': dates[pos], 'Amount': -flows[pos]}),
+            pd.DataFrame({'Series': np.arange(len(todo)), 'Date': obs.index.to_numpy()[rows],
+                          'Amount': obs.to_numpy(dtype=float)[rows, cols]}),
+        ], ignore_index=True))
+        rates = result['rate'].reindex(np.arange(len(todo))).to_numpy()
+        with self._lock:
+            for (i, j, sig), r in zip(todo, rates):
+                out.iat[i, j] = r
+                self._rates[(obs.columns[j], obs.index[i])] = (sig, r)
+        return out
+
+
+_tracker = BenchmarkTracker()
+
+
+def compare(trades, prices, fx, benchmarks=None, freq='ME', tracker=None):
+    """真实组合 vs 各基准的反事实定投
+
+    返回 dict: value / xirr (观察日 × [ACTUAL] + benchmarks)、invested (观察日的累计净投入)、
+    excess_value (真实组合市值 / 基准市值 - 1)、excess_xirr (真实组合 XIRR - 基准 XIRR)。
+    观察日为每个 freq 周期的最后一个交易日 (最后一行即最新一天)。
+    """
+    benchmarks = list(benchmarks or DEFAULT_BENCHMARKS)
+    tracker = tracker or _tracker
+    trades = trades.dropna(subset=['Cost_CNY'])  # 与 portfolio_manager.load_ledger 一致: 没有投入金额的记录不参与
+    if trades.empty:
+        raise ValueError("账本里没有交易")
+    with perf_monitor.stage("benchmark_dca.compare", trades=len(trades), benchmarks=len(benchmarks)):
+        obs = _observations(value_curves(trades, prices, fx, benchmarks), freq)
+        rates = tracker.xirr_table(trades, obs)
+    sorted_trades, flows = _trade_flows(trades)
+    n = sorted_trades['Date'].to_numpy().searchsorted(obs.index.to_numpy(), side='right')
+    invested = pd.Series(np.r_[0.0, flows.cumsum()][n], index=obs.index)
+    return {
+        'value': obs,
+        'xirr': rates,
+        'invested': invested,
+        'excess_value': obs[benchmarks].rdiv(obs[ACTUAL], axis=0) - 1,
+        'excess_xirr': rates[benchmarks].rsub(rates[ACTUAL], axis=0),
+    }
+
+
+def summarize(result):
+    """最新一天的对比: 每条曲线的市值 / 净投入 / 盈亏 / XIRR，以及真实组合相对它的超额"""
+    value, rates = result['value'].iloc[-1], result['xirr'].iloc[-1]
+    invested = result['invested'].iloc[-1]
+    out = pd.DataFrame({'value': value, 'invested': invested, 'profit': value - invested, 'xirr': rates})
+    out['excess_value'] = value[ACTUAL] / value - 1
+    out['excess_xirr'] = rates[ACTUAL] - rates
+    out.loc[ACTUAL, ['excess_value', 'excess_xirr']] = np.nan
+    return out
+
+
+def load_inputs(trades, benchmarks=None):
+    """取真实组合和基准的价格 (实际成交价口径，与 plot_xirr_history 一致) 和 USD/CNY 历史汇率"""
+    benchmarks = list(benchmarks or DEFAULT_BENCHMARKS)
+    tickers = list(dict.fromkeys(list(trades['Ticker'].unique()) + benchmarks))
+    start = pd.to_datetime(trades['Date']).min().strftime('%Y-%m-%d')
+    prices = fetch_panel(tickers, 'max', basis='price', start=start)
+    fx = fetch_bars(FX_TICKER, 'max', resolution='1d', columns=['Close'], start=start)['Close']
+    return prices, fx
+
+
+def run(trades, benchmarks=None, freq='ME'):
+    """取数 + compare，dashboard 和命令行共用"""
+    prices, fx = load_inputs(trades, benchmarks)
+    return compare(trades, prices, fx, benchmarks, freq)
+
+
+if __name__ == "__main__":
+    import portfolio_manager
+    from charts import build_benchmark_figure
+
+    names = [a.upper() for a in sys.argv[1:]] or DEFAULT_BENCHMARKS
+    result = run(portfolio_manager.load_ledger(), names)
+    table = summarize(result)
+    print("-" * 60)
+    for name, row in table.iterrows():
+        line = f"{name:<8} 市值: ¥{row['value']:,.0f} | 盈亏: ¥{row['profit']:+,.0f} | XIRR: {row['xirr']:.2%}"
+        if name != ACTUAL:
+            line += f" | 我的组合超额: {row['excess_value']:+.2%} (XIRR {row['excess_xirr'] * 100:+.2f} 个百分点)"
+        print(line)
+    print("-" * 60)
+    build_benchmark_figure(result).show()
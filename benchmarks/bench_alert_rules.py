@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+import alert_rules
+import bark
+import price_store
+
+
+@pytest.fixture
+def market(tmp_path, monkeypatch):
+    """可控的日线 + 记录推送；返回 (运行一次, 推送列表, 状态文件)。运行时给出收盘价则先追加一根新 K 线"""
+    bars = []
+    pushes = []
+    ok = [True]
+
+    def load_bars(ticker, period, resolution='1d', refresh=True):
+        index = pd.bdate_range("2026-01-01", periods=len(bars))
+        return pd.DataFrame({'Close': bars}, index=index, dtype=float)
+
+    def push(title, body, **kwargs):
+        pushes.append(body)
+        return ok[0]
+
+    monkeypatch.setattr(price_store, "load_bars", load_bars)
+    monkeypatch.setattr(bark, "push", push)
+    rules = tmp_path / "alert_rules.txt"
+    rules.write_text("TEST close > 100\n", encoding="utf-8")
+    state = str(tmp_path / "alerts_state.json")
+
+    def step(close=None, dry_run=False, push_ok=True):
+        if close is not None:
+            bars.append(close)
+        ok[0] = push_ok
+        return alert_rules.run(str(rules), dry_run=dry_run, state_path=state)
+
+    return step, pushes, state
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_edge_trigger(market):
+    # 满足时推送一次，持续满足不重复，恢复后再次满足重新提醒
+    step, pushes, _ = market
+    assert step(90) == []
+    assert len(step(110)) == 1 and len(pushes) == 1
+    assert step(120) == [] and step(130) == [] and step() == []
+    assert step(90) == []
+    assert len(step(105)) == 1 and len(pushes) == 2
+
+
+def test_dry_run_keeps_state(market):
+    # dry run 只打印: 状态文件不变，之后的正式运行照样推送
+    step, pushes, state = market
+    step(90)
+    before = _read(state)
+    assert len(step(110, dry_run=True)) == 1 and pushes == []
+    assert _read(state) == before
+    assert len(step()) == 1 and len(pushes) == 1
+    assert step() == []
+
+
+def test_failed_push_retries(market):
+    # 推送失败时不记为已触发，下次运行 (即使没有新 K 线) 再次提醒
+    step, pushes, _ = market
+    step(90)
+    assert len(step(110, push_ok=False)) == 1
+    assert len(step()) == 1 and len(pushes) == 2
+    assert step() == []
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark_dca import ACTUAL, BenchmarkTracker, compare, value_curves
+from fixture_data import make_download_frame, make_trade_log
+
+TICKERS = ['SPY', 'BTC-USD', 'ETH-USD', 'QQQ']
+
+
+@pytest.fixture(scope="module")
+def market():
+    prices = make_download_frame(TICKERS + ['VTI', 'GLD'], 2000)['Close']
+    fx = pd.Series(np.linspace(6.3, 7.3, len(prices)), index=prices.index)
+    return prices, fx
+
+
+@pytest.mark.parametrize("n_trades", [100, 2000])
+def test_compare_cold(benchmark, market, n_trades):
+    # 冷启动: 每个月末 × 每条曲线都要求解一次 XIRR
+    prices, fx = market
+    trades = make_trade_log(n_trades, sell_every=5)
+    result = benchmark(lambda: compare(trades, prices, fx, ['SPY', 'QQQ', 'GLD'], tracker=BenchmarkTracker()))
+    assert list(result['xirr'].columns) == [ACTUAL, 'SPY', 'QQQ', 'GLD']
+    assert result['xirr'].iloc[-1].notna().all()
+
+
+def test_compare_incremental(benchmark, market):
+    # 账本末尾新增一笔: 之前月末的序列签名不变，只重算最后一个观察日
+    prices, fx = market
+    trades = make_trade_log(2000, sell_every=5)
+    tracker = BenchmarkTracker()
+    compare(trades.iloc[:-1], prices, fx, ['SPY', 'QQQ'], tracker=tracker)
+    compare(trades, prices, fx, ['SPY', 'QQQ'], tracker=tracker)
+    assert tracker.last_solved == 3  # 最后一个观察日 × (我的组合, SPY, QQQ)
+    result = benchmark(lambda: compare(trades, prices, fx, ['SPY', 'QQQ'], tracker=tracker))
+    fresh = compare(trades, prices, fx, ['SPY', 'QQQ'], tracker=BenchmarkTracker())
+    pd.testing.assert_frame_equal(result['xirr'], fresh['xirr'])
+
+
+def test_replay_matches_single_benchmark(market):
+    # 基准就是账本里唯一的资产、且按当天收盘价成交时，反事实组合与真实组合的市值一致
+    prices, fx = market
+    trades = make_trade_log(200, tickers=('SPY',))
+    px = prices['SPY'].ffill().reindex(trades['Date'], method='ffill').to_numpy()
+    rate = fx.reindex(trades['Date'], method='ffill').to_numpy()
+    trades = trades.assign(Shares=trades['Cost_CNY'] / (px * rate))
+    curves = value_curves(trades, prices, fx, ['SPY'])
+    assert np.allclose(curves[ACTUAL], curves['SPY'])
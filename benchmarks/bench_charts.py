@@ -0,0 +1,35 @@
+import pytest
+
+from charts import build_analysis_figure, build_trend_figure
+from fixture_data import SIZES, make_price_history
+from indicators import add_technical_indicators, add_trend_indicators
+
+
+@pytest.mark.parametrize("n_days", SIZES)
+def test_trend_figure_payload(benchmark, n_days):
+    data = add_trend_indicators(make_price_history(n_days))
+    payload = benchmark(lambda: build_trend_figure(data, name='S&P 500 Price', title='bench').to_json())
+    assert payload
+
+
+@pytest.mark.parametrize("n_days", SIZES)
+@pytest.mark.parametrize("sub_chart", ["无", "MACD"], ids=["none", "macd"])
+def test_analysis_figure_payload(benchmark, n_days, sub_chart):
+    df = add_technical_indicators(make_price_history(n_days))
+    payload = benchmark(lambda: build_analysis_figure(df, True, True, sub_chart).to_json())
+    assert payload
+
+
+@pytest.mark.parametrize("n_days", SIZES)
+def test_analysis_figure_cached_toggle(benchmark, n_days):
+    import figure_cache
+
+    df = add_technical_indicators(make_price_history(n_days))
+    fp = figure_cache.fingerprint(df)
+    figure_cache.analysis_figure(df, True, True, "无", fp=fp)  # 预热基础图层
+
+    def toggle():
+        figure_cache._figures.clear()  # 只保留图层缓存，模拟切换副图后的首次组装
+        return figure_cache.analysis_figure(df, True, True, "MACD", fp=fp)
+
+    assert len(benchmark(toggle).data) == 7
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+import bark
+import daily_report
+import market_data
+import portfolio_store
+from fixture_data import make_tickers, make_trade_log
+
+TICKERS = make_tickers(20)
+AS_OF = pd.Timestamp("2026-01-02")
+
+
+def _ledgers(n_portfolios, n_trades=200):
+    # 每个组合持有 20 个 Ticker 中的 5 个 (互相重叠)
+    return {f"p{i}": make_trade_log(n_trades, tickers=[TICKERS[(i + k) % len(TICKERS)] for k in range(5)], seed=i,
+                                    sell_every=6)
+            for i in range(n_portfolios)}
+
+
+@pytest.mark.parametrize("n_portfolios", [1, 20])
+def test_build_reports(benchmark, n_portfolios):
+    # 一份共用的价格 / 汇率估值所有组合，再和上一份快照比较
+    ledgers = _ledgers(n_portfolios)
+    prices = pd.Series(range(100, 100 + len(TICKERS)), index=TICKERS, dtype=float)
+    first = daily_report.build_reports(ledgers, prices * 0.99, 7.1, as_of=AS_OF - pd.Timedelta(days=1))
+    previous = {p: (AS_OF - pd.Timedelta(days=1), r['summary'], r['holdings']) for p, r in first.items()}
+    reports = benchmark(daily_report.build_reports, ledgers, prices, 7.2, previous, AS_OF)
+    assert all(r['delta'] is not None and not r['delta']['movers'].empty for r in reports.values())
+
+
+def test_run_fetches_once(tmp_path, monkeypatch):
+    # 20 个组合 (重叠的 Ticker) 只取一次价格和一次汇率；第二天的日报带日变化
+    monkeypatch.setattr(portfolio_store, "DB_PATH", str(tmp_path / "portfolio.db"))
+    monkeypatch.setattr(daily_report, "EXCEL_PATH", str(tmp_path / "missing.xlsx"))
+    sent = []
+    monkeypatch.setattr(bark, "push", lambda title, body, **kw: sent.append(kw['device_key']) or True)
+    for portfolio, log in _ledgers(20, n_trades=20).items():
+        for r in log.itertuples():
+            portfolio_store.add_trade(r.Ticker, r.Date, r.Shares, cost_cny=r.Cost_CNY, portfolio=portfolio,
+                                      fee_cny=r.Fee_CNY)
+    subs = tmp_path / "daily_report.txt"
+    subs.write_text("* phone\np0 tablet\n", encoding="utf-8")
+
+    for day in ["2026-01-01", "2026-01-02"]:
+        market = market_data.LatencyProvider(market_data.FakeProvider(end=day), latency=0.0)
+        with market_data.use(market):
+            reports = daily_report.run(str(subs), as_of=day)
+        assert market.stats()['calls'] == 2 and len(reports) == 20
+    assert len(sent) == 2 * 21
+    assert all(r['delta']['since'] == pd.Timestamp("2026-01-01") for r in reports.values())
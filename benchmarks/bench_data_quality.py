@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+
+from data_quality import validate_download, validate_panel
+from fixture_data import make_download_frame, make_tickers
+
+
+@pytest.mark.parametrize("n_assets", [2, 10, 50])
+@pytest.mark.parametrize("n_days", [252, 2520])
+def test_validate_download(benchmark, n_assets, n_days):
+    tickers = make_tickers(n_assets)
+    data = make_download_frame(tickers, n_days)
+    clean, report = benchmark(validate_download, data, tickers)
+    assert (report['status'] != 'quarantined').all()
+
+
+def test_crash_without_split_record_is_kept():
+    # 真实的单日腰斩 (没有拆股记录) 只报告，不改动历史；有同日 2:1 拆股记录时才换算
+    idx = pd.bdate_range("2025-01-02", periods=10)
+    panel = pd.DataFrame({'X': [100, 101, 102, 103, 51, 51.5, 52, 52.5, 53, 53.5]}, index=idx, dtype=float)
+    clean, report = validate_panel(panel, splits={})
+    pd.testing.assert_frame_equal(clean, panel)
+    assert report.loc['X', 'split_jumps'] == 1 and report.loc['X', 'confirmed_splits'] == 0
+    assert report.loc['X', 'status'] == 'warning'
+
+    clean, report = validate_panel(panel, splits={'X': pd.Series([2.0], index=[idx[4]])})
+    assert report.loc['X', 'status'] == 'repaired'
+    assert clean['X'].iloc[:4].round(2).tolist() == [49.51, 50.01, 50.5, 51.0]
@@ -0,0 +1,66 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import data_client
+import data_service
+import price_store
+import shared_cache
+from fixture_data import make_price_history
+
+TICKER = "ARROW"
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    # 本地仓库里一只 10 年日线的 Ticker，meta 标记为刚更新过，不会联网
+    old_dir = price_store.STORE_DIR
+    price_store.STORE_DIR = str(tmp_path_factory.mktemp("store"))
+    daily = price_store._trend_indicators(make_price_history(2520, seed=2))
+    price_store._write(TICKER, '1d', daily)
+    price_store._update_tiers(TICKER, daily)
+    price_store._write_meta(TICKER, updated_at=time.time() + 3600, rows=len(daily),
+                            last=str(daily.index[-1].date()), history_at=0)
+    yield daily
+    price_store.STORE_DIR = old_dir
+
+
+@pytest.fixture(scope="module")
+def service(store, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("sock") / "data.sock")
+    server = data_service.make_server(socket_path=path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"unix://{path}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_bars_projection(benchmark, store, service):
+    # 经服务取回的列投影 + 日期区间与本地 query_table 的结果一致
+    start, end = store.index[-500].date(), store.index[-100].date()
+    shared_cache.clear()
+    bars = benchmark(lambda: data_service.frame_from_table(data_client.fetch_table(
+        'bars', url=service, ticker=TICKER, period="5y", resolution='1d', columns=["Close", "MA200"],
+        start=str(start), end=str(end))))
+    local = data_service.frame_from_table(data_service.query_table('bars', {
+        'ticker': [TICKER], 'period': ["5y"], 'resolution': ['1d'], 'columns': ["Close,MA200"],
+        'start': [str(start)], 'end': [str(end)]}))
+    pd.testing.assert_frame_equal(bars, local)
+    direct = price_store.load_bars(TICKER, "5y", resolution='1d').loc[str(start):str(end), ["Close", "MA200"]]
+    assert list(bars.columns) == ["Close", "MA200"] and bars.index.equals(direct.index)
+    assert (bars.to_numpy() == direct.to_numpy()).all()
+
+
+def test_fallback_without_server(store, tmp_path, monkeypatch):
+    # 服务没有启动: 回退为本地读取，结果与 price_store 直接读取相同
+    monkeypatch.setattr(data_client, "SERVICE_URL", f"unix://{tmp_path / 'missing.sock'}")
+    bars = data_client.fetch_bars(TICKER, "1y", resolution='1d', columns=["Close"])
+    direct = price_store.load_bars(TICKER, "1y", resolution='1d')
+    assert bars['Close'].tolist() == direct['Close'].tolist()
+
+
+def test_empty_table_not_cached():
+    empty = data_service.to_table(pd.DataFrame({'Close': []}, index=pd.DatetimeIndex([], name='Date')))
+    assert empty.num_rows == 0 and not shared_cache._cacheable(empty)
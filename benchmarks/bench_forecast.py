@@ -0,0 +1,15 @@
+import pytest
+
+from fast_forecast import METHODS, forecast
+from fixture_data import make_price_history
+from indicators import prepare_prophet_frame
+
+
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("n_days", [365, 1825])
+def test_fast_forecast(benchmark, method, n_days):
+    # 5 年 BTC 日线 (含周末) 是预测页最重的情况，目标 < 100 ms
+    df_train = prepare_prophet_frame(make_price_history(n_days, seed=5, freq='D'))
+    result = benchmark(forecast, df_train, 90, method=method)
+    assert len(result) == n_days + 90
+    assert (result['yhat_lower'] <= result['yhat_upper']).all()
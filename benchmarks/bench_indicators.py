@@ -0,0 +1,54 @@
+import pytest
+
+from fixture_data import SIZES, make_price_history
+from indicators import add_technical_indicators, add_trend_indicators, prepare_prophet_frame
+
+
+@pytest.mark.parametrize("n_days", SIZES)
+def test_add_technical_indicators(benchmark, n_days):
+    data = make_price_history(n_days)
+    result = benchmark(lambda: add_technical_indicators(data.copy()))
+    assert result['RSI'].notna().any()
+
+
+@pytest.mark.parametrize("n_days", SIZES)
+def test_add_trend_indicators(benchmark, n_days):
+    data = make_price_history(n_days)
+    result = benchmark(lambda: add_trend_indicators(data.copy()))
+    assert (result['Drawdown'] <= 0).all()
+
+
+@pytest.mark.parametrize("n_days", SIZES)
+def test_prepare_prophet_frame(benchmark, n_days):
+    data = make_price_history(n_days)
+    data.index = data.index.tz_localize('America/New_York')
+    result = benchmark(prepare_prophet_frame, data)
+    assert list(result.columns) == ['ds', 'y'] and result['ds'].dt.tz is None
+
+
+@pytest.mark.parametrize("rule", ['W-SUN', 'ME'])
+def test_resample_bars(benchmark, rule):
+    from price_store import resample_bars, _trend_indicators
+
+    daily = _trend_indicators(make_price_history(25000))
+    bars = benchmark(resample_bars, daily, rule)
+    assert len(bars) < len(daily) / 4
+
+
+def test_incremental_trend_indicators(benchmark):
+    from price_store import _trend_indicators
+
+    daily = _trend_indicators(make_price_history(25000))
+    result = benchmark(_trend_indicators, daily, len(daily) - 5)  # 只重算最后 5 根
+    assert result['MA200'].notna().iloc[-1]
+
+
+def test_dividend_factor(benchmark):
+    # ^GSPC 级别的完整历史 + 每季度一次分红: 新分红出现时只需要重算这一步
+    import pandas as pd
+    from corporate_actions import dividend_factor
+
+    close = make_price_history(25000)['Close']
+    dividends = pd.Series(0.25, index=close.index[::63][1:])
+    factor = benchmark(dividend_factor, close, dividends)
+    assert factor.iloc[-1] == 1.0 and factor.iloc[0] < factor.iloc[-1]
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+import job_runner
+import perf_monitor
+
+
+def _count(job, n):
+    for i in range(n):
+        job.report(i / n, f"step {i}")
+    return n
+
+
+def test_submit_roundtrip(benchmark):
+    # 目标: 提交到拿到结果的额外开销在毫秒以内 (相对 Prophet 训练的几秒可以忽略)
+    def roundtrip():
+        job = job_runner.submit("noop", _count, 0)
+        job.wait(5)
+        return job
+
+    job = benchmark(roundtrip)
+    assert job.status == 'done' and job.result == 0
+
+
+@pytest.mark.parametrize("n_reports", [1000])
+def test_report_overhead(benchmark, n_reports):
+    # report 既写进度又是取消检查点，任务里每一小步都调用也不应拖慢计算
+    job = job_runner.Job("inline")
+    assert benchmark(_count, job, n_reports) == n_reports
+
+
+def test_cancel_latency(benchmark):
+    # 取消在下一个 report 生效: 每 10ms 汇报一次的任务，取消后应在几十毫秒内结束
+    def slow(job):
+        while True:
+            job.report(message="working")
+            time.sleep(0.01)
+
+    def cancel_running():
+        job = job_runner.submit("slow", slow)
+        while job.status == 'queued':
+            time.sleep(0.001)
+        job.cancel()
+        job.wait(5)
+        return job
+
+    job = benchmark.pedantic(cancel_running, rounds=5)
+    assert job.status == 'cancelled'
+
+
+def test_dedup_by_key():
+    def wait_a_bit(job):
+        time.sleep(0.2)
+        return 42
+
+    first = job_runner.submit("dedup", wait_a_bit, key="same")
+    second = job_runner.submit("dedup", wait_a_bit, key="same")
+    assert first is second and first.subscribers == 2
+    first.cancel()  # 还有一个等待方，任务继续
+    assert first.wait(5) and first.status == 'done' and first.result == 42
+
+
+def test_job_trace_ended():
+    # 每个任务单独一条请求记录，结束 (包括失败) 时记下墙钟耗时
+    def fail(job):
+        raise RuntimeError("boom")
+
+    with perf_monitor.collect() as traces:
+        job_runner.submit("traced", _count, 3)
+        job_runner.submit("traced", fail)
+        assert job_runner.wait_all(5)
+    assert [t.name for t in traces] == ["job:traced"] * 2
+    assert all(t.wall_seconds is not None for t in traces)
@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+import market_data
+from fixture_data import make_tickers
+from market_data import FakeProvider, RecordingProvider, ReplayProvider
+
+TICKERS = make_tickers(20)
+
+
+@pytest.fixture(scope="module")
+def archive(tmp_path_factory):
+    # 用假数据源冒充雅虎财经录一次 20 个 Ticker 的完整历史 (10 年日线)
+    root = str(tmp_path_factory.mktemp("archive"))
+    fake = FakeProvider(end="2025-12-31")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(market_data.yf, "download", fake.download)
+        RecordingProvider(root).download(TICKERS, period='max', auto_adjust=False, actions=True)
+    return root, fake
+
+
+@pytest.mark.parametrize("n_tickers", [1, 20])
+def test_replay_exact(benchmark, archive, n_tickers):
+    # 目标: 回放达到磁盘速度 (单个 Ticker 几毫秒)，结果与录制时完全一致
+    root, fake = archive
+    replay = ReplayProvider(root)
+    kwargs = dict(period='max', auto_adjust=False, actions=True)
+    data = benchmark(replay.download, TICKERS[:n_tickers], **kwargs)
+    pd.testing.assert_frame_equal(data, fake.download(TICKERS[:n_tickers], **kwargs), check_freq=False)
+
+
+def test_replay_sliced(benchmark, archive):
+    # 没录过的周期 / 增量请求从 'max' 记录切片
+    root, fake = archive
+    replay = ReplayProvider(root)
+    data = benchmark(replay.download, 'BTC-USD', start='2025-06-01', auto_adjust=False, actions=True)
+    assert replay.sliced > 0 and data.index[0] >= pd.Timestamp('2025-06-01')
+    pd.testing.assert_frame_equal(data, fake.download('BTC-USD', start='2025-06-01', auto_adjust=False,
+                                                      actions=True), check_freq=False)
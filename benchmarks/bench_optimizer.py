@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from fixture_data import make_download_frame, make_tickers
+from indicators import extract_close_panel
+from optimizer import METHODS, ledoit_wolf, optimize, returns_from_prices
+
+
+@pytest.fixture(scope="module")
+def panel():
+    # 3 年日线、500 个资产 (全部标普成分股) 是上限；生成一次，各用例按需取前 n 列
+    tickers = make_tickers(500)
+    return extract_close_panel(make_download_frame(tickers, 756), tickers).dropna(axis=0)
+
+
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("n_assets", [10, 500])
+def test_optimize(benchmark, panel, method, n_assets):
+    # 目标: 500 个资产 < 1 秒 (含协方差估计)
+    prices = panel.iloc[:, :n_assets]
+    cap = max(0.05, 2.0 / n_assets)
+    w = benchmark(optimize, prices, method, 0.0, cap)
+    assert np.isclose(w.sum(), 1.0) and (w >= 0).all() and (w <= cap + 1e-9).all()
+
+
+def test_ledoit_wolf(benchmark, panel):
+    returns = returns_from_prices(panel)
+    cov, shrink = benchmark(ledoit_wolf, returns)
+    assert cov.shape == (500, 500) and 0 <= shrink <= 1
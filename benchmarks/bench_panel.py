@@ -0,0 +1,27 @@
+import pytest
+
+from fixture_data import make_download_frame, make_tickers
+from indicators import extract_close_panel, align_panel, normalize_returns
+
+N_ASSETS = [2, 10, 50]
+
+
+@pytest.mark.parametrize("n_assets", N_ASSETS)
+@pytest.mark.parametrize("group_by", ['ticker', 'column'])
+def test_compare_panel_alignment(benchmark, n_assets, group_by):
+    tickers = make_tickers(n_assets)
+    data = make_download_frame(tickers, 1260, group_by=group_by)
+
+    def run():
+        return normalize_returns(align_panel(extract_close_panel(data, tickers)))
+
+    result = benchmark(run)
+    assert list(result.columns) == tickers and result.notna().all().all()
+
+
+@pytest.mark.parametrize("n_assets", N_ASSETS)
+def test_correlation_matrix(benchmark, n_assets):
+    tickers = make_tickers(n_assets)
+    df_close = extract_close_panel(make_download_frame(tickers, 1260), tickers).dropna(axis=0)
+    corr = benchmark(lambda: df_close.pct_change().dropna().corr())
+    assert corr.shape == (n_assets, n_assets)
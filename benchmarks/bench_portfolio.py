@@ -0,0 +1,14 @@
+import pandas as pd
+import pytest
+
+from fixture_data import make_trade_log
+from portfolio_manager import value_portfolio
+
+PRICES = pd.Series({'SPY': 600.0, 'BTC-USD': 90000.0, 'ETH-USD': 3000.0, 'QQQ': 520.0})
+
+
+@pytest.mark.parametrize("n_trades", [10, 1000, 10000])
+def test_value_portfolio(benchmark, n_trades):
+    trades = make_trade_log(n_trades)
+    holdings, summary = benchmark(value_portfolio, trades, PRICES, 7.2, pd.Timestamp("2026-01-01"))
+    assert summary['total_invested'] == trades['Cost_CNY'].sum()
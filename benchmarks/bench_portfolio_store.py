@@ -0,0 +1,54 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import portfolio_store
+from fixture_data import make_trade_log
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "portfolio.db")
+
+
+@pytest.mark.parametrize("n_trades", [1000])
+def test_import_excel_idempotent(benchmark, tmp_path, db, n_trades):
+    # 同一份 Excel 导入两次只新增一次 (同一天同金额的重复定投按出现次序区分，不会被误去重)
+    log = make_trade_log(n_trades, sell_every=5)
+    log = pd.concat([log, log.iloc[[0]]], ignore_index=True)
+    excel = str(tmp_path / "trade_log.xlsx")
+    log.to_excel(excel, index=False)
+    assert portfolio_store.import_excel(excel, path=db) == len(log)
+    assert benchmark(portfolio_store.import_excel, excel, path=db) == 0
+    assert len(portfolio_store.load_trades(path=db)) == len(log)
+
+
+def test_migrations_in_order(db):
+    # 停在第一版 schema 的旧数据库: 打开时依次升级到最新，已有数据保留
+    conn = sqlite3.connect(db)
+    conn.executescript(portfolio_store.MIGRATIONS[0])
+    conn.execute("INSERT INTO trades (date, ticker, shares, cost_cny) VALUES ('2025-01-02', 'SPY', 1, 500)")
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    conn = portfolio_store.connect(db)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(portfolio_store.MIGRATIONS)
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'trades', 'snapshots', 'snapshot_holdings'} <= tables
+    trades = portfolio_store.load_trades(path=db)
+    assert len(trades) == 1 and trades['Fee_CNY'].iloc[0] == 0.0
+
+
+def test_soft_delete_hidden(tmp_path, db):
+    # 软删除的记录不出现在 load_trades 里，再次导入同一份 Excel 也不会复活
+    log = make_trade_log(20)
+    excel = str(tmp_path / "trade_log.xlsx")
+    log.to_excel(excel, index=False)
+    portfolio_store.import_excel(excel, path=db)
+    trades = portfolio_store.load_trades(path=db)
+    portfolio_store.delete_trades(trades['id'].iloc[:5], path=db)
+    assert portfolio_store.import_excel(excel, path=db) == 0
+    left = portfolio_store.load_trades(path=db)
+    assert len(left) == 15 and not set(trades['id'].iloc[:5]) & set(left['id'])
@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from fixture_data import make_price_history, make_tickers
+from indicators import add_trend_indicators
+from regimes import RegimeBook, analyze
+
+
+@pytest.fixture(scope="module")
+def histories():
+    # 标普 "max" 长度 (约 25k 根日线) × 20 个 Ticker
+    return {t: add_trend_indicators(make_price_history(25000, seed=i)[['Close']].copy())
+            for i, t in enumerate(make_tickers(20))}
+
+
+@pytest.mark.parametrize("n_tickers", [1, 20])
+def test_analyze(benchmark, histories, n_tickers):
+    bars = dict(list(histories.items())[:n_tickers])
+    regimes, drawdowns = benchmark(analyze, bars)
+    assert set(regimes['Ticker']) == set(bars) and drawdowns['Depth'].lt(0).all()
+
+
+def test_incremental_update(benchmark, histories):
+    # 已有完整历史，再来一根新 K 线: 只重算最后几段，结果必须与整段重算一致
+    book = RegimeBook()
+    book.update({t: b.iloc[:-1] for t, b in histories.items()})
+
+    def step():
+        return book.update(histories)
+
+    regimes, drawdowns = benchmark(step)
+    full_regimes, full_drawdowns = analyze(histories)
+    pd.testing.assert_frame_equal(
+        regimes, full_regimes.sort_values(['Ticker', 'Start'], kind='stable').reset_index(drop=True),
+        check_dtype=False)
+    pd.testing.assert_frame_equal(
+        drawdowns, full_drawdowns.sort_values(['Ticker', 'Start'], kind='stable').reset_index(drop=True),
+        check_dtype=False)
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from fixture_data import make_download_frame, make_tickers
+from indicators import extract_close_panel
+from relative_strength import leaderboard, win_rates, rolling_returns
+
+
+@pytest.fixture(scope="module")
+def panel():
+    # 5 年日线、200 个资产 (股票 + BTC 两种交易日历)
+    tickers = make_tickers(200)
+    return extract_close_panel(make_download_frame(tickers, 1260), tickers)
+
+
+@pytest.mark.parametrize("n_assets", [2, 50, 200])
+def test_leaderboard(benchmark, panel, n_assets):
+    # 目标: 50 个资产在一次 rerun 里完成 (< 100ms)
+    board, pairs, wins, rank_history = benchmark(leaderboard, panel.iloc[:, :n_assets])
+    assert len(board) == n_assets and pairs.shape == (n_assets, n_assets)
+    assert board['total_return'].is_monotonic_decreasing
+
+
+def test_win_rates_complementary(panel):
+    # 没有并列时 i 跑赢 j 与 j 跑赢 i 的占比之和为 1
+    wins = win_rates(rolling_returns(panel.iloc[:, :30]))
+    total = (wins + wins.T).to_numpy()
+    assert np.allclose(total[~np.eye(30, dtype=bool)], 1.0)
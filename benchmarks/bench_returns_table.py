@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from fixture_data import make_download_frame, make_tickers
+from indicators import extract_close_panel
+from returns_table import compute, period_returns
+
+
+@pytest.fixture(scope="module")
+def panel():
+    # 10 年日线、200 个资产；外连接后保留各自交易日历的空值
+    tickers = make_tickers(200)
+    return extract_close_panel(make_download_frame(tickers, 2520), tickers)
+
+
+@pytest.mark.parametrize("n_assets", [10, 200])
+def test_compute(benchmark, panel, n_assets):
+    tables = benchmark(compute, panel.iloc[:, :n_assets], 3)
+    assert tables['summary'].shape[0] == n_assets
+
+
+def test_monthly_matches_resample(panel):
+    # 两个完整月份之间的收益必须与 pandas resample 的结果一致
+    sub = panel.iloc[:, :20]
+    ours = period_returns(sub, 'M').to_numpy()
+    ref = sub.resample('ME').last().pct_change(fill_method=None).to_numpy()
+    mask = ~np.isnan(ref)
+    assert np.allclose(ours[mask], ref[mask])
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from fixture_data import make_trade_log
+from tax_lots import METHODS, build
+
+
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("n_trades", [1000, 100000])
+def test_build_lots(benchmark, method, n_trades):
+    # 每个 Ticker 每 4 笔里有 1 笔卖出；整本账应该是线性时间
+    trades = make_trade_log(n_trades, sell_every=4)
+    book = benchmark(build, trades, method)
+    pos = book.positions()
+    assert np.allclose(pos['Shares'], trades.groupby('Ticker')['Shares'].sum().reindex(pos.index))
+    assert len(book.realized_frame()) == (trades['Shares'] < 0).sum()
+
+
+def test_append_one_ticker(benchmark):
+    # 增量追加: 只处理新交易涉及的 Ticker
+    trades = make_trade_log(100000, sell_every=4)
+    book = build(trades)
+    new = trades.tail(1).assign(Ticker='SPY', Shares=0.01, Cost_CNY=10.0)
+    assert benchmark(book.append, new) == ['SPY']
@@ -0,0 +1,56 @@
+import time
+
+import pandas as pd
+import pytest
+
+import price_store
+import shared_cache
+import window_cache
+from fixture_data import make_price_history
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    # 标普 "max" 长度的本地仓库 (约 25k 根日线 + 周线 / 月线)，meta 标记为刚更新过，不会联网
+    old_dir = price_store.STORE_DIR
+    price_store.STORE_DIR = str(tmp_path_factory.mktemp("store"))
+    daily = price_store._trend_indicators(make_price_history(25000, seed=1))
+    price_store._write("^GSPC", '1d', daily)
+    price_store._update_tiers("^GSPC", daily)
+    price_store._write_meta("^GSPC", updated_at=time.time() + 3600, rows=len(daily),
+                            last=str(daily.index[-1].date()), history_at=0)
+    yield daily
+    price_store.STORE_DIR = old_dir
+
+
+def test_load_bars_max(benchmark, store):
+    # 对照: 原来的 "max" 路径 (读整段日线、现算复权、再读月线)
+    bars = benchmark(price_store.load_bars, "^GSPC", "max")
+    assert bars.attrs['resolution'] == '1mo'
+
+
+def test_load_full(benchmark, store):
+    bars = benchmark(window_cache.load_full, "^GSPC")
+    assert bars.attrs['resolution'] == '1mo' and bars.index[-1] == store.index[-1]
+
+
+def test_load_window_cold(benchmark, store):
+    # 第一次打开 (缓存为空): 最近 3 年日线窗口 + 两侧余量
+    def cold():
+        shared_cache.clear()
+        return window_cache.load_window("^GSPC")
+
+    bars = benchmark(cold)
+    start, end = bars.attrs['window']
+    assert bars.attrs['resolution'] == '1d' and bars.index[0] <= start and end == store.index[-1]
+
+
+def test_pan_window(benchmark, store):
+    # 平移: 相邻的块已在缓存里，结果与直接切片一致
+    shared_cache.clear()
+    window_cache.load_window("^GSPC", "2000-01-01", "2003-01-01")
+    bars = benchmark(window_cache.load_window, "^GSPC", "2000-06-01", "2003-06-01")
+    start, end = pd.Timestamp("2000-06-01"), pd.Timestamp("2003-06-01")
+    lo, hi = start - (end - start) * window_cache.MARGIN, end + (end - start) * window_cache.MARGIN
+    expected = store[(store.index >= lo) & (store.index <= hi)]
+    assert bars.index[0] == expected.index[0] and len(bars) == len(expected)
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fixture_data import make_download_frame, make_trade_log
+from xirr_solver import holdings_value_curve, xirr_batch, xirr_curve
+
+
+def make_flows(n_series, n_flows=24, seed=0):
+    """n_series 条定投现金流: 每月投入，最后一天按随机盈亏收回"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2020-01-01", periods=n_flows, freq="MS")
+    amounts = -rng.uniform(50, 500, (n_series, n_flows))
+    amounts[:, -1] = -amounts[:, :-1].sum(axis=1) * rng.uniform(0.5, 2.0, n_series)
+    return pd.DataFrame({
+        'Series': np.repeat(np.arange(n_series), n_flows),
+        'Date': np.tile(dates, n_series),
+        'Amount': amounts.ravel(),
+    })
+
+
+@pytest.mark.parametrize("n_series", [10, 1000, 10000])
+def test_xirr_batch(benchmark, n_series):
+    flows = make_flows(n_series)
+    result = benchmark(xirr_batch, flows)
+    assert result['converged'].all()
+
+
+@pytest.mark.parametrize("n_trades", [100, 2000])
+def test_xirr_curve(benchmark, n_trades):
+    trades = make_trade_log(n_trades)
+    prices = make_download_frame(['SPY', 'BTC-USD', 'ETH-USD', 'QQQ'], 2000)['Close']
+
+    def run():
+        return xirr_curve(trades, holdings_value_curve(trades, prices, 7.2))
+
+    curve = benchmark(run)
+    assert len(curve) > 12
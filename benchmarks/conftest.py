@@ -0,0 +1,12 @@
+"""基准测试 (pytest-benchmark)
+
+运行:   python -m pytest benchmarks
+对比:   python -m pytest benchmarks --benchmark-compare          (与上一次保存的结果对比)
+        python -m pytest benchmarks --benchmark-compare=0003 --benchmark-compare-fail=mean:10%
+
+每次运行的结果会按 "序号_commit" 自动保存在 .benchmarks/ 下 (见 pytest.ini)，切换 commit 后再跑一次即可对比。
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
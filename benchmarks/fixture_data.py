@@ -0,0 +1,72 @@
+"""离线 Fixture 数据生成器 (不依赖雅虎财经)
+
+所有数据都由固定随机种子生成，同一参数每次得到完全相同的结果，方便在不同 commit 之间对比基准测试。
+"""
+import numpy as np
+import pandas as pd
+
+# 常用数据规模: 1年 / 5年 / 标普500 "max" (约 25k 根日线)
+SIZES = [252, 1260, 25000]
+
+
+def make_price_history(n_days, seed=0, start_price=100.0, end=None, freq='B'):
+    """生成一只资产的日线 OHLCV (几何布朗运动)，结构与 yf.download 单个 Ticker 的结果一致"""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or "2025-12-31")
+    index = pd.date_range(end=end, periods=n_days, freq=freq, name='Date')
+
+    log_ret = rng.normal(0.0003, 0.015, n_days)
+    close = start_price * np.exp(np.cumsum(log_ret))
+    spread = np.abs(rng.normal(0, 0.006, n_days))
+    open_ = close * (1 + rng.normal(0, 0.003, n_days))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = rng.integers(1_000_000, 50_000_000, n_days)
+
+    return pd.DataFrame({
+        'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume,
+    }, index=index)
+
+
+def make_download_frame(tickers, n_days, group_by='column', seed=0):
+    """模拟多 Ticker 的 yf.download 结果 (MultiIndex 列)
+
+    group_by='column' -> (字段, Ticker)，group_by='ticker' -> (Ticker, 字段)。
+    以 '-USD' 结尾的 Ticker 按自然日生成 (加密货币周末也交易)，其余按工作日生成，用来覆盖面板对齐的开销。
+    """
+    frames = {}
+    for i, t in enumerate(tickers):
+        freq = 'D' if t.endswith('-USD') else 'B'
+        frames[t] = make_price_history(n_days, seed=seed + i, start_price=50.0 + 10 * i, freq=freq)
+    data = pd.concat(frames, axis=1, sort=True)  # (Ticker, 字段)
+    if group_by != 'ticker':
+        data = data.swaplevel(0, 1, axis=1).sort_index(axis=1, level=0, sort_remaining=False)
+    return data
+
+
+def make_tickers(n):
+    """生成 n 个 Ticker 名称，前两个固定为 BTC-USD 与 ^GSPC"""
+    base = ['BTC-USD', '^GSPC']
+    return (base + [f"T{i:03d}" for i in range(max(n - 2, 0))])[:n]
+
+
+def make_trade_log(n_trades, tickers=('SPY', 'BTC-USD', 'ETH-USD', 'QQQ'), seed=0, end=None, sell_every=0):
+    """生成与 trade_log.xlsx 相同结构的定投记录 (Date / Ticker / Shares / Cost_CNY)
+
+    sell_every=k 时每个 Ticker 的每第 k 笔改为卖出 (卖掉上一笔买入份额的一半，不会超卖)，并附带 Fee_CNY 列。
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or "2025-12-31")
+    dates = end - pd.to_timedelta(np.sort(rng.integers(0, 5 * 365, n_trades))[::-1], unit='D')
+    chosen = rng.choice(list(tickers), n_trades)
+    cost = rng.choice([50, 100, 200, 500], n_trades)
+    shares = cost / rng.uniform(10, 5000, n_trades)
+    df = pd.DataFrame({'Date': dates, 'Ticker': chosen, 'Shares': shares, 'Cost_CNY': cost.astype(float)})
+    if sell_every:
+        k = df.groupby('Ticker').cumcount()
+        sell = (k % sell_every == sell_every - 1).to_numpy()
+        prev = df.groupby('Ticker')['Shares'].shift(1).to_numpy()
+        df.loc[sell, 'Shares'] = -prev[sell] / 2
+        df.loc[sell, 'Cost_CNY'] = -prev[sell] / 2 * rng.uniform(10, 5000, sell.sum())
+        df['Fee_CNY'] = df['Cost_CNY'].abs() * 0.001
+    return df
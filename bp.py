@@ -1,12 +1,16 @@
-import yfinance as yf
 import pandas as pd
-import plotly.graph_objects as go
 from datetime import datetime
-import os
+
+import market_data
+import regimes
+import window_cache
+from charts import add_regime_shading, build_trend_figure
+from data_quality import latest_report, print_report
+from data_client import fetch_bars
+from price_store import RESOLUTION_NAMES
 
 # 1. 代理配置 (保持你原有的设置)
-os.environ["http_proxy"] = "http://127.0.0.1:7890"
-os.environ["https_proxy"] = "http://127.0.0.1:7890"
+market_data.configure_proxy()  # MARKET_DATA=replay / fake 时不联网，不设代理
 
 ticker = "^GSPC"
 
@@ -31,30 +35,34 @@ def analyze_sp500_interactive():
     if not user_period:
         user_period = "1y"
 
+    analyze_sp500(user_period)
+
+
+def analyze_sp500(user_period="1y", show=True):
+    """分析 + 打印简报，返回图表；show=False 时不打开浏览器 (report_builder 批量生成报告时使用)"""
     print(f"\n正在获取 {ticker} 过去 [{user_period}] 的数据，请稍候...")
 
-    # 2. 获取数据与清洗
-    # 使用 period 参数直接下载，无需手动计算 start_date
+    # 2. 获取数据 (本地行情仓库: 只增量下载新数据，并自动选择日线 / 周线 / 月线)
+    # MA200 / 回撤 / 乖离率在完整日线历史上预先算好，所以即使选 1mo 也能看到有效的 MA200
     try:
-        data = yf.download(ticker, period=user_period, progress=False)
+        if user_period == 'max':
+            # 全部历史: 直接按月线 / 周线块读取本地仓库，不先读完整段日线再降采样
+            data = window_cache.load_full(ticker)
+        else:
+            data = fetch_bars(ticker, user_period)
     except Exception as e:
         print(f"❌ 下载失败: {e}")
-        return
+        return None
 
     # 检查数据是否为空
     if data.empty:
         print("❌ 未获取到数据，请检查网络或输入的时间周期代码是否正确。")
-        return
-
-    if isinstance(data.columns, pd.MultiIndex):
-        data.columns = data.columns.get_level_values(0)
+        return None
 
-    # 3. 计算指标
-    # 注意：如果选择的时间太短（如1mo），MA200 将无法计算（显示为NaN），这是正常的数学逻辑
-    data['MA200'] = data['Close'].rolling(window=200).mean()
-    data['Peak'] = data['Close'].cummax()
-    data['Drawdown'] = (data['Close'] - data['Peak']) / data['Peak']
-    data['Bias'] = (data['Close'] - data['MA200']) / data['MA200']  # 乖离率
+    print_report(latest_report([ticker]))  # 仓库更新时做过的数据质量校验
+    resolution = data.attrs.get('resolution', '1d')
+    if resolution != '1d':
+        print(f"ℹ️ 数据点较多，图表使用 {RESOLUTION_NAMES[resolution]} 显示 (指标仍按日线计算)。")
 
     # 4. 获取最新数值
     current_price = data['Close'].iloc[-1].item()
@@ -101,62 +109,36 @@ def analyze_sp500_interactive():
     else:
         print("☕️ 心态提示: 市场波动正常，安心持有。")
 
+    # 完整日线历史上的牛熊 / 回撤区间 (与所选周期无关，新 K 线到来时只重算最后几段)
+    try:
+        regime_table, drawdown_table = regimes.load([ticker])
+        for line in regimes.describe(regimes.summarize(regime_table, drawdown_table), ticker):
+            print(line)
+        shading = regimes.shading_periods(regime_table, drawdown_table, ticker)
+    except Exception as e:
+        print(f"⚠️ 牛熊区间统计失败: {e}")
+        shading = None
+
     # ==========================================
     # 6. Plotly 交互式绘图部分
     # ==========================================
     print("-" * 40)
     print("📊 正在生成交互式图表...")
 
-    fig = go.Figure()
-
-    # --- 添加收盘价曲线 ---
-    fig.add_trace(go.Scatter(
-        x=data.index,
-        y=data['Close'],
-        mode='lines',
+    fig = build_trend_figure(
+        data,
         name='S&P 500 Price',
-        line=dict(color='#00BFFF', width=2),
-        customdata=data['Bias'],
-        hovertemplate=(
-            '<b>日期</b>: %{x|%Y-%m-%d}<br>'
-            '<b>价格</b>: $%{y:,.2f}<br>'
-            '<b>乖离率</b>: %{customdata:.2%}<extra></extra>'
-        )
-    ))
-
-    # --- 添加 200日均线 (只有当数据足够时才显示) ---
-    if ma_status == "有效":
-        fig.add_trace(go.Scatter(
-            x=data.index,
-            y=data['MA200'],
-            mode='lines',
-            name='200-Day MA (Bull/Bear Line)',
-            line=dict(color='orange', width=2, dash='dash'),
-            hovertemplate='<b>均线成本</b>: $%{y:,.2f}<extra></extra>'
-        ))
-
-    # --- 配置布局 ---
-    fig.update_layout(
-        title=dict(
-            text=f'S&P 500 趋势分析 ({user_period})',
-            font=dict(size=20)
-        ),
-        xaxis_title='Date',
-        yaxis_title='Price (USD)',
-        template='plotly_dark',
-        hovermode="x unified",
-        legend=dict(
-            yanchor="top",
-            y=0.99,
-            xanchor="left",
-            x=0.01,
-            bgcolor="rgba(0,0,0,0.5)"
-        ),
-        dragmode='zoom'
+        title=f'S&P 500 趋势分析 ({user_period})',
+        price_color='#00BFFF',
+        ma_color='orange',
     )
+    if shading is not None:
+        add_regime_shading(fig, *shading)
 
-    print("✅ 窗口已打开。请在浏览器中查看图表。")
-    fig.show()
+    if show:
+        print("✅ 窗口已打开。请在浏览器中查看图表。")
+        fig.show()
+    return fig
 
 
 if __name__ == "__main__":
@@ -0,0 +1,217 @@
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+
+# --- 牛熊线趋势图 (bp / nasdaq / crypto 脚本共用) ---
+def build_trend_figure(data, name, title, price_color='#00BFFF', ma_color='orange',
+                       ma_name='200-Day MA (Bull/Bear Line)', yaxis_title='Price (USD)',
+                       price_hover='<b>价格</b>: $%{y:,.2f}<br>',
+                       ma_hover='<b>均线成本</b>: $%{y:,.2f}<extra></extra>'):
+    """价格曲线 + 200日均线 (数据足够时才画)，data 需先经过 add_trend_indicators"""
+    fig = go.Figure()
+
+    # --- 添加收盘价曲线 ---
+    fig.add_trace(go.Scatter(
+        x=data.index,
+        y=data['Close'],
+        mode='lines',
+        name=name,
+        line=dict(color=price_color, width=2),
+        customdata=data['Bias'],
+        hovertemplate=(
+            '<b>日期</b>: %{x|%Y-%m-%d}<br>'
+            + price_hover +
+            '<b>乖离率</b>: %{customdata:.2%}<extra></extra>'
+        )
+    ))
+
+    # --- 添加 200日均线 (只有当数据足够时才显示) ---
+    if data['MA200'].notna().iloc[-1]:
+        fig.add_trace(go.Scatter(
+            x=data.index,
+            y=data['MA200'],
+            mode='lines',
+            name=ma_name,
+            line=dict(color=ma_color, width=2, dash='dash'),
+            hovertemplate=ma_hover
+        ))
+
+    # --- 配置布局 ---
+    fig.update_layout(
+        title=dict(
+            text=title,
+            font=dict(size=20)
+        ),
+        xaxis_title='Date',
+        yaxis_title=yaxis_title,
+        template='plotly_dark',
+        hovermode="x unified",
+        legend=dict(
+            yanchor="top",
+            y=0.99,
+            xanchor="left",
+            x=0.01,
+            bgcolor="rgba(0,0,0,0.5)"
+        ),
+        dragmode='zoom'
+    )
+    return fig
+
+
+# --- 区间着色 (regimes 的熊市 / 回撤区间) ---
+def add_period_shading(fig, periods, color, name=None):
+    """把 periods (Start / End 两列) 画成竖向的半透明色带，只保留与图中日期范围重叠的部分"""
+    xs = [x for trace in fig.data if getattr(trace, 'x', None) is not None and len(trace.x)
+          for x in (trace.x[0], trace.x[-1])]
+    if periods.empty or not xs:
+        return fig
+    lo, hi = pd.Timestamp(min(xs)), pd.Timestamp(max(xs))
+    visible = periods[(periods['End'] >= lo) & (periods['Start'] <= hi)]
+    shapes = [dict(type='rect', xref='x', yref='paper', x0=max(s, lo), x1=min(e, hi), y0=0, y1=1,
+                   fillcolor=color, line_width=0, layer='below')
+              for s, e in zip(visible['Start'], visible['End'])]
+    if shapes and name:
+        shapes[0].update(name=name, showlegend=True)  # 只给第一块加图例
+    fig.update_layout(shapes=list(fig.layout.shapes) + shapes)
+    return fig
+
+
+def add_regime_shading(fig, bear_periods, drawdown_periods):
+    """熊市区间 (红) + 深度回撤区间 (灰)；参数为 regimes.shading_periods 的结果"""
+    add_period_shading(fig, drawdown_periods, 'rgba(160, 160, 160, 0.18)', '深度回撤 (前高 → 修复)')
+    add_period_shading(fig, bear_periods, 'rgba(255, 80, 80, 0.15)', '熊市 (低于 MA200)')
+    return fig
+
+
+# --- 深度技术分析图 (Dashboard 个股分析页) ---
+# 每个图层独立生成，方便 figure_cache 按图层缓存：切换 MA200 / 布林带 / 副图时只需补上新图层
+MAIN_LAYERS = ('price', 'ma200', 'boll')
+SUB_LAYERS = {"RSI": 'rsi', "MACD": 'macd'}
+
+
+def analysis_layers(show_ma200=True, show_boll=False, sub_chart="无"):
+    """根据图表设置返回需要的图层名称"""
+    layers = ['price']
+    if show_ma200: layers.append('ma200')
+    if show_boll: layers.append('boll')
+    if sub_chart in SUB_LAYERS: layers.append(SUB_LAYERS[sub_chart])
+    return layers
+
+
+def analysis_layer_traces(df, layer):
+    """单个图层的 trace 列表；df 需先经过 add_technical_indicators"""
+    if layer == 'price':
+        return [go.Scatter(x=df.index, y=df['Close'], name='Price', line=dict(color='#00BFFF'))]
+    if layer == 'ma200':
+        return [go.Scatter(x=df.index, y=df['MA200'], name='MA200', line=dict(color='orange', dash='dash'))]
+    if layer == 'boll':
+        return [go.Scatter(x=df.index, y=df['Upper_Band'], showlegend=False, line=dict(width=0)),
+                go.Scatter(x=df.index, y=df['Lower_Band'], fill='tonexty',
+                           fillcolor='rgba(255,255,255,0.1)', showlegend=False,
+                           line=dict(width=0))]
+    if layer == 'rsi':
+        return [go.Scatter(x=df.index, y=df['RSI'], name='RSI', line=dict(color='purple'))]
+    if layer == 'macd':
+        return [go.Scatter(x=df.index, y=df['MACD'], name='DIF', line=dict(color='yellow')),
+                go.Scatter(x=df.index, y=df['Signal_Line'], name='DEA', line=dict(color='cyan')),
+                go.Bar(x=df.index, y=(df['MACD'] - df['Signal_Line']) * 2, name='Hist')]
+    raise ValueError(f"未知图层: {layer}")
+
+
+def compose_analysis_figure(layer_traces, sub_chart="无"):
+    """把 {图层名: trace 列表} 组装成主图 + 副图；trace 会被 plotly 复制，传入的对象不会被修改"""
+    rows = 2 if sub_chart != "无" else 1
+    fig = make_subplots(rows=rows, cols=1, shared_xaxes=True,
+                        row_heights=[0.7, 0.3] if rows == 2 else [1])
+
+    for layer, traces in layer_traces.items():
+        row = 1 if layer in MAIN_LAYERS else 2
+        fig.add_traces(list(traces), rows=[row] * len(traces), cols=[1] * len(traces))
+
+    if sub_chart == "RSI":
+        fig.add_hline(y=70, line_dash="dot", line_color="red", row=2, col=1)
+        fig.add_hline(y=30, line_dash="dot", line_color="green", row=2, col=1)
+
+    fig.update_layout(height=600, template="plotly_dark", hovermode="x unified")
+    return fig
+
+
+def build_analysis_figure(df, show_ma200=True, show_boll=False, sub_chart="无"):
+    """主图价格 + 可选 MA200 / 布林带，副图可选 RSI / MACD；df 需先经过 add_technical_indicators"""
+    layers = analysis_layers(show_ma200, show_boll, sub_chart)
+    return compose_analysis_figure({layer: analysis_layer_traces(df, layer) for layer in layers}, sub_chart)
+
+
+# --- XIRR 演变曲线 (portfolio_manager) ---
+def build_xirr_figure(curve, title='年化效率 (XIRR) 演变'):
+    """上图 XIRR 曲线，下图累计投入 vs 市值；curve 为 xirr_solver.xirr_curve 的结果"""
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.6, 0.4])
+    fig.add_trace(go.Scatter(x=curve.index, y=curve['xirr'], name='XIRR', mode='lines+markers',
+                             line=dict(color='#00BFFF'),
+                             hovertemplate='<b>日期</b>: %{x|%Y-%m-%d}<br><b>XIRR</b>: %{y:.2%}<extra></extra>'),
+                  row=1, col=1)
+    fig.add_hline(y=0, line_dash="dash", line_color="gray", row=1, col=1)
+    fig.add_trace(go.Scatter(x=curve.index, y=curve['invested'], name='累计投入', line=dict(color='gray', dash='dot')),
+                  row=2, col=1)
+    fig.add_trace(go.Scatter(x=curve.index, y=curve['value'], name='市值', line=dict(color='orange')),
+                  row=2, col=1)
+    fig.update_yaxes(tickformat='.0%', row=1, col=1)
+    fig.update_layout(title=dict(text=title, font=dict(size=20)), height=600, template="plotly_dark",
+                      hovermode="x unified")
+    return fig
+
+
+def build_benchmark_figure(result, title='我的组合 vs 全部买基准'):
+    """上图各曲线的 XIRR，下图市值 vs 累计投入；result 为 benchmark_dca.compare 的结果 (第一列为真实组合)"""
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.5, 0.5])
+    palette = ['#00BFFF', 'orange', '#d62728', '#2ca02c', '#9467bd', '#8c564b']
+    for k, name in enumerate(result['value'].columns):
+        color = palette[k % len(palette)]
+        dash = None if k == 0 else 'dash'
+        fig.add_trace(go.Scatter(x=result['xirr'].index, y=result['xirr'][name], name=name, legendgroup=name,
+                                 line=dict(color=color, dash=dash),
+                                 hovertemplate='%{x|%Y-%m-%d} XIRR: %{y:.2%}<extra>' + name + '</extra>'),
+                      row=1, col=1)
+        fig.add_trace(go.Scatter(x=result['value'].index, y=result['value'][name], name=name, legendgroup=name,
+                                 showlegend=False, line=dict(color=color, dash=dash),
+                                 hovertemplate='%{x|%Y-%m-%d} 市值: ¥%{y:,.0f}<extra>' + name + '</extra>'),
+                      row=2, col=1)
+    fig.add_trace(go.Scatter(x=result['invested'].index, y=result['invested'], name='累计投入',
+                             line=dict(color='gray', dash='dot')), row=2, col=1)
+    fig.add_hline(y=0, line_dash="dash", line_color="gray", row=1, col=1)
+    fig.update_yaxes(tickformat='.0%', row=1, col=1)
+    fig.update_layout(title=dict(text=title, font=dict(size=20)), height=600, template="plotly_dark",
+                      hovermode="x unified")
+    return fig
+
+
+# --- 周期收益热力图 (returns_table) ---
+def build_returns_heatmap(table, title, height=None, zmid=0.0, max_text_cells=400):
+    """行 × 列的收益率热力图 (红涨绿跌，zmid 为白色)；格子不多时标注百分比，资产很多时只在悬停时显示"""
+    z = table.to_numpy(dtype=float)
+    text = [[f"{v:.1%}" if v == v else "" for v in row] for row in z]
+    fig = go.Figure(go.Heatmap(z=z, x=[str(c) for c in table.columns], y=[str(i) for i in table.index],
+                               text=text, texttemplate="%{text}" if z.size <= max_text_cells else None, zmid=zmid,
+                               colorscale=[[0, '#1a9850'], [0.5, '#ffffff'], [1, '#d73027']],
+                               hovertemplate='%{y} %{x}: %{text}<extra></extra>', colorbar=dict(tickformat='.0%')))
+    fig.update_yaxes(autorange='reversed', type='category')
+    fig.update_xaxes(type='category', side='top')
+    fig.update_layout(title=title, height=height or min(max(300, 28 * len(table) + 120), 1000))
+    return fig
+
+
+# --- 预测图 (fast_forecast，样式对齐 prophet.plot.plot_plotly) ---
+def build_forecast_figure(history, forecast, title):
+    """黑点为实际值，蓝线为预测值，浅蓝色带为置信区间；history 为 ds / y，forecast 为 Prophet 格式"""
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=history['ds'], y=history['y'], name='Actual', mode='markers',
+                             marker=dict(color='black', size=4)))
+    fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat_lower'], mode='lines', line=dict(width=0),
+                             hoverinfo='skip', showlegend=False))
+    fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat_upper'], name='置信区间', mode='lines',
+                             line=dict(width=0), fill='tonexty', fillcolor='rgba(0, 114, 178, 0.2)'))
+    fig.add_trace(go.Scatter(x=forecast['ds'], y=forecast['yhat'], name='Predicted', mode='lines',
+                             line=dict(color='#0072B2', width=2)))
+    fig.update_layout(title=title, showlegend=False)
+    return fig
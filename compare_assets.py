@@ -1,20 +1,32 @@
-import yfinance as yf
 import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime
-import os
+
+from corporate_actions import BASIS_NAMES
+import market_data
+import relative_strength
+from indicators import align_panel, normalize_returns
+from data_client import fetch_panel
 
 # 1. 代理配置
-os.environ["http_proxy"] = "http://127.0.0.1:7890"
-os.environ["https_proxy"] = "http://127.0.0.1:7890"
+market_data.configure_proxy()  # MARKET_DATA=replay / fake 时不联网，不设代理
+
+
+# 默认对决: 比特币 vs 标普500；可以传入任意多个 Ticker
+DEFAULT_TICKERS = ['BTC-USD', '^GSPC']
+NAMES = {'BTC-USD': 'Bitcoin (BTC)', '^GSPC': 'S&P 500'}  # 映射名称，方便展示
+COLORS = {'BTC-USD': '#FFA500', '^GSPC': '#4169E1'}  # 橙色 / 皇家蓝，其他资产用 Plotly 默认配色
 
 
 def compare_crypto_stock_interactive():
     print("-" * 50)
-    print("⚔️  资产大对决: 比特币 (BTC) vs 标普500 (S&P 500)")
+    print("⚔️  资产大对决 (默认: 比特币 vs 标普500)")
     print("-" * 50)
 
-    # --- 1. 用户选择时间周期 ---
+    # --- 1. 用户选择资产和时间周期 ---
+    user_tickers = input("👉 请输入要对比的代码，逗号分隔 (默认 BTC-USD, ^GSPC): ").strip()
+    tickers = [t.strip().upper() for t in user_tickers.split(',') if t.strip()] or DEFAULT_TICKERS
+
     print("请输入对比的时间周期：")
     print("  1mo  = 过去1个月")
     print("  6mo  = 过去6个月")
@@ -27,75 +39,60 @@ def compare_crypto_stock_interactive():
     if not user_period:
         user_period = "1y"
 
-    print(f"\n正在下载数据 (周期: {user_period})...")
+    compare_crypto_stock(user_period, tickers=tickers)
 
-    # 定义要对比的资产
-    tickers = ['BTC-USD', '^GSPC']
 
-    # 映射名称，方便展示
-    names = {
-        'BTC-USD': 'Bitcoin (BTC)',
-        '^GSPC': 'S&P 500'
-    }
+def compare_crypto_stock(user_period="1y", show=True, tickers=None):
+    """计算累计收益并打印排行榜，返回图表；show=False 时不打开浏览器 (report_builder 批量生成报告时使用)"""
+    tickers = list(tickers or DEFAULT_TICKERS)
+    print(f"\n正在下载数据 (周期: {user_period})...")
 
     # --- 2. 获取数据 ---
+    # 本地行情仓库 (增量下载) + 本地复权，与 Dashboard 各页面同一收益口径
     try:
-        # group_by='ticker' 让列结构更清晰
-        data = yf.download(tickers, period=user_period, progress=False, group_by='ticker')
+        df_close = fetch_panel(tickers, user_period)
     except Exception as e:
         print(f"❌ 下载失败: {e}")
-        return
+        return None
 
     # --- 3. 数据清洗 (关键步骤) ---
-    # 提取 Close 列。因为 group_by='ticker'，结构变成了 (Ticker, Close)
-    # 我们需要重构 DataFrame，只保留收盘价
-    df_close = pd.DataFrame()
-
-    for t in tickers:
-        # yfinance有时返回多级索引，有时返回单级，做个兼容
-        try:
-            if isinstance(data.columns, pd.MultiIndex):
-                # 尝试获取对应 Ticker 的 Close 列
-                df_close[t] = data[t]['Close']
-            else:
-                # 如果下载单个可能会结构不同，但这里下载了俩，通常是MultiIndex
-                pass
-        except KeyError:
-            print(f"❌ 无法找到 {t} 的数据")
-            return
+    missing = [t for t in tickers if t not in df_close.columns]
+    if missing:
+        print(f"❌ 无法找到 {', '.join(missing)} 的数据")
+        return None
+    print(f"ℹ️ 收益口径: {BASIS_NAMES[df_close.attrs['basis']]}")
 
     # 检查数据完整性
     if df_close.empty:
         print("❌ 数据为空，请检查网络。")
-        return
+        return None
 
     # 填充空值 (bfill/ffill)
     # 解释: 美股周末休市，BTC周末不休市。如果不填充，计算时会导致大量NaN。
     # 用前一天的价格填补当天的空缺 (ffill) 是最合理的做法。
-    df_close = df_close.ffill().bfill()
+    df_close = align_panel(df_close)
 
     # --- 4. 归一化计算 (改为百分比收益) ---
     # 公式: (当前价格 - 初始价格) / 初始价格
     # 结果: 0.10 代表涨了 10%
-    normalized_data = (df_close / df_close.iloc[0]) - 1
+    normalized_data = normalize_returns(df_close)
 
-    # --- 5. 终端打印简报 ---
-    btc_return = normalized_data['BTC-USD'].iloc[-1]
-    sp500_return = normalized_data['^GSPC'].iloc[-1]
+    # --- 5. 终端打印排行榜 (N 个资产的两两比较一次算完) ---
+    board, pairs, wins, _ = relative_strength.leaderboard(df_close)
 
     print("-" * 50)
     print(f"📊 最终战绩汇报 ({user_period})")
     print("-" * 50)
-    print(f"🟠 比特币 (BTC) 累计收益: {btc_return:+.2%}")
-    print(f"🔵 标普500 (S&P) 累计收益: {sp500_return:+.2%}")
+    for i, (t, row) in enumerate(board.iterrows(), 1):
+        print(f"{i:>2}. {NAMES.get(t, t):<16} 累计收益: {row['total_return']:+.2%}  "
+              f"滚动 {board.attrs['window']} 日跑赢率: {row['win_rate']:.0%}")
     print("-" * 50)
 
-    if btc_return > sp500_return:
-        diff = (btc_return - sp500_return) * 100
-        print(f"🏆 胜者: 比特币 (领先 {diff:.2f} 个百分点)")
-    else:
-        diff = (sp500_return - btc_return) * 100
-        print(f"🏆 胜者: 标普500 (领先 {diff:.2f} 个百分点)")
+    winner, runner_up = board.index[0], board.index[1]
+    diff = (board['total_return'].iloc[0] - board['total_return'].iloc[1]) * 100
+    print(f"🏆 胜者: {NAMES.get(winner, winner)} (领先 {NAMES.get(runner_up, runner_up)} {diff:.2f} 个百分点)")
+    if len(board) > 2:
+        print(f"🐢 垫底: {NAMES.get(board.index[-1], board.index[-1])}")
     print("-" * 50)
 
     # --- 6. Plotly 交互式绘图 ---
@@ -103,33 +100,25 @@ def compare_crypto_stock_interactive():
 
     fig = go.Figure()
 
-    # 比特币曲线
-    fig.add_trace(go.Scatter(
-        x=normalized_data.index,
-        y=normalized_data['BTC-USD'],
-        mode='lines',
-        name=names['BTC-USD'],
-        line=dict(color='#FFA500', width=2),  # 橙色
-        hovertemplate='<b>日期</b>: %{x|%Y-%m-%d}<br><b>收益</b>: %{y:.2%}<extra></extra>'
-    ))
-
-    # 标普500曲线
-    fig.add_trace(go.Scatter(
-        x=normalized_data.index,
-        y=normalized_data['^GSPC'],
-        mode='lines',
-        name=names['^GSPC'],
-        line=dict(color='#4169E1', width=2),  # 皇家蓝
-        hovertemplate='<b>日期</b>: %{x|%Y-%m-%d}<br><b>收益</b>: %{y:.2%}<extra></extra>'
-    ))
+    # 按排行榜顺序画每个资产的累计收益曲线
+    for t in board.index:
+        fig.add_trace(go.Scatter(
+            x=normalized_data.index,
+            y=normalized_data[t],
+            mode='lines',
+            name=NAMES.get(t, t),
+            line=dict(color=COLORS.get(t), width=2),
+            hovertemplate='<b>日期</b>: %{x|%Y-%m-%d}<br><b>收益</b>: %{y:.2%}<extra></extra>'
+        ))
 
     # 添加一条 0% 的基准线 (盈亏平衡线)
     fig.add_hline(y=0, line_dash="dash", line_color="gray", annotation_text="0% 起跑线")
 
     # 配置布局
+    title = ' vs '.join(NAMES.get(t, t) for t in tickers) if len(tickers) <= 3 else f'{len(tickers)} 个资产'
     fig.update_layout(
         title=dict(
-            text=f'Bitcoin vs S&P 500 累计收益率对比 ({user_period})',
+            text=f'{title} 累计收益率对比 ({user_period})',
             font=dict(size=20)
         ),
         xaxis_title='日期',
@@ -147,8 +136,10 @@ def compare_crypto_stock_interactive():
         dragmode='zoom'
     )
 
-    print("✅ 窗口已打开。")
-    fig.show()
+    if show:
+        print("✅ 窗口已打开。")
+        fig.show()
+    return fig
 
 
 if __name__ == "__main__":
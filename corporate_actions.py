@@ -0,0 +1,135 @@
+"""公司行为 (拆股 / 分红) 缓存 + 复权计算
+
+price_store 里缓存的日线是雅虎的 Close: 已按拆股调整，但没有按分红调整 (auto_adjust=False 的口径)。
+复权序列不再依赖雅虎的 Adj Close 列 (每出现一次新分红，整列历史都会变，只能整段重新下载)，而是在本地按需计算:
+- 每个 Ticker 的拆股 / 分红记录缓存在 STORE_DIR/<ticker>_actions.parquet，增量下载时顺带更新
+- 新分红只需要重算复权因子 (向量化，O(分红次数 + 行数))，不用重新下载历史
+- 新拆股时把本地缓存的旧行情按拆股比例换算，同样不用整段重下
+
+口径 (basis):
+    price         只做拆股调整的收盘价 (K 线 / 均线 / 估值用)
+    total_return  分红再投资的全收益价格 (比较收益率、相关性时用，与雅虎 Adj Close 同一算法)
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# --- 配置区域 ---
+STORE_DIR = os.environ.get("PRICE_STORE_DIR", "data_store")
+RETURN_BASIS = os.environ.get("RETURN_BASIS", "total_return")  # 所有页面比较收益率时统一使用的口径
+BASES = ('price', 'total_return')
+BASIS_NAMES = {'price': '价格收益 (不含分红)', 'total_return': '全收益 (含分红再投资)'}
+ACTION_COLS = ['Dividends', 'Stock Splits']
+PRICE_FIELDS = ['Open', 'High', 'Low', 'Close']
+
+_lock = threading.Lock()
+
+
+def _path(ticker):
+    safe = ticker.replace('^', '_').replace('=', '_').replace('/', '_')
+    return os.path.join(STORE_DIR, f"{safe}_actions.parquet")
+
+
+def _empty():
+    return pd.DataFrame(columns=ACTION_COLS, index=pd.DatetimeIndex([], name='Date'), dtype=float)
+
+
+def load_actions(ticker):
+    """本地缓存的拆股 / 分红记录 (只含非零行)"""
+    path = _path(ticker)
+    if not os.path.exists(path):
+        return _empty()
+    return pd.read_parquet(path)
+
+
+def extract_actions(frame):
+    """从 yf.download(actions=True) 的结果里取出非零的拆股 / 分红行"""
+    cols = [c for c in ACTION_COLS if c in frame.columns]
+    if not cols:
+        return _empty()
+    actions = frame[cols].reindex(columns=ACTION_COLS).fillna(0.0).astype(float)
+    actions = actions[(actions != 0).any(axis=1)]
+    actions.index.name = 'Date'
+    return actions
+
+
+def record_actions(ticker, actions, replace=False):
+    """把新下载到的公司行为并入缓存，返回此前没有记录过的行 (调用方据此判断是否出现了新拆股)
+
+    replace=True 用于整段重建: 以这次下载的完整记录为准。
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    with _lock:
+        cached = _empty() if replace else load_actions(ticker)
+        new = actions[~actions.index.isin(cached.index)]
+        # 新拆股之前的分红也要换算成拆股后的口径 (雅虎返回的分红金额同样是按拆股调整过的)
+        new_splits = new['Stock Splits'][new['Stock Splits'] > 0]
+        if not new_splits.empty and not cached.empty:
+            cached = cached.copy()
+            cached['Dividends'] = cached['Dividends'] / split_factor(cached.index, new_splits)
+        merged = pd.concat([cached, actions])
+        merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+        path = _path(ticker)
+        merged.to_parquet(path + ".tmp")
+        os.replace(path + ".tmp", path)
+    return new
+
+
+# --- 复权因子 ---
+def split_factor(index, splits):
+    """每个日期之后发生的拆股比例连乘；旧行情价格 / 因子、成交量 × 因子 即换算到最新股本口径"""
+    splits = splits[splits > 0]
+    factor = np.ones(len(index))
+    if splits.empty:
+        return pd.Series(factor, index=index)
+    ratios = splits.to_numpy(dtype=float)
+    tail = np.append(np.cumprod(ratios[::-1])[::-1], 1.0)  # tail[k] = 第 k 次及之后所有拆股的连乘
+    k = np.searchsorted(splits.index.to_numpy(), index.to_numpy(), side='right')
+    return pd.Series(tail[k], index=index)
+
+
+def dividend_factor(close, dividends):
+    """分红复权因子 (雅虎 Adj Close 的算法): 除息日之前的价格 × (1 - 分红 / 除息前一日收盘价)
+
+    分红按除息日从后往前连乘，一次 searchsorted 映射到每一行；新增一次分红只是多一个乘数。
+    """
+    close = close.dropna()
+    factor = pd.Series(1.0, index=close.index)
+    dividends = dividends[(dividends > 0) & (dividends.index > close.index[0])] if len(close) else dividends[:0]
+    if dividends.empty:
+        return factor
+    idx = close.index.to_numpy()
+    pos = np.searchsorted(idx, dividends.index.to_numpy(), side='left')  # 除息日 (或之后第一个交易日) 的位置
+    keep = pos < len(idx)
+    pos, amounts = pos[keep], dividends.to_numpy(dtype=float)[keep]
+    if pos.size == 0:
+        return factor
+    mult = 1.0 - amounts / close.to_numpy()[pos - 1]
+    tail = np.append(np.cumprod(mult[::-1])[::-1], 1.0)
+    k = np.searchsorted(pos, np.arange(len(idx)), side='right')  # 第一个 "除息位置 > 当前行" 的分红
+    return pd.Series(tail[k], index=close.index)
+
+
+def rebase_for_splits(bars, splits):
+    """出现新拆股时，把本地缓存的旧行情换算到拆股后的口径 (代替整段重新下载)"""
+    factor = split_factor(bars.index, splits)
+    out = bars.copy()
+    for c in PRICE_FIELDS + ['Adj Close']:
+        if c in out.columns:
+            out[c] = out[c] / factor
+    if 'Volume' in out.columns:
+        out['Volume'] = out['Volume'] * factor
+    return out
+
+
+def adjusted_close(close, actions, basis=None):
+    """按口径返回收盘价序列: price = 原样 (已拆股调整)，total_return = 含分红再投资"""
+    basis = basis or RETURN_BASIS
+    if basis not in BASES:
+        raise ValueError(f"未知的复权口径: {basis} (可选 {', '.join(BASES)})")
+    if basis == 'price':
+        return close
+    factor = dividend_factor(close, actions['Dividends'] if 'Dividends' in actions else pd.Series(dtype=float))
+    return close * factor.reindex(close.index)
@@ -1,12 +1,15 @@
-import yfinance as yf
 import pandas as pd
-import plotly.graph_objects as go
 from datetime import datetime
-import os
+
+import market_data
+import regimes
+from charts import add_regime_shading, build_trend_figure
+from data_quality import latest_report, print_report
+from data_client import fetch_bars
+from price_store import RESOLUTION_NAMES
 
 # 1. 代理配置
-os.environ["http_proxy"] = "http://127.0.0.1:7890"
-os.environ["https_proxy"] = "http://127.0.0.1:7890"
+market_data.configure_proxy()  # MARKET_DATA=replay / fake 时不联网，不设代理
 
 
 def get_user_input():
@@ -25,7 +28,8 @@ def get_user_input():
     return period
 
 
-def analyze_single_crypto(ticker, name, color_code, period):
+def analyze_single_crypto(ticker, name, color_code, period, show=True):
+    """分析单个币种并打印报告，返回图表；show=False 时不打开浏览器"""
     print(f"\n📡 正在获取 {name} ({ticker}) 数据...")
 
     # --- 2. 动态阈值配置 (Domain Knowledge) ---
@@ -39,26 +43,22 @@ def analyze_single_crypto(ticker, name, color_code, period):
         bias_threshold = 0.80  # 以太坊: 乖离率80%才算过热
         ma_color = 'cyan'  # 均线颜色区分
 
-    # --- 3. 获取数据 ---
+    # --- 3. 获取数据 (本地行情仓库，增量更新；周期很长时自动改用周线 / 月线显示) ---
     try:
-        data = yf.download(ticker, period=period, progress=False)
+        data = fetch_bars(ticker, period)
     except Exception as e:
         print(f"❌ {name} 下载失败: {e}")
-        return
+        return None
 
     if data.empty:
         print(f"❌ {name} 数据为空。")
-        return
-
-    # 清洗数据
-    if isinstance(data.columns, pd.MultiIndex):
-        data.columns = data.columns.get_level_values(0)
+        return None
 
-    # --- 4. 计算指标 ---
-    data['MA200'] = data['Close'].rolling(window=200).mean()
-    data['Peak'] = data['Close'].cummax()
-    data['Drawdown'] = (data['Close'] - data['Peak']) / data['Peak']
-    data['Bias'] = (data['Close'] - data['MA200']) / data['MA200']
+    # --- 4. 指标已在完整日线历史上预先算好 (MA200 / Peak / Drawdown / Bias) ---
+    print_report(latest_report([ticker]))  # 仓库更新时做过的数据质量校验
+    resolution = data.attrs.get('resolution', '1d')
+    if resolution != '1d':
+        print(f"ℹ️ {name} 数据点较多，图表使用 {RESOLUTION_NAMES[resolution]} 显示。")
 
     # 获取最新数据
     current_price = data['Close'].iloc[-1].item()
@@ -104,77 +104,41 @@ def analyze_single_crypto(ticker, name, color_code, period):
     else:
         print("☕️ 操作建议 : 正常波动区间，保持定投节奏。")
 
-    # --- 6. Plotly 交互式绘图 ---
-    fig = go.Figure()
+    # 完整日线历史上的牛熊 / 回撤区间 (与所选周期无关，新 K 线到来时只重算最后几段)
+    try:
+        regime_table, drawdown_table = regimes.load([ticker])
+        for line in regimes.describe(regimes.summarize(regime_table, drawdown_table), ticker):
+            print(line)
+        shading = regimes.shading_periods(regime_table, drawdown_table, ticker)
+    except Exception as e:
+        print(f"⚠️ 牛熊区间统计失败: {e}")
+        shading = None
 
-    # 价格线
-    fig.add_trace(go.Scatter(
-        x=data.index,
-        y=data['Close'],
-        mode='lines',
+    # --- 6. Plotly 交互式绘图 ---
+    fig = build_trend_figure(
+        data,
         name=f'{name} Price',
-        line=dict(color=color_code, width=2),
-        customdata=data['Bias'],  # 传入乖离率数据供显示
-        hovertemplate=(
-            '<b>日期</b>: %{x|%Y-%m-%d}<br>'
-            '<b>价格</b>: $%{y:,.2f}<br>'
-            '<b>乖离率</b>: %{customdata:.2%}<extra></extra>'
-        )
-    ))
-
-    # 200日均线
-    if ma_status == "有效":
-        fig.add_trace(go.Scatter(
-            x=data.index,
-            y=data['MA200'],
-            mode='lines',
-            name='200-Day Bull/Bear Line',
-            line=dict(color=ma_color, width=2, dash='dash'),
-            hovertemplate='<b>均线成本</b>: $%{y:,.2f}<extra></extra>'
-        ))
-
-    # 布局设置
-    fig.update_layout(
-        title=dict(
-            text=f'{name} 趋势分析 ({period})',
-            font=dict(size=20)
-        ),
-        xaxis_title='Date',
-        yaxis_title='Price (USD)',
-        template='plotly_dark',
-        hovermode="x unified",
-        legend=dict(
-            yanchor="top",
-            y=0.99,
-            xanchor="left",
-            x=0.01,
-            bgcolor="rgba(0,0,0,0.5)"
-        )
+        title=f'{name} 趋势分析 ({period})',
+        price_color=color_code,
+        ma_color=ma_color,
+        ma_name='200-Day Bull/Bear Line',
     )
+    if shading is not None:
+        add_regime_shading(fig, *shading)
 
-    print(f"✅ {name} 图表已生成 (浏览器标签页)。")
-    fig.show()
+    if show:
+        print(f"✅ {name} 图表已生成 (浏览器标签页)。")
+        fig.show()
+    return fig
 
 
 def main():
     # 获取用户输入的时间周期
     target_period = get_user_input()
 
-    # 1. 分析比特币 (BTC) - 橙色
-    analyze_single_crypto(
-        ticker="BTC-USD",
-        name="Bitcoin (BTC)",
-        color_code="#FFA500",
-        period=target_period
-    )
-
-    # 2. 分析以太坊 (ETH) - 蓝紫色
-    analyze_single_crypto(
-        ticker="ETH-USD",
-        name="Ethereum (ETH)",
-        color_code="#6A5ACD",  # SlateBlue
-        period=target_period
-    )
+    # BTC (橙色) + ETH (蓝紫色) 合并成一个 HTML 报告，只打开一个浏览器标签页、只加载一次 plotly.js
+    from report_builder import build_report
+    build_report(['btc', 'eth'], target_period, open_browser=True)
 
     print("\n🎉 所有分析已完成，请查看浏览器。")
 
@@ -0,0 +1,230 @@
+"""投资日报: 多个组合 / 多台设备一次跑完，推送相对上一份快照的日变化
+
+- 订阅: daily_report.txt 每行 "<组合> <设备 key> [<设备 key> ...]"，key 可以写成 $环境变量名 (不把 key 提交进仓库)；
+  组合写成 * 表示账本里的所有组合；没有订阅文件时等价于 "default $BARK_KEY" (原来 portfolio_manager 写死的组合和设备)
+- 批量估值: 所有组合的 Ticker 取并集，价格和汇率各只取一次，再分别按组合的账本估值；
+  各组合的 XIRR 拼成一张现金流长表，一次 xirr_batch 向量化求解
+- 快照: 每个组合每天一份 (汇总 + 持仓，存在 portfolio_store)，日报和它之前最近的一份比较:
+  市值变化、当日盈亏 (扣除新投入)、XIRR 变化、涨跌最多的持仓；同一天重跑会覆盖当天的快照，比较对象不变
+
+命令行 (适合放进 crontab): python daily_report.py [--subscriptions daily_report.txt] [--dry-run]
+"""
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import bark
+import perf_monitor
+import portfolio_store
+import tax_lots
+from portfolio_manager import EXCEL_PATH, get_realtime_price, get_usd_cny_rate, value_portfolio, xirr_flows
+from xirr_solver import xirr_batch
+
+# --- 配置区域 ---
+SUBSCRIPTIONS_PATH = os.environ.get("DAILY_REPORT_SUBSCRIPTIONS", "daily_report.txt")
+DEFAULT_SUBSCRIPTIONS = [f"{portfolio_store.DEFAULT_PORTFOLIO} $BARK_KEY"]
+TOP_MOVERS = 2  # 涨幅 / 跌幅各列出几个持仓
+PUSH_WORKERS = 8  # 同时发送的推送数
+REPORT_URL = "https://finance.yahoo.com/quote/SPY"
+
+
+# --- 订阅 ---
+def _device_key(token):
+    if not token.startswith('$'):
+        return token
+    if token == '$BARK_KEY':
+        return bark.BARK_KEY  # 与 bark.py 的默认值一致 (环境变量没设时用写在里面的 key)
+    value = os.environ.get(token[1:])
+    if not value:
+        raise ValueError(f"环境变量 {token[1:]} 没有设置 (设备 key)")
+    return value
+
+
+def parse_subscriptions(lines):
+    """多行订阅 -> {组合: [设备 key, ...]}；同一组合写多行时合并，空行和 # 开头的注释忽略"""
+    subs = {}
+    for line in lines:
+        parts = line.split('#', 1)[0].split()
+        if not parts:
+            continue
+        if len(parts) < 2:
+            raise ValueError(f"订阅缺少设备 key: {line.strip()!r} (格式: <组合> <设备 key> ...)")
+        keys = subs.setdefault(parts[0], [])
+        keys.extend(k for k in map(_device_key, parts[1:]) if k not in keys)
+    return subs
+
+
+def load_subscriptions(path=None):
+    path = path or SUBSCRIPTIONS_PATH
+    if not os.path.exists(path):
+        return parse_subscriptions(DEFAULT_SUBSCRIPTIONS)
+    with open(path, encoding="utf-8") as f:
+        return parse_subscriptions(f.readlines())
+
+
+# --- 估值 ---
+def fetch_quotes(tickers):
+    """所有组合共用的一次取价: 最新价格 (USD) + 美元兑人民币汇率"""
+    with perf_monitor.stage("daily_report.quotes", tickers=len(tickers)):
+        prices = get_realtime_price(sorted(tickers)) if tickers else None
+        return (prices if prices is not None else pd.Series(dtype=float)), get_usd_cny_rate()
+
+
+def _snapshot_summary(summary, rate):
+    """value_portfolio 的汇总 -> 快照字段 (XIRR 求不出来时记为 NaN)"""
+    return {
+        'value': summary['total_value_cny'],
+        'invested': summary['total_invested'],
+        'profit': summary['total_profit_money'],
+        'xirr': summary['xirr'] if summary['xirr_status'] == 'ok' else np.nan,
+        'rate': float(rate),
+    }
+
+
+def compute_delta(summary, holdings, previous):
+    """与上一份快照比较；previous 为 load_snapshot 的结果 (None 表示第一次)
+
+    当日盈亏 = 总盈亏 (已实现 + 未实现) 的变化，新投入 / 卖出不算盈亏；
+    持仓涨跌 = 价格涨跌幅 (USD)，金额 = 上次的份额 × (现价 × 现汇率 - 上次价格 × 上次汇率)。
+    """
+    if previous is None:
+        return None
+    since, prev, prev_holdings = previous
+    pnl = summary['profit'] - prev['profit']
+    prev_rate = prev['rate'] or summary['rate']
+    both = holdings[['Shares', 'Price']].join(prev_holdings[['Shares', 'Price']], how='inner', rsuffix='_prev')
+    both = both[(both['Shares_prev'] > tax_lots.EPS) & both['Price'].notna() & both['Price_prev'].notna()]
+    movers = pd.DataFrame({
+        'change': both['Price'] / both['Price_prev'] - 1,
+        'pnl': both['Shares_prev'] * (both['Price'] * summary['rate'] - both['Price_prev'] * prev_rate),
+    }).sort_values('change', ascending=False)
+    return {
+        'since': since,
+        'value': summary['value'] - prev['value'],
+        'pnl': pnl,
+        'pnl_rate': pnl / prev['value'] if prev['value'] else np.nan,
+        'flow': summary['invested'] - prev['invested'],
+        'xirr': summary['xirr'] - prev['xirr'] if prev['xirr'] is not None else np.nan,
+        'movers': movers,
+    }
+
+
+def format_report(portfolio, summary, delta, raw, as_of):
+    """推送的 (标题, 正文)；raw 为 value_portfolio 的原始汇总 (已实现收益 / 缺价提示)"""
+    title = f"📅 投资日报 ({as_of:%m-%d})"
+    if portfolio != portfolio_store.DEFAULT_PORTFOLIO:
+        title += f" · {portfolio}"
+    lines = [f"总市值: ¥{summary['value']:.0f}"]
+    if delta is not None:
+        lines[0] += f" (较 {delta['since']:%m-%d} ¥{delta['value']:+.0f})"
+        line = f"当日盈亏: ¥{delta['pnl']:+.0f} ({delta['pnl_rate']:+.2%})"
+        if abs(delta['flow']) >= 0.5:
+            line += f" | 新投入 ¥{delta['flow']:.0f}"
+        lines.append(line)
+    lines.append(f"总浮盈: ¥{summary['profit']:.0f} ({raw['total_profit_rate']:.2f}%)")
+    if raw['realized_profit']:
+        lines.append(f"其中已实现: ¥{raw['realized_profit']:.0f}")
+    if summary['xirr'] == summary['xirr']:
+        line = f"年化效率 (XIRR): {summary['xirr']:.2f}%"
+        if delta is not None and delta['xirr'] == delta['xirr']:
+            line += f" ({delta['xirr']:+.2f} 个百分点)"
+        lines.append(line)
+    else:
+        lines.append(f"年化效率 (XIRR): 无法计算 ({raw['xirr_status']})")
+    if delta is None:
+        lines.append("📸 首份快照，下次起显示日变化")
+    elif not delta['movers'].empty:
+        movers = delta['movers']
+        up = movers[movers['change'] > 0].head(TOP_MOVERS)
+        down = movers[movers['change'] < 0].iloc[::-1].head(TOP_MOVERS)
+        for icon, rows in (("🔺", up), ("🔻", down)):
+            for ticker, r in rows.iterrows():
+                lines.append(f"{icon} {ticker} {r['change']:+.2%} (¥{r['pnl']:+.0f})")
+    if raw['missing_prices']:
+        lines.append(f"⚠️ 缺少价格 (按成本计): {', '.join(raw['missing_prices'])}")
+    return title, "\n".join(lines)
+
+
+def build_reports(ledgers, prices, rate, previous=None, as_of=None):
+    """纯计算部分 (不联网、不读写快照): {组合: 交易记录} + 共用的价格 / 汇率 -> {组合: 报告}
+
+    previous: {组合: load_snapshot 的结果}。每份报告包含 summary / holdings (快照内容)、delta、title、body、profit。
+    """
+    as_of = pd.Timestamp(as_of or datetime.now())
+    previous = previous or {}
+    prices = pd.Series(prices, dtype=float)
+    valued, flows = {}, []
+    with perf_monitor.stage("daily_report.build", portfolios=len(ledgers)):
+        for portfolio, trades in ledgers.items():
+            holdings, raw = value_portfolio(trades, prices, rate, as_of=as_of, solve_xirr=False)
+            dates, amounts = xirr_flows(trades, raw['total_value_cny'], as_of)
+            flows.append(pd.DataFrame({'Series': portfolio, 'Date': dates, 'Amount': amounts}))
+            valued[portfolio] = (holdings.assign(Price=prices.reindex(holdings.index)), raw)
+        solved = xirr_batch(pd.concat(flows, ignore_index=True)) if flows else None
+
+        reports = {}
+        for portfolio, (holdings, raw) in valued.items():
+            raw.update(xirr=solved.at[portfolio, 'rate'] * 100, xirr_status=solved.at[portfolio, 'status'])
+            summary = _snapshot_summary(raw, rate)
+            delta = compute_delta(summary, holdings, previous.get(portfolio))
+            title, body = format_report(portfolio, summary, delta, raw, as_of)
+            reports[portfolio] = {'summary': summary, 'holdings': holdings, 'delta': delta, 'title': title,
+                                  'body': body, 'profit': raw['total_profit_money']}
+    return reports
+
+
+def _push(report, device_key):
+    icon = bark.ICON_PROFIT if report['profit'] >= 0 else bark.ICON_LOSS
+    return bark.push(report['title'], report['body'], icon=icon, url=REPORT_URL, device_key=device_key)
+
+
+def run(subscriptions_path=None, dry_run=False, as_of=None):
+    """生成并推送全部订阅的日报，保存今天的快照；返回 {组合: 报告}"""
+    subs = load_subscriptions(subscriptions_path)
+    as_of = pd.Timestamp(as_of or datetime.now())
+    added = portfolio_store.import_excel(EXCEL_PATH)
+    if added:
+        print(f"📥 从 {EXCEL_PATH} 同步了 {added} 条新交易")
+
+    if '*' in subs:
+        everyone = subs.pop('*')
+        for portfolio in portfolio_store.list_portfolios():
+            keys = subs.setdefault(portfolio, [])
+            keys.extend(k for k in everyone if k not in keys)
+
+    ledgers = {}
+    for portfolio in subs:
+        trades = portfolio_store.load_trades(portfolio).dropna(subset=['Cost_CNY'])
+        if trades.empty:
+            print(f"⚠️ 组合 {portfolio} 没有交易，跳过")
+        else:
+            ledgers[portfolio] = trades
+    tickers = set().union(*(t['Ticker'] for t in ledgers.values()))
+    prices, rate = fetch_quotes(tickers)
+    previous = {p: portfolio_store.load_snapshot(p, before=as_of) for p in ledgers}
+    reports = build_reports(ledgers, prices, rate, previous, as_of)
+
+    for portfolio, report in reports.items():
+        print("-" * 60)
+        print(f"{report['title']}\n{report['body']}")
+    if dry_run:
+        return reports
+    for portfolio, report in reports.items():
+        portfolio_store.save_snapshot(portfolio, as_of, report['summary'], report['holdings'])
+    jobs = [(report, key) for portfolio, report in reports.items() for key in subs[portfolio]]
+    with ThreadPoolExecutor(max_workers=PUSH_WORKERS) as pool:
+        list(pool.map(lambda job: _push(*job), jobs))
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多组合投资日报 (相对上一份快照的日变化)，推送到 Bark")
+    parser.add_argument("--subscriptions", default=None,
+                        help=f"订阅文件 (默认 {SUBSCRIPTIONS_PATH}，不存在时只推送 default 组合到 BARK_KEY)")
+    parser.add_argument("--dry-run", action="store_true", help="只打印，不推送也不保存快照")
+    a = parser.parse_args()
+    run(a.subscriptions, a.dry_run)
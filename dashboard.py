@@ -1,16 +1,29 @@
 import streamlit as st
-import yfinance as yf
 import plotly.graph_objects as go
 import plotly.express as px
-from plotly.subplots import make_subplots
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
-import os
-from prophet import Prophet
-from prophet.plot import plot_plotly
 import platform
+import perf_monitor
+import figure_cache
+import data_quality
+import price_store
+import corporate_actions
+import market_data
+import portfolio_store
+import shared_cache
+import fast_forecast
+import walk_forward
+import optimizer
+import tax_lots
+import returns_table
+import regimes
+import window_cache
+import relative_strength
+import benchmark_dca
+import job_runner
+from charts import add_regime_shading, build_benchmark_figure, build_forecast_figure, build_returns_heatmap
+from indicators import add_technical_indicators, align_panel, normalize_returns, prepare_prophet_frame
 
 # --- 1. 基础配置 ---
 st.set_page_config(page_title="金融指挥中心 Pro", layout="wide", page_icon="🏦")
@@ -18,435 +31,833 @@ st.set_page_config(page_title="金融指挥中心 Pro", layout="wide", page_icon
 # 智能代理配置
 # 只有检测到是 macOS 系统 (你的电脑) 时才开启代理
 # 云端通常是 Linux 系统，这行代码会自动跳过，不会报错
-if platform.system() == "Darwin":
-    os.environ["http_proxy"] = "http://127.0.0.1:7890"
-    os.environ["https_proxy"] = "http://127.0.0.1:7890"
+# MARKET_DATA=replay / fake 时行情来自本地归档 / 假数据，不联网
+if market_data.MODE in market_data.OFFLINE_MODES:
+    print(f"📼 离线行情模式 ({market_data.MODE})，不联网")
+elif platform.system() == "Darwin" and market_data.configure_proxy():
     print("🍎 检测到 macOS，已开启本地代理")
 else:
     print("☁️ 检测到云端环境，直连模式")
 
 
-# --- 2. 核心函数: 计算技术指标 ---
-def add_technical_indicators(df):
-    # RSI
-    delta = df['Close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-    rs = gain / loss
-    df['RSI'] = 100 - (100 / (1 + rs))
-
-    # MACD
-    exp1 = df['Close'].ewm(span=12, adjust=False).mean()
-    exp2 = df['Close'].ewm(span=26, adjust=False).mean()
-    df['MACD'] = exp1 - exp2
-    df['Signal_Line'] = df['MACD'].ewm(span=9, adjust=False).mean()
-
-    # Bollinger Bands
-    df['MA20'] = df['Close'].rolling(window=20).mean()
-    df['STD20'] = df['Close'].rolling(window=20).std()
-    df['Upper_Band'] = df['MA20'] + (df['STD20'] * 2)
-    df['Lower_Band'] = df['MA20'] - (df['STD20'] * 2)
-
-    # MA200
-    df['MA200'] = df['Close'].rolling(window=200).mean()
-    return df
-
-
-# --- 3. 初始化 Session State ---
-if 'portfolio_data' not in st.session_state:
-    st.session_state.portfolio_data = pd.DataFrame(
-        columns=["Ticker", "Quantity", "Unit_Cost_USD", "Date", "Original_Currency"])
-    # 预设数据演示
-    initial_data = pd.DataFrame([
-        {"Ticker": "BTC-USD", "Quantity": 0.5, "Unit_Cost_USD": 40000.0, "Date": "2023-01-01",
-         "Original_Currency": "USD"}
-    ])
-    st.session_state.portfolio_data = pd.concat([st.session_state.portfolio_data, initial_data], ignore_index=True)
-
-# --- 4. 侧边栏导航 ---
+# --- 2. 页面公共组件: 数据质量提示 / 后台任务进度 ---
+def show_quality_warnings(report):
+    """把 data_quality 报告中有问题的 Ticker 显示为页面提示"""
+    status_text = {"repaired": "已自动修复", "warning": "存在异常", "quarantined": "已隔离 (不参与计算)"}
+    for t, row in report.iterrows():
+        if row.get('status', 'ok') != 'ok':
+            st.warning(f"⚠️ 数据质量 [{t}] {status_text.get(row['status'], row['status'])}: "
+                       f"{data_quality.describe_issues(row)}")
+
+
+def show_job_progress(state_key):
+    """显示 session_state[state_key] 里那个后台任务的进度条和取消按钮，返回 Job (没有则 None)
+
+    进度条放在定时刷新的 fragment 里，只有这一小块每 POLL_SECONDS 重跑一次；页面其他控件照常可用。
+    任务结束时整页 rerun 一次，由调用方把结果画出来。
+    """
+    job = job_runner.get(st.session_state.get(state_key))
+    if job is None or job.done:
+        return job
+
+    @st.fragment(run_every=job_runner.POLL_SECONDS)
+    def progress():
+        if job.done:
+            st.rerun()
+        if job.cancelled:
+            st.progress(job.progress, text="正在取消 (等当前步骤结束)...")
+            return
+        c_bar, c_btn = st.columns([5, 1])
+        c_bar.progress(job.progress, text=f"{job.message} · {job.seconds:.0f}s")
+        if c_btn.button("⏹ 取消", key=f"cancel_{job.id}"):
+            job.cancel()
+            st.rerun()
+
+    progress()
+    return job
+
+
+# --- 3. 侧边栏导航 ---
 st.sidebar.title("🎛️ 全能控制台")
-menu = st.sidebar.radio("功能导航",["个股/加密货币分析", "资产对比 (PK模式)", "我的实盘账户(汇率版)", "资产相关性热力图","AI 趋势预测 (Prophet)"])
-
-# =========================================================
-# 模块一：个股分析
-# =========================================================
-if menu == "个股/加密货币分析":
-    st.title("📈 深度技术分析")
-    ticker = st.sidebar.text_input("输入代码", "BTC-USD").upper()
-    period = st.sidebar.selectbox("周期", ["6mo", "1y", "3y", "5y"], index=1)
-
-    st.sidebar.subheader("图表设置")
-    show_ma200 = st.sidebar.checkbox("MA200 (牛熊线)", True)
-    show_boll = st.sidebar.checkbox("布林带", False)
-    sub_chart = st.sidebar.radio("副图指标", ["无", "RSI", "MACD"])
-
-    if st.sidebar.button("开始分析", type="primary"):
-        with st.spinner('正在分析数据...'):
+menu = st.sidebar.radio("功能导航",["个股/加密货币分析", "资产对比 (PK模式)", "我的实盘账户(汇率版)", "资产相关性热力图","周期收益表","AI 趋势预测 (Prophet)"])
+
+# 性能调试: 每次 rerun 记为一次请求，各阶段耗时显示在侧边栏底部
+show_debug = st.sidebar.checkbox("🐞 性能调试面板", False)
+profile_engine = "关闭"
+if show_debug:
+    profile_engine = st.sidebar.selectbox("Profile 采集", ["关闭", "cprofile", "pyinstrument"])
+
+# 页面主体放在 with 里: 页面报错或被 st.rerun / st.stop 打断时，Profile 和本次请求的记录也会正常结束
+with perf_monitor.request(menu, profile=None if profile_engine == "关闭" else profile_engine) as perf_trace:
+    # =========================================================
+    # 模块一：个股分析
+    # =========================================================
+    if menu == "个股/加密货币分析":
+        st.title("📈 深度技术分析")
+        ticker = st.sidebar.text_input("输入代码", "BTC-USD").upper()
+        period = st.sidebar.selectbox("周期", ["6mo", "1y", "3y", "5y", "max"], index=1)
+
+        st.sidebar.subheader("图表设置")
+        show_ma200 = st.sidebar.checkbox("MA200 (牛熊线)", True)
+        show_boll = st.sidebar.checkbox("布林带", False)
+        show_regimes = st.sidebar.checkbox("牛熊 / 回撤区间着色", False)
+        sub_chart = st.sidebar.radio("副图指标", ["无", "RSI", "MACD"])
+
+        if st.sidebar.button("开始分析", type="primary"):
+            with st.spinner('正在分析数据...'):
+                try:
+                    # 本地行情仓库: 增量下载 + 数据质量校验，5y 这类长周期自动改用周线
+                    # 算好指标的结果放进进程级共享缓存，其他会话分析同一个代码 / 周期时直接复用
+                    def build_analysis_frame():
+                        bars = price_store.load_bars(ticker, period)
+                        if bars.empty:
+                            return bars
+                        # RSI / MACD / 布林带按显示分辨率计算；MA200 保留仓库里按日线算好的值
+                        ma200 = bars['MA200']
+                        with perf_monitor.stage("add_technical_indicators") as s:
+                            out = s.set_frame(add_technical_indicators(bars))
+                        out['MA200'] = ma200
+                        return out
+
+                    if period == "max":
+                        # 全部历史: 这里只确认本地数据是新的、记下历史起止日期，图表按下面的可见区间分块读取
+                        price_store.ensure_fresh(ticker)
+                        bounds = price_store.history_range(ticker)
+                        show_quality_warnings(data_quality.latest_report([ticker]))
+                        if bounds is None:
+                            st.session_state.pop('analysis', None)
+                            st.error("❌ 无数据，请检查代码拼写。")
+                        else:
+                            st.session_state.analysis = {"ticker": ticker, "period": period, "history": bounds}
+                    else:
+                        df = shared_cache.get_or_load(("analysis", ticker, period), build_analysis_frame,
+                                                      ttl=price_store.REFRESH_SECONDS)
+                        show_quality_warnings(data_quality.latest_report([ticker]))
+
+                        if df.empty:
+                            st.session_state.pop('analysis', None)
+                            st.error("❌ 无数据，请检查代码拼写。")
+                        else:
+                            st.session_state.analysis = {"ticker": ticker, "period": period, "df": df,
+                                                         "fp": figure_cache.fingerprint(df)}
+                except Exception as e:
+                    st.error(str(e))
+
+        # 切换图表设置只会触发 rerun：复用已算好的数据，图层从 figure_cache 取，不用重新下载
+        analysis = st.session_state.get('analysis')
+        if analysis and analysis['ticker'] == ticker and analysis['period'] == period:
+            window = None
+            if period == "max":
+                # 拖动区间 = 平移 / 缩放: 只读可见区间 (两侧各多取半个区间) 所在的块，相邻的块多半已在缓存里
+                first, last = analysis['history']
+                start, end = window_cache.default_window(first, last)
+                window = st.slider("可见区间", min_value=first.date(), max_value=last.date(),
+                                   value=(start.date(), end.date()), format="YYYY-MM-DD", key=f"window_{ticker}")
+                window = pd.Timestamp(window[0]), pd.Timestamp(window[1])
+
+                def build_window_frame():
+                    bars = window_cache.load_window(ticker, *window, refresh=False)
+                    if bars.empty:
+                        return bars
+                    ma200 = bars['MA200']
+                    with perf_monitor.stage("add_technical_indicators") as s:
+                        out = s.set_frame(add_technical_indicators(bars))
+                    out['MA200'] = ma200
+                    return out
+
+                df = shared_cache.get_or_load(("analysis_window", ticker) + window, build_window_frame,
+                                              ttl=price_store.REFRESH_SECONDS)
+                fp = figure_cache.fingerprint(df)
+                if window[1] < last:
+                    st.caption("下面的指标为可见区间最后一天的数值。")
+            else:
+                df, fp = analysis['df'], analysis['fp']
+            if df.attrs.get('resolution', '1d') != '1d':
+                st.caption(f"数据点较多，已自动切换为{price_store.RESOLUTION_NAMES[df.attrs['resolution']]}显示。")
+            latest = df[df.index <= window[1]] if window is not None else df  # 窗口模式: 不看右侧余量
+            curr = latest['Close'].iloc[-1].item()
+            rsi = latest['RSI'].iloc[-1].item() if pd.notna(latest['RSI'].iloc[-1]) else 50
+
+            # 顶部指标
+            c1, c2, c3 = st.columns(3)
+            c1.metric("当前价格", f"${curr:,.2f}")
+
+            rsi_state = "正常"
+            if rsi > 70:
+                rsi_state = "🔥 超买"
+            elif rsi < 30:
+                rsi_state = "🧊 超卖"
+            c2.metric("RSI (14)", f"{rsi:.1f}", rsi_state)
+
+            if pd.notna(latest['MA200'].iloc[-1]):
+                bias = (curr - latest['MA200'].iloc[-1].item()) / latest['MA200'].iloc[-1].item()
+                c3.metric("乖离率", f"{bias:+.2%}")
+
+            # 绘图
+            fig = figure_cache.analysis_figure(df, show_ma200, show_boll, sub_chart, fp=fp)
+            if window is not None:
+                # 数据比可见区间多出两侧的余量，图上直接拖动也能看到；缓存里的图是共享对象，改坐标轴要在副本上
+                fig = go.Figure(fig).update_xaxes(range=list(window))
+            if show_regimes:
+                # 区间按完整日线历史划分 (进程内增量维护)；缓存里的图是共享对象，着色画在副本上
+                try:
+                    with perf_monitor.stage("regimes.load", ticker=ticker):
+                        regime_table, drawdown_table = regimes.load([ticker])
+                    fig = add_regime_shading(go.Figure(fig), *regimes.shading_periods(regime_table, drawdown_table, ticker))
+                    for line in regimes.describe(regimes.summarize(regime_table, drawdown_table), ticker):
+                        st.caption(line)
+                except Exception as e:
+                    st.warning(f"牛熊区间统计失败: {e}")
+            with perf_monitor.stage("st.plotly_chart", traces=len(fig.data)):
+                st.plotly_chart(fig, use_container_width=True)
+
+    # =========================================================
+    # 模块二：资产对比
+    # =========================================================
+    elif menu == "资产对比 (PK模式)":
+        st.title("⚔️ 资产对比")
+        assets = st.sidebar.text_area("输入代码 (逗号分隔)", "BTC-USD, ^GSPC, NVDA, GLD")
+        pk_period = st.sidebar.selectbox("周期", ["6mo", "1y", "3y", "5y"], index=1)
+        rs_window = st.sidebar.slider("滚动比较窗口 (交易日)", 20, 252, relative_strength.WINDOW)
+        if st.sidebar.button("开始PK"):
             try:
-                df = yf.download(ticker, period=period, progress=False)
-                if isinstance(df.columns, pd.MultiIndex): df.columns = df.columns.get_level_values(0)
-
-                if df.empty:
-                    st.error("❌ 无数据，请检查代码拼写。")
-                else:
-                    df = add_technical_indicators(df)
-                    curr = df['Close'].iloc[-1].item()
-                    rsi = df['RSI'].iloc[-1].item() if pd.notna(df['RSI'].iloc[-1]) else 50
-
-                    # 顶部指标
-                    c1, c2, c3 = st.columns(3)
-                    c1.metric("当前价格", f"${curr:,.2f}")
-
-                    rsi_state = "正常"
-                    if rsi > 70:
-                        rsi_state = "🔥 超买"
-                    elif rsi < 30:
-                        rsi_state = "🧊 超卖"
-                    c2.metric("RSI (14)", f"{rsi:.1f}", rsi_state)
-
-                    if pd.notna(df['MA200'].iloc[-1]):
-                        bias = (curr - df['MA200'].iloc[-1].item()) / df['MA200'].iloc[-1].item()
-                        c3.metric("乖离率", f"{bias:+.2%}")
-
-                    # 绘图
-                    rows = 2 if sub_chart != "无" else 1
-                    fig = make_subplots(rows=rows, cols=1, shared_xaxes=True,
-                                        row_heights=[0.7, 0.3] if rows == 2 else [1])
-
-                    fig.add_trace(go.Scatter(x=df.index, y=df['Close'], name='Price', line=dict(color='#00BFFF')),
-                                  row=1, col=1)
-                    if show_ma200: fig.add_trace(
-                        go.Scatter(x=df.index, y=df['MA200'], name='MA200', line=dict(color='orange', dash='dash')),
-                        row=1, col=1)
-                    if show_boll:
-                        fig.add_trace(go.Scatter(x=df.index, y=df['Upper_Band'], showlegend=False, line=dict(width=0)),
-                                      row=1, col=1)
-                        fig.add_trace(go.Scatter(x=df.index, y=df['Lower_Band'], fill='tonexty',
-                                                 fillcolor='rgba(255,255,255,0.1)', showlegend=False,
-                                                 line=dict(width=0)), row=1, col=1)
-
-                    if sub_chart == "RSI":
-                        fig.add_trace(go.Scatter(x=df.index, y=df['RSI'], name='RSI', line=dict(color='purple')), row=2,
-                                      col=1)
-                        fig.add_hline(y=70, line_dash="dot", line_color="red", row=2, col=1)
-                        fig.add_hline(y=30, line_dash="dot", line_color="green", row=2, col=1)
-                    elif sub_chart == "MACD":
-                        fig.add_trace(go.Scatter(x=df.index, y=df['MACD'], name='DIF', line=dict(color='yellow')),
-                                      row=2, col=1)
-                        fig.add_trace(go.Scatter(x=df.index, y=df['Signal_Line'], name='DEA', line=dict(color='cyan')),
-                                      row=2, col=1)
-                        fig.add_trace(go.Bar(x=df.index, y=(df['MACD'] - df['Signal_Line']) * 2, name='Hist'), row=2,
-                                      col=1)
-
-                    fig.update_layout(height=600, template="plotly_dark", hovermode="x unified")
-                    st.plotly_chart(fig, use_container_width=True)
+                ts = [x.strip().upper() for x in assets.split(',') if x.strip()]
+                # 与相关性页面使用同一份本地行情、同一复权口径 (corporate_actions.RETURN_BASIS)
+                data = shared_cache.get_or_load(("close_panel", tuple(ts), pk_period),
+                                                lambda: price_store.load_close_panel(ts, pk_period),
+                                                ttl=price_store.REFRESH_SECONDS)
+                df_c, dq_report = data_quality.validate_panel(data)
+                # 面板放进 session_state: 调整窗口 / 切换资产时不重新取数，相对强弱结果按面板指纹缓存
+                st.session_state.pk = {"assets": assets, "period": pk_period, "df": df_c, "dq_report": dq_report,
+                                       "basis": data.attrs['basis'], "missing": [t for t in ts if t not in data.columns]}
             except Exception as e:
-                st.error(str(e))
+                st.session_state.pop('pk', None)
+                st.error(f"数据错误: {e}")
 
-# =========================================================
-# 模块二：资产对比
-# =========================================================
-elif menu == "资产对比 (PK模式)":
-    st.title("⚔️ 资产对比")
-    assets = st.sidebar.text_area("输入代码 (逗号分隔)", "BTC-USD, ^GSPC, NVDA, GLD")
-    if st.sidebar.button("开始PK"):
-        try:
-            ts = [x.strip() for x in assets.split(',')]
-            data = yf.download(ts, period="1y", group_by='ticker', progress=False)
-            df_c = pd.DataFrame()
-            for t in ts:
-                if isinstance(data.columns, pd.MultiIndex):
-                    # 尝试取 Close，若无取 Adj Close
-                    df_c[t] = data[t]['Close']
-                elif len(ts) == 1:
-                    df_c[ts[0]] = data['Close']
+        pk = st.session_state.get('pk')
+        if pk and pk['assets'] == assets and pk['period'] == pk_period:
+            df_c = pk['df']
+            show_quality_warnings(pk['dq_report'])
+            st.caption(f"收益口径: {corporate_actions.BASIS_NAMES[pk['basis']]}")
+            if pk['missing']:
+                st.warning(f"⚠️ 未获取到数据: {', '.join(pk['missing'])}")
 
             # 归一化并绘图
-            st.line_chart((df_c.ffill().bfill() / df_c.ffill().bfill().iloc[0]) - 1)
-        except Exception as e:
-            st.error(f"数据错误: {e}")
-
-# =========================================================
-# 模块三：我的实盘账户 (V5.0 完整修复版)
-# =========================================================
-elif menu == "我的实盘账户":
-    st.title("🌏 智能资产管家 (CNY/USD)")
+            with perf_monitor.stage("st.line_chart") as s:
+                st.line_chart(s.set_frame(normalize_returns(align_panel(df_c))))
 
-    # --- 智能录入 ---
-    with st.expander("➕ 新增交易 (智能换汇)", expanded=True):
-        with st.form("add_trade_form"):
-            c1, c2 = st.columns(2)
-            new_ticker = c1.text_input("代码", "NVDA").upper()
-            new_date = c2.date_input("日期", datetime.now())
-            c3, c4 = st.columns(2)
-            currency_type = c3.radio("币种", ["USD", "CNY"], horizontal=True)
-            new_amount = c4.number_input("总金额", 1.0, value=10000.0)
-
-            if st.form_submit_button("🚀 录入"):
-                with st.spinner(f"正在回溯历史数据..."):
-                    try:
-                        start_str = new_date.strftime('%Y-%m-%d')
-                        end_str = (new_date + timedelta(days=5)).strftime('%Y-%m-%d')
+            if df_c.shape[1] >= 2:
+                try:
+                    board, pairs, wins, rank_history = relative_strength.cached(df_c, rs_window)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.subheader("🏆 排行榜")
+                    view = board.rename(columns={'total_return': '累计收益', 'recent_return': f'近 {rs_window} 日收益',
+                                                 'rank': f'近 {rs_window} 日排名', 'avg_rank': '平均排名',
+                                                 'win_rate': '滚动跑赢率', 'beats': '跑赢资产数'})
+                    st.dataframe(view.style.format({'累计收益': "{:+.1%}", f'近 {rs_window} 日收益': "{:+.1%}",
+                                                    f'近 {rs_window} 日排名': "{:.0f}", '平均排名': "{:.1f}",
+                                                    '滚动跑赢率': "{:.0%}"}), use_container_width=True)
+
+                    st.subheader("🧮 两两对比")
+                    matrix = st.radio("矩阵", ["区间超额收益 (行相对列)", f"滚动 {rs_window} 日跑赢率 (行跑赢列)"],
+                                      horizontal=True)
+                    with perf_monitor.stage("st.plotly_chart", chart="pairs", assets=len(pairs)):
+                        if matrix.startswith("区间"):
+                            st.plotly_chart(build_returns_heatmap(pairs, "行资产相对列资产的超额收益"),
+                                            use_container_width=True)
+                        else:
+                            st.plotly_chart(build_returns_heatmap(wins, "行资产的滚动收益高于列资产的天数占比",
+                                                                  zmid=0.5), use_container_width=True)
+
+                    c_rank, c_ratio = st.columns(2)
+                    with c_rank:
+                        # 资产很多时只画排行榜前 10 名，按周取样，图上点数与资产数无关
+                        top = list(board.index[:10])
+                        weekly = rank_history[top].resample('W').last()
+                        fig = px.line(weekly, title=f"排名变化 (近 {rs_window} 日收益，前 {len(top)} 名)")
+                        fig.update_yaxes(autorange='reversed', title="排名")
+                        st.plotly_chart(fig, use_container_width=True)
+                    with c_ratio:
+                        base = st.selectbox("相对强弱曲线", list(board.index))
+                        curves = relative_strength.ratio_curves(df_c, base)
+                        st.caption(f"{base} 的净值 / 其他资产的净值，向上表示 {base} 在跑赢")
+                        st.line_chart(curves[[c for c in board.index if c in curves.columns][:10]])
+
+    # =========================================================
+    # 模块三：我的实盘账户 (V5.0 完整修复版)
+    # =========================================================
+    elif menu == "我的实盘账户(汇率版)":
+        st.title("🌏 智能资产管家 (CNY/USD)")
+
+        # 交易记录保存在 portfolio_store (SQLite)，重启不丢失，多个浏览器会话看到同一本账
+        # 每次写库后换一个 editor key，避免 data_editor 把已经保存的改动再叠加一次
+        st.session_state.setdefault('ledger_version', 0)
+
+        def bump_ledger_version():
+            st.session_state.ledger_version += 1
+
+        # --- 智能录入 ---
+        with st.expander("➕ 新增交易 (智能换汇)", expanded=True):
+            with st.form("add_trade_form"):
+                c1, c2 = st.columns(2)
+                new_ticker = c1.text_input("代码", "NVDA").upper()
+                new_date = c2.date_input("日期", datetime.now())
+                c3, c4 = st.columns(2)
+                currency_type = c3.radio("币种", ["USD", "CNY"], horizontal=True)
+                new_amount = c4.number_input("总金额", 1.0, value=10000.0)
+                c5, c6 = st.columns(2)
+                side = c5.radio("方向", ["买入", "卖出"], horizontal=True)
+                fee_amount = c6.number_input("手续费 (同币种)", 0.0, value=0.0)
+
+                if st.form_submit_button("🚀 录入"):
+                    with st.spinner(f"正在回溯历史数据..."):
+                        try:
+                            start_str = new_date.strftime('%Y-%m-%d')
+                            end_str = (new_date + timedelta(days=5)).strftime('%Y-%m-%d')
 
-                        # 获取资产价格
-                        asset_data = yf.download(new_ticker, start=start_str, end=end_str, progress=False)
-                        if isinstance(asset_data.columns,
-                                      pd.MultiIndex): asset_data.columns = asset_data.columns.get_level_values(0)
+                            # 获取资产价格
+                            asset_data = shared_cache.download(new_ticker, start=start_str, end=end_str)
+                            if isinstance(asset_data.columns,
+                                          pd.MultiIndex): asset_data.columns = asset_data.columns.get_level_values(0)
 
-                        if asset_data.empty:
-                            st.error(f"❌ 无法获取 {new_ticker} 数据")
-                        else:
-                            execution_price = asset_data['Close'].iloc[0].item()
-                            execution_date = asset_data.index[0].strftime('%Y-%m-%d')
+                            if asset_data.empty:
+                                st.error(f"❌ 无法获取 {new_ticker} 数据")
+                            else:
+                                execution_price = asset_data['Close'].iloc[0].item()
+                                execution_date = asset_data.index[0].strftime('%Y-%m-%d')
 
-                            # 汇率处理
-                            final_usd_amount = new_amount
-                            if currency_type == "CNY":
-                                fx_data = yf.download("CNY=X", start=start_str, end=end_str, progress=False)
+                                # 汇率处理 (两种币种都需要: 账本同时记录 USD 成交价和 CNY 投入，与 trade_log.xlsx 一致)
+                                fx_data = shared_cache.download("CNY=X", start=start_str, end=end_str)
                                 if isinstance(fx_data.columns,
                                               pd.MultiIndex): fx_data.columns = fx_data.columns.get_level_values(0)
                                 fx_rate = fx_data['Close'].iloc[0].item() if not fx_data.empty else 7.2
-                                final_usd_amount = new_amount / fx_rate
-
-                            quantity = final_usd_amount / execution_price
-
-                            new_row = pd.DataFrame([{
-                                "Ticker": new_ticker, "Quantity": quantity,
-                                "Unit_Cost_USD": execution_price, "Date": execution_date,
-                                "Original_Currency": currency_type
-                            }])
-                            st.session_state.portfolio_data = pd.concat([st.session_state.portfolio_data, new_row],
-                                                                        ignore_index=True)
-                            st.success(f"✅ 录入成功！持有 {quantity:.4f} 股/币")
-                    except Exception as e:
-                        st.error(f"失败: {e}")
-
-    st.markdown("---")
-
-    # --- 持仓表格 ---
-    st.subheader("📋 持仓清单 (USD本位)")
-    edited_df = st.data_editor(st.session_state.portfolio_data, num_rows="dynamic", use_container_width=True,
-                               key="portfolio_editor_final")
-
-    # --- 计算市值 (含 Weekend Bug 修复) ---
-    if st.button("🔄 刷新最新市值"):
-        if edited_df.empty:
-            st.warning("空空如也")
-        else:
-            with st.spinner('连接华尔街...'):
+                                if currency_type == "CNY":
+                                    final_usd_amount, cost_cny, fee_cny = new_amount / fx_rate, new_amount, fee_amount
+                                else:
+                                    final_usd_amount, cost_cny = new_amount, new_amount * fx_rate
+                                    fee_cny = fee_amount * fx_rate
+
+                                # 卖出记为负份额 (金额的符号由 portfolio_store 统一处理)
+                                quantity = final_usd_amount / execution_price * (-1 if side == "卖出" else 1)
+
+                                with perf_monitor.stage("portfolio_store.add_trade"):
+                                    portfolio_store.add_trade(new_ticker, execution_date, quantity,
+                                                              unit_cost_usd=execution_price, cost_cny=cost_cny,
+                                                              currency=currency_type, fee_cny=fee_cny)
+                                bump_ledger_version()
+                                st.success(f"✅ 录入成功！{side} {abs(quantity):.4f} 股/币")
+                        except Exception as e:
+                            st.error(f"失败: {e}")
+
+            if st.button("📥 从 trade_log.xlsx 导入"):
                 try:
-                    calc_df = edited_df.copy()
-                    tickers = calc_df["Ticker"].unique().tolist()
-                    live_data = yf.download(tickers, period="5d", group_by='ticker', progress=False)
-                    current_prices = {}
-
-                    for t in tickers:
-                        try:
-                            # 提取并清洗空值
-                            if isinstance(live_data.columns, pd.MultiIndex):
-                                series = live_data[t]['Close']
-                            else:
-                                series = live_data['Close']
-                            series = series.dropna()  # 关键修复
-                            current_prices[t] = series.iloc[-1].item() if not series.empty else 0
-                        except:
-                            current_prices[t] = 0
-
-                    calc_df["Current_Price"] = calc_df["Ticker"].map(current_prices)
-                    calc_df["Market_Value"] = calc_df["Quantity"] * calc_df["Current_Price"]
-                    calc_df["PnL"] = (calc_df["Current_Price"] - calc_df["Unit_Cost_USD"]) * calc_df["Quantity"]
-
-                    total_pnl = calc_df["PnL"].sum()
-
-                    c1, c2 = st.columns(2)
-                    c1.metric("💰 总市值 (USD)", f"${calc_df['Market_Value'].sum():,.2f}")
-                    c2.metric("💸 总盈亏 (USD)", f"${total_pnl:+,.2f}")
-
-                    col_pie, col_bar = st.columns(2)
-                    with col_pie:
-                        st.plotly_chart(px.pie(calc_df, values='Market_Value', names='Ticker', title='仓位分布'),
-                                        use_container_width=True)
-                    with col_bar:
-                        calc_df['Color'] = calc_df['PnL'].apply(lambda x: '#00FF00' if x >= 0 else '#FF4500')
-                        st.plotly_chart(
-                            go.Figure(go.Bar(x=calc_df['Ticker'], y=calc_df['PnL'], marker_color=calc_df['Color'])),
-                            use_container_width=True)
-
+                    added = portfolio_store.import_excel()
+                    bump_ledger_version()
+                    st.success(f"✅ 导入 {added} 条新记录 (已导入过的记录自动跳过)")
                 except Exception as e:
-                    st.error(f"计算出错: {e}")
-
-# =========================================================
-# 模块四：资产相关性热力图 (V6.0 精致版)
-# =========================================================
-elif menu == "资产相关性热力图":
-    st.title("资产相关性分析")
-    st.info("寻找最佳对冲资产：越红越危险(同步)，越蓝越安全(互补)。")
-
-    st.sidebar.subheader("设置")
-    default_symbols = "BTC-USD, ETH-USD, NVDA, TSLA, GLD, ^GSPC"
-    user_symbols = st.sidebar.text_area("资产代码", value=default_symbols, height=100)
-    lookback = st.sidebar.selectbox("回测时间", ["6mo", "1y", "3y"], index=1)
-
-    if st.button("🔍 计算矩阵", type="primary"):
-        tickers = [x.strip().upper() for x in user_symbols.split(',')]
-        with st.spinner('清洗数据中...'):
-            try:
-                data = yf.download(tickers, period=lookback, progress=False, auto_adjust=False)
-                df_close = pd.DataFrame()
-
-                # 增强型数据提取
-                for t in tickers:
+                    st.error(f"导入失败: {e}")
+
+        st.markdown("---")
+
+        # --- 持仓表格 ---
+        st.subheader("📋 持仓清单 (USD本位)")
+        with perf_monitor.stage("portfolio_store.load_trades") as s:
+            ledger = s.set_frame(portfolio_store.load_trades())
+        editor_key = f"portfolio_editor_{st.session_state.ledger_version}"
+
+        def save_ledger_edits():
+            portfolio_store.apply_editor_changes(ledger, st.session_state[editor_key])
+            bump_ledger_version()
+
+        edited_df = st.data_editor(
+            ledger, num_rows="dynamic", use_container_width=True, key=editor_key, on_change=save_ledger_edits,
+            column_order=["Ticker", "Shares", "Unit_Cost_USD", "Cost_CNY", "Fee_CNY", "Date", "Currency", "Source"],
+            disabled=["Source"])
+
+        # --- 计算市值 (含 Weekend Bug 修复) ---
+        lot_method = st.radio("成本计算方法", tax_lots.METHODS, horizontal=True, format_func=tax_lots.METHOD_NAMES.get)
+        if st.button("🔄 刷新最新市值"):
+            if edited_df.empty:
+                st.warning("空空如也")
+            else:
+                with st.spinner('连接华尔街...'):
                     try:
-                        if isinstance(data.columns, pd.MultiIndex):
-                            if 'Adj Close' in data.columns.get_level_values(0) and t in data['Adj Close']:
-                                series = data['Adj Close'][t]
-                            elif 'Close' in data.columns.get_level_values(0) and t in data['Close']:
-                                series = data['Close'][t]
-                            else:
-                                continue
-                        else:
-                            series = data['Adj Close'] if 'Adj Close' in data.columns else data['Close']
-                        df_close[t] = series
-                    except:
-                        pass
+                        calc_df = edited_df.copy()
+                        tickers = calc_df["Ticker"].unique().tolist()
+                        # 顺带取汇率: 从 trade_log.xlsx 导入的记录只有 CNY 投入，没有 USD 成交价
+                        download_list = tickers + ["CNY=X"]
+                        live_data = shared_cache.download(download_list, period="5d", group_by='ticker')
+                        # 校验后取每个 Ticker 最后一个有效价格；取不到的保持空值，不再用 0 冒充 (否则会显示 -100%)
+                        live_close, dq_report = data_quality.validate_download(live_data, download_list)
+                        show_quality_warnings(dq_report)
+                        current_prices = live_close.ffill().iloc[-1] if not live_close.empty else pd.Series(dtype=float)
+                        fx_now = current_prices.get("CNY=X", 7.2)
+                        fx_now = 7.2 if pd.isna(fx_now) else fx_now
+
+                        # 按持仓批次核算 (支持卖出 / 手续费)；USD 成本优先用成交价，Excel 导入的记录按当前汇率折算
+                        calc_df["Cost_USD"] = (calc_df["Unit_Cost_USD"] * calc_df["Shares"]).fillna(
+                            calc_df["Cost_CNY"] / fx_now)
+                        calc_df["Fee_USD"] = calc_df["Fee_CNY"].fillna(0.0) / fx_now
+                        book = tax_lots.build(calc_df.dropna(subset=["Cost_USD"]), lot_method,
+                                              cost_col="Cost_USD", fee_col="Fee_USD")
+                        pos = tax_lots.unrealized(book.positions(), current_prices)
+                        realized_pnl = pos["Realized_PnL"].sum()
+                        pos = pos[pos["Shares"] > tax_lots.EPS].rename(columns={"Unrealized_PnL": "PnL"})
+
+                        unpriced = pos.index[pos["Price"].isna()].tolist()
+                        if unpriced:
+                            st.warning(f"⚠️ 以下资产没有取到有效价格，未计入市值和盈亏: {', '.join(unpriced)}")
+                        pos = pos.dropna(subset=["Price"]).reset_index()
+
+                        total_pnl = pos["PnL"].sum() + realized_pnl
+
+                        c1, c2, c3 = st.columns(3)
+                        c1.metric("💰 总市值 (USD)", f"${pos['Market_Value'].sum():,.2f}")
+                        c2.metric("💸 总盈亏 (USD)", f"${total_pnl:+,.2f}")
+                        c3.metric("✅ 已实现盈亏 (USD)", f"${realized_pnl:+,.2f}")
+
+                        col_pie, col_bar = st.columns(2)
+                        with col_pie:
+                            st.plotly_chart(px.pie(pos, values='Market_Value', names='Ticker', title='仓位分布'),
+                                            use_container_width=True)
+                        with col_bar:
+                            pos['Color'] = pos['PnL'].apply(lambda x: '#00FF00' if x >= 0 else '#FF4500')
+                            st.plotly_chart(
+                                go.Figure(go.Bar(x=pos['Ticker'], y=pos['PnL'], marker_color=pos['Color'])),
+                                use_container_width=True)
+
+                        realized = book.realized_frame()
+                        if not realized.empty:
+                            with st.expander(f"📜 已实现盈亏明细 ({tax_lots.METHOD_NAMES[lot_method]})"):
+                                st.dataframe(realized, use_container_width=True)
 
-                df_close = df_close.dropna(axis=0)  # 去除空值行
-
-                if df_close.empty:
-                    st.error("数据不足，请尝试使用 ETF (如 GLD) 代替期货。")
+                    except Exception as e:
+                        st.error(f"计算出错: {e}")
+
+        # --- 反事实对比: 每一笔钱都买基准会怎样 ---
+        with st.expander("🆚 如果每一笔都买了基准？"):
+            bench_input = st.text_input("基准 (逗号分隔)", ", ".join(benchmark_dca.DEFAULT_BENCHMARKS))
+            bench_names = [s.strip().upper() for s in bench_input.split(",") if s.strip()]
+            if st.button("📐 开始对比"):
+                if edited_df.empty or not bench_names:
+                    st.warning("需要交易记录和至少一个基准")
                 else:
+                    with st.spinner("按历史汇率回放每一笔现金流..."):
+                        try:
+                            # 结果放进 session_state；XIRR 在 benchmark_dca 里按序列增量缓存，账本只多一笔时只重算最近的月末
+                            st.session_state.bench = {"names": bench_names,
+                                                      "result": benchmark_dca.run(edited_df, bench_names)}
+                        except Exception as e:
+                            st.session_state.pop('bench', None)
+                            st.error(f"对比失败: {e}")
+
+            bench = st.session_state.get('bench')
+            if bench:
+                table = benchmark_dca.summarize(bench["result"])
+                cols = st.columns(len(table))
+                for col, (name, row) in zip(cols, table.iterrows()):
+                    delta = None
+                    if name != benchmark_dca.ACTUAL:
+                        delta = f"我的组合 {row['excess_xirr'] * 100:+.2f} 个百分点"
+                    col.metric(f"{name} 市值 (CNY)", f"¥{row['value']:,.0f}", f"XIRR {row['xirr']:.2%}")
+                    if delta:
+                        col.caption(f"{delta} / 市值超额 {row['excess_value']:+.2%}")
+                st.plotly_chart(build_benchmark_figure(bench["result"]), use_container_width=True)
+
+    # =========================================================
+    # 模块四：资产相关性热力图 (V6.0 精致版)
+    # =========================================================
+    elif menu == "资产相关性热力图":
+        st.title("资产相关性分析")
+        st.info("寻找最佳对冲资产：越红越危险(同步)，越蓝越安全(互补)。")
+
+        st.sidebar.subheader("设置")
+        default_symbols = "BTC-USD, ETH-USD, NVDA, TSLA, GLD, ^GSPC"
+        user_symbols = st.sidebar.text_area("资产代码", value=default_symbols, height=100)
+        lookback = st.sidebar.selectbox("回测时间", ["6mo", "1y", "3y"], index=1)
+
+        if st.button("🔍 计算矩阵", type="primary"):
+            tickers = [x.strip().upper() for x in user_symbols.split(',')]
+            with st.spinner('清洗数据中...'):
+                try:
+                    # 本地行情仓库 + 本地复权 (与 PK 页面同一口径)，取不到数据的 Ticker 不会出现在面板里
+                    df_close = shared_cache.get_or_load(("close_panel", tuple(tickers), lookback),
+                                                        lambda: price_store.load_close_panel(tickers, lookback),
+                                                        ttl=price_store.REFRESH_SECONDS)
+                    basis = df_close.attrs.get('basis', corporate_actions.RETURN_BASIS)
+
+                    # 相关性对脏数据很敏感：有问题的 Ticker 直接隔离，不做修补
+                    df_close, dq_report = data_quality.validate_panel(df_close, mode='quarantine')
+                    df_close = df_close.dropna(axis=0)  # 去除空值行
+                    # 结果放进 session_state: 下面配置建议的滑块 / 输入框触发 rerun 时不用重新计算
+                    st.session_state.heatmap = {"symbols": user_symbols, "lookback": lookback, "df_close": df_close,
+                                                "dq_report": dq_report, "basis": basis}
+                except Exception as e:
+                    st.session_state.pop('heatmap', None)
+                    st.error(f"Error: {e}")
+
+        heatmap = st.session_state.get('heatmap')
+        if heatmap and heatmap['symbols'] == user_symbols and heatmap['lookback'] == lookback:
+            df_close = heatmap['df_close']
+            show_quality_warnings(heatmap['dq_report'])
+            st.caption(f"收益口径: {corporate_actions.BASIS_NAMES[heatmap['basis']]}")
+
+            if df_close.empty:
+                st.error("数据不足，请尝试使用 ETF (如 GLD) 代替期货。")
+            else:
+                with perf_monitor.stage("corr_matrix") as s:
+                    s.set_frame(df_close)
                     corr_matrix = df_close.pct_change().dropna().corr()
 
-                    st.subheader(f"📊 Pearson 相关系数矩阵 ({lookback})")
-
-                    # === 布局优化：左图右白 ===
-                    c_chart, c_none = st.columns([3, 2])
-                    with c_chart:
-                        fig, ax = plt.subplots(figsize=(5, 4), dpi=100)  # 尺寸控制
-                        sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', vmin=-1, vmax=1,
-                                    square=True, linewidths=.5, fmt=".2f", ax=ax, cbar_kws={"shrink": 0.7})
-                        plt.xticks(fontsize=8);
-                        plt.yticks(fontsize=8)
-                        st.pyplot(fig, use_container_width=True)
-
-                    # 智能解读
+                st.subheader(f"📊 Pearson 相关系数矩阵 ({lookback})")
+
+                # === 布局优化：左图右白 ===
+                c_chart, c_none = st.columns([3, 2])
+                with c_chart:
+                    # 热力图 PNG 按矩阵内容缓存，rerun 时跳过 matplotlib 重绘
+                    png = figure_cache.heatmap_png(corr_matrix, figsize=(5, 4), dpi=100, fontsize=8)
+                    with perf_monitor.stage("st.image"):
+                        st.image(png, use_container_width=True)
+
+                # 智能解读
+                st.markdown("---")
+                corr_unstack = corr_matrix.unstack().sort_values(ascending=False)
+                top_corr = corr_unstack[corr_unstack < 0.9999].head(1)
+                bot_corr = corr_unstack.tail(1)
+
+                if not top_corr.empty: st.warning(
+                    f"⚠️ 最高同步: {top_corr.index[0]} (Coef: {top_corr.values[0]:.2f})")
+                if not bot_corr.empty: st.success(
+                    f"🛡️ 最佳对冲: {bot_corr.index[0]} (Coef: {bot_corr.values[0]:.2f})")
+
+                # --- 配置建议: 基于同一份收益率面板求目标权重，再算下一笔定投怎么分 ---
+                if df_close.shape[1] >= 2:
                     st.markdown("---")
-                    corr_unstack = corr_matrix.unstack().sort_values(ascending=False)
-                    top_corr = corr_unstack[corr_unstack < 0.9999].head(1)
-                    bot_corr = corr_unstack.tail(1)
-
-                    if not top_corr.empty: st.warning(
-                        f"⚠️ 最高同步: {top_corr.index[0]} (Coef: {top_corr.values[0]:.2f})")
-                    if not bot_corr.empty: st.success(
-                        f"🛡️ 最佳对冲: {bot_corr.index[0]} (Coef: {bot_corr.values[0]:.2f})")
-
-            except Exception as e:
-                st.error(f"Error: {e}")
-
-# =========================================================
-# 🆕 模块五：AI 趋势预测 (Machine Learning)
-# =========================================================
-elif menu == "AI 趋势预测 (Prophet)":
-    st.title("AI 价格趋势预测 (Prophet)")
-    st.info(
-        "💡 基于 Meta (Facebook) 开源的 Prophet 模型。它不仅看趋势，还能捕捉'季节性'规律（比如比特币周末由于美股休市可能出现的独立行情）。")
-
-    # 1. 侧边栏设置
-    st.sidebar.subheader("模型参数")
-    ticker = st.sidebar.text_input("预测资产", "BTC-USD").upper()
-
-    # 训练数据长度：数据越多，模型“见多识广”，但太久远的数据可能对现在没参考意义
-    train_years = st.sidebar.slider("训练数据 (年)", 1, 5, 2)
-
-    # 预测未来多久
-    predict_days = st.sidebar.slider("预测未来 (天)", 30, 365, 90)
-
-    if st.button("启动 AI 预测", type="primary"):
-        with st.spinner(f'正在训练 AI 模型 ({ticker})... 请稍候，这也需要消耗算力'):
-            try:
-                # 2. 获取训练数据
-                # 必须足够长，Prophet 才能学到规律
-                data = yf.download(ticker, period=f"{train_years}y", progress=False)
-
-                if isinstance(data.columns, pd.MultiIndex):
-                    data.columns = data.columns.get_level_values(0)
+                    st.subheader("⚖️ 配置建议")
+                    n_assets = df_close.shape[1]
+                    c1, c2 = st.columns(2)
+                    max_weight = c1.slider("单个资产权重上限", 1.0 / n_assets, 1.0, 1.0, step=0.01, format="%.2f")
+                    min_weight = c2.slider("单个资产权重下限", 0.0, 1.0 / n_assets, 0.0, step=0.01, format="%.2f")
+                    try:
+                        with perf_monitor.stage("optimizer.compare_methods", assets=n_assets):
+                            weights, opt_stats = optimizer.compare_methods(df_close, min_weight, max_weight)
+                        table = weights.rename(columns=optimizer.METHOD_NAMES)
+                        opt_stats = opt_stats.rename(index=optimizer.METHOD_NAMES,
+                                                     columns={'volatility': '年化波动率',
+                                                              'diversification_ratio': '分散化比率'})
+                        c_w, c_s = st.columns([3, 2])
+                        c_w.dataframe(table.style.format("{:.1%}"), use_container_width=True)
+                        c_s.dataframe(opt_stats.style.format({'年化波动率': "{:.1%}", '分散化比率': "{:.2f}"}),
+                                      use_container_width=True)
+                        st.caption(f"协方差: Ledoit-Wolf 收缩 (收缩强度 {weights.attrs['shrinkage']:.2f})")
+
+                        # 当前持仓市值 (USD): 账本里的份额 × 面板最新价格；不在面板里的持仓不参与分配
+                        method = st.radio("定投目标", optimizer.METHODS, horizontal=True,
+                                          format_func=optimizer.METHOD_NAMES.get)
+                        contribution = st.number_input("下次定投金额 (USD)", 0.0, value=1000.0, step=100.0)
+                        ledger = portfolio_store.load_trades()
+                        shares = ledger.groupby('Ticker')['Shares'].sum() if not ledger.empty else pd.Series(dtype=float)
+                        current = (shares.reindex(df_close.columns).fillna(0.0) * df_close.iloc[-1]).rename('current')
+                        if contribution > 0:
+                            split = optimizer.dca_split(current, weights[method], contribution)
+                            split.columns = ['当前市值', '目标权重', '本次买入', '买入后市值', '买入后权重']
+                            st.dataframe(split.style.format({'当前市值': "${:,.0f}", '本次买入': "${:,.0f}",
+                                                             '买入后市值': "${:,.0f}", '目标权重': "{:.1%}",
+                                                             '买入后权重': "{:.1%}"}),
+                                         use_container_width=True)
+                    except ValueError as e:
+                        st.error(str(e))
+
+    # =========================================================
+    # 🆕 模块五：AI 趋势预测 (Machine Learning)
+    # =========================================================
+    elif menu == "AI 趋势预测 (Prophet)":
+        st.title("AI 价格趋势预测 (Prophet)")
+        st.info(
+            "💡 基于 Meta (Facebook) 开源的 Prophet 模型。它不仅看趋势，还能捕捉'季节性'规律（比如比特币周末由于美股休市可能出现的独立行情）。")
+
+        # 1. 侧边栏设置
+        st.sidebar.subheader("模型参数")
+        ticker = st.sidebar.text_input("预测资产", "BTC-USD").upper()
+
+        # 训练数据长度：数据越多，模型“见多识广”，但太久远的数据可能对现在没参考意义
+        train_years = st.sidebar.slider("训练数据 (年)", 1, 5, 2)
+
+        # 预测未来多久
+        predict_days = st.sidebar.slider("预测未来 (天)", 30, 365, 90)
+
+        # 预测引擎: 快速引擎几十毫秒出结果，适合拖动滑块；Prophet 更精细但要训练几秒到几分钟
+        engines = {"快速: 趋势 + 傅里叶季节": "fourier", "快速: Holt-Winters": "holt_winters",
+                   "Prophet (较慢)": "prophet"}
+        engine = engines[st.sidebar.radio("预测引擎", list(engines))]
+
+        def forecast_task(job, ticker, train_years, predict_days, engine):
+            """后台任务: 取数 -> 训练 -> 预测 (在工作线程里运行，不能调用 st.*，提示信息随结果一起返回)"""
+            # 2. 获取训练数据
+            # 必须足够长，Prophet 才能学到规律
+            job.report(0.05, f"下载 {ticker} 历史行情...")
+            data = shared_cache.download(ticker, period=f"{train_years}y")
+
+            if isinstance(data.columns, pd.MultiIndex):
+                data.columns = data.columns.get_level_values(0)
+            data, dq_report = data_quality.validate_ohlcv(data, ticker)
+            result = {"ticker": ticker, "train_years": train_years, "predict_days": predict_days, "engine": engine,
+                      "dq_report": dq_report, "df_train": None, "forecast": None}
+            if data.empty:
+                return result
+
+            # 3. 数据预处理 (Prophet 的格式要求极其严格)
+            # 必须只有两列：'ds' (时间) 和 'y' (数值)
+            df_train = prepare_prophet_frame(data)
+
+            if engine == "prophet":
+                # Prophet 只在选中时才导入 (导入本身就要加载 cmdstan，需要一两秒)
+                job.report(0.15, "加载 Prophet...")
+                from prophet import Prophet
+
+                # 4. 初始化并训练模型
+                # daily_seasonality=True 强制开启日线规律分析
+                model = Prophet(daily_seasonality=True)
+                job.report(0.25, f"训练模型 ({len(df_train)} 天数据)...")
+                with perf_monitor.stage("prophet.fit") as s:
+                    s.set_frame(df_train)
+                    model.fit(df_train)
 
-                if data.empty:
+                # 5. 构建未来时间表
+                job.report(0.85, "生成预测...")
+                future = model.make_future_dataframe(periods=predict_days)
+
+                # 6. 进行预测
+                with perf_monitor.stage("prophet.predict") as s:
+                    forecast = s.set_frame(model.predict(future))
+            else:
+                # 4-6. 快速引擎: 输出与 Prophet 的 forecast 同结构，下面的画图代码共用
+                job.report(0.5, "快速引擎预测中...")
+                with perf_monitor.stage(f"fast_forecast.{engine}") as s:
+                    s.set_frame(df_train)
+                    forecast = fast_forecast.forecast(df_train, predict_days, method=engine)
+            result.update(df_train=df_train, forecast=forecast)
+            return result
+
+        if st.button("启动 AI 预测", type="primary"):
+            # 训练放到后台任务里: 页面不再卡在 spinner 上，训练期间照样可以调整图表选项 / 切换页面再回来
+            # 同样参数的任务多个会话共用一份；session_state 里只放任务 id，结果在任务里跨 rerun 保留
+            previous = job_runner.get(st.session_state.get('forecast_job'))
+            job = job_runner.submit("forecast", forecast_task, ticker, train_years, predict_days, engine,
+                                    key=("forecast", ticker, train_years, predict_days, engine))
+            st.session_state.forecast_job = job.id
+            if previous is not None:
+                previous.cancel()  # 上一次还没跑完 (参数不同) 的任务不再需要；同一个任务只是去掉一个等待方
+
+        job = show_job_progress('forecast_job')
+        if job is not None:
+            # 图表选项: 只影响画图，任务运行中也能改，不会重新训练
+            c1, c2 = st.columns(2)
+            log_y = c1.checkbox("对数坐标", False)
+            show_components = c2.checkbox("显示模型分解", True)
+
+            if job.status == 'failed':
+                st.error(f"AI 预测模型崩溃了: {job.error}")
+            elif job.status == 'cancelled':
+                st.info("预测已取消。")
+            elif job.status == 'done':
+                res = job.result
+                show_quality_warnings(res['dq_report'])
+                if res['forecast'] is None:
                     st.error("❌ 无法获取数据")
                 else:
-                    # 3. 数据预处理 (Prophet 的格式要求极其严格)
-                    # 必须只有两列：'ds' (时间) 和 'y' (数值)
-                    df_train = data.reset_index()[['Date', 'Close']]
-                    df_train.columns = ['ds', 'y']
-
-                    # ⚠️ 关键修复：去除时区信息 (tz-naive)，否则 Prophet 会报错
-                    df_train['ds'] = df_train['ds'].dt.tz_localize(None)
-
-                    # 4. 初始化并训练模型
-                    # daily_seasonality=True 强制开启日线规律分析
-                    model = Prophet(daily_seasonality=True)
-                    model.fit(df_train)
-
-                    # 5. 构建未来时间表
-                    future = model.make_future_dataframe(periods=predict_days)
-
-                    # 6. 进行预测
-                    forecast = model.predict(future)
+                    df_train, forecast = res['df_train'], res['forecast']
+                    if (res['ticker'], res['train_years'], res['predict_days'], res['engine']) != \
+                            (ticker, train_years, predict_days, engine):
+                        st.caption("⚠️ 侧边栏参数已修改，下面仍是上一次的结果；点击「启动 AI 预测」重新计算。")
 
                     # 7. 可视化 (使用 Plotly 交互图)
-                    st.subheader(f"📈 {ticker} 未来 {predict_days} 天走势预测")
+                    st.subheader(f"📈 {res['ticker']} 未来 {res['predict_days']} 天走势预测")
+                    st.caption(f"训练 + 预测用时 {job.seconds:.1f}s")
 
                     # 绘制主图 (包含历史数据、拟合线、置信区间)
-                    fig_main = plot_plotly(model, forecast)
+                    # 三个引擎共用同一个画图函数 (prophet.plot.plot_plotly 在 pandas 3 下会因 assert m.history 报错)
+                    fig_main = build_forecast_figure(df_train, forecast, f"AI Prediction: {res['ticker']}")
                     fig_main.update_layout(
-                        title=f"AI Prediction: {ticker}",
+                        title=f"AI Prediction: {res['ticker']}",
                         yaxis_title="Price",
                         xaxis_title="Date",
                         height=600,
                         template="plotly_dark"  # 保持你的深色风格
                     )
-                    st.plotly_chart(fig_main, use_container_width=True)
+                    if log_y:
+                        fig_main.update_yaxes(type='log')
+                    with perf_monitor.stage("st.plotly_chart", traces=len(fig_main.data)):
+                        st.plotly_chart(fig_main, use_container_width=True)
 
                     # 8. 趋势分解 (Data Science 最有价值的部分)
-                    st.markdown("---")
-                    st.subheader("🔍 深度归因分析 (Model Components)")
-                    st.caption("AI 发现了什么规律？")
-
-                    # 获取组件数据
-                    # 趋势项
-                    fig_trend = go.Figure()
-                    fig_trend.add_trace(
-                        go.Scatter(x=forecast['ds'], y=forecast['trend'], mode='lines', name='总体趋势'))
-                    fig_trend.update_layout(title="1. 总体长期趋势 (Trend)", height=300, template="plotly_dark")
-                    st.plotly_chart(fig_trend, use_container_width=True)
-
-                    # 周度规律 (Weekly Seasonality)
-                    # 看看周几容易涨，周几容易跌
-                    if 'weekly' in forecast.columns:
-                        # 提取一周7天的数据
-                        days = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
-                        # Prophet 的 weekly 数据是周期性的，我们需要取巧提取一下
-                        # 这里我们简化处理，直接画出 forecast 里的最后 7 天的 weekly component 即可看出规律
-
-                        # 为了准确展示“周几”，我们用 Prophet 内置的画图更方便，但为了交互性，我们手动画一个简单的
-                        # 提取最近一周的 weekly component
-                        weekly_df = forecast.tail(7).copy()
-                        weekly_df['day_name'] = weekly_df['ds'].dt.day_name()
-
-                        # 按周一到周日排序
-                        weekly_df['day_index'] = weekly_df['ds'].dt.dayofweek
-                        weekly_df = weekly_df.sort_values('day_index')
-
-                        fig_week = go.Figure()
-                        fig_week.add_trace(go.Bar(
-                            x=weekly_df['day_name'],
-                            y=weekly_df['weekly'],
-                            marker_color=['green' if x > 0 else 'red' for x in weekly_df['weekly']]
-                        ))
-                        fig_week.update_layout(title="2. 周度效应 (Weekly Seasonality) - 周几适合买?", height=300,
-                                               template="plotly_dark")
-                        st.plotly_chart(fig_week, use_container_width=True)
-                        st.info("👆 柱子向上(绿色)代表这天通常会上涨，向下(红色)代表通常会下跌。")
+                    if show_components:
+                        st.markdown("---")
+                        st.subheader("🔍 深度归因分析 (Model Components)")
+                        st.caption("AI 发现了什么规律？")
+
+                        # 获取组件数据
+                        # 趋势项
+                        fig_trend = go.Figure()
+                        fig_trend.add_trace(
+                            go.Scatter(x=forecast['ds'], y=forecast['trend'], mode='lines', name='总体趋势'))
+                        fig_trend.update_layout(title="1. 总体长期趋势 (Trend)", height=300, template="plotly_dark")
+                        st.plotly_chart(fig_trend, use_container_width=True)
+
+                        # 周度规律 (Weekly Seasonality)
+                        # 看看周几容易涨，周几容易跌
+                        if 'weekly' in forecast.columns:
+                            # 提取一周7天的数据
+                            days = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+                            # Prophet 的 weekly 数据是周期性的，我们需要取巧提取一下
+                            # 这里我们简化处理，直接画出 forecast 里的最后 7 天的 weekly component 即可看出规律
+
+                            # 为了准确展示“周几”，我们用 Prophet 内置的画图更方便，但为了交互性，我们手动画一个简单的
+                            # 提取最近一周的 weekly component
+                            weekly_df = forecast.tail(7).copy()
+                            weekly_df['day_name'] = weekly_df['ds'].dt.day_name()
+
+                            # 按周一到周日排序
+                            weekly_df['day_index'] = weekly_df['ds'].dt.dayofweek
+                            weekly_df = weekly_df.sort_values('day_index')
+
+                            fig_week = go.Figure()
+                            fig_week.add_trace(go.Bar(
+                                x=weekly_df['day_name'],
+                                y=weekly_df['weekly'],
+                                marker_color=['green' if x > 0 else 'red' for x in weekly_df['weekly']]
+                            ))
+                            fig_week.update_layout(title="2. 周度效应 (Weekly Seasonality) - 周几适合买?", height=300,
+                                                   template="plotly_dark")
+                            st.plotly_chart(fig_week, use_container_width=True)
+                            st.info("👆 柱子向上(绿色)代表这天通常会上涨，向下(红色)代表通常会下跌。")
+
+        # 9. 历史准确度: 在过去多个时间点假装 "当时预测"，和真实走势对比
+        st.markdown("---")
+        with st.expander("📏 这个模型过去预测得准吗？(Walk-forward 回测)"):
+            c1, c2 = st.columns(2)
+            n_folds = c1.slider("回测次数 (折)", 4, 52, 12)
+            fold_step = c2.slider("每折间隔 (天)", 7, 60, 14)
+            st.caption(f"每折用之前 {train_years} 年数据训练，预测之后 {predict_days} 天；已算过的折会直接复用。")
+            if st.button("开始回测"):
+                # 同样放到后台任务: 进度按折汇报，取消后已算完的折仍会写入缓存，下次只算剩下的
+                previous = job_runner.get(st.session_state.get('backtest_job'))
+                job = job_runner.submit("walk_forward", walk_forward.evaluate_job, ticker, engine, n_folds=n_folds,
+                                        horizon=predict_days, step=fold_step, train_years=train_years,
+                                        key=("walk_forward", ticker, engine, n_folds, predict_days, fold_step,
+                                             train_years))
+                st.session_state.backtest_job = job.id
+                if previous is not None:
+                    previous.cancel()
+
+            job = show_job_progress('backtest_job')
+            if job is not None and job.status == 'failed':
+                st.error(f"回测失败: {job.error}")
+            elif job is not None and job.status == 'cancelled':
+                st.info("回测已取消，已完成的折已保存。")
+            elif job is not None and job.status == 'done':
+                folds, wf_summary = job.result
+                if wf_summary.empty:
+                    st.warning("历史数据不足，无法回测。")
+                else:
+                    st.dataframe(wf_summary.drop(columns='Ticker').style.format(
+                        {'MAPE': '{:.2%}', 'coverage': '{:.0%}'}), hide_index=True, use_container_width=True)
+                    st.caption(f"coverage = 实际价格落在预测区间内的比例，理想值约 "
+                               f"{fast_forecast.INTERVAL_WIDTH:.0%}。")
+                    st.line_chart(walk_forward.error_by_day(folds), x_label="预测距离 (天)", y_label="MAPE")
+
+    # =========================================================
+    # 🆕 模块六：周期收益表 (月度 / 年度 / 滚动年化)
+    # =========================================================
+    elif menu == "周期收益表":
+        st.title("📅 周期收益表")
+        st.info("日历月 / 日历年收益和滚动年化 (CAGR)：看清每个资产哪几年赚钱、最好和最坏的持有窗口是多少。")
+
+        st.sidebar.subheader("设置")
+        rt_symbols = st.sidebar.text_area("资产代码", "BTC-USD, ^GSPC, NVDA, GLD", height=100)
+        rt_period = st.sidebar.selectbox("历史区间", ["3y", "5y", "10y", "max"], index=2)
+        rt_years = st.sidebar.slider("滚动年化窗口 (年)", 1, 10, returns_table.ROLLING_YEARS)
+
+        if st.button("📅 计算收益表", type="primary"):
+            tickers = [x.strip().upper() for x in rt_symbols.split(',') if x.strip()]
+            with st.spinner("计算中..."):
+                try:
+                    panel = shared_cache.get_or_load(("close_panel", tuple(tickers), rt_period),
+                                                     lambda: price_store.load_close_panel(tickers, rt_period),
+                                                     ttl=price_store.REFRESH_SECONDS)
+                    panel, dq_report = data_quality.validate_panel(panel, mode='quarantine')
+                    st.session_state.returns_table = {"symbols": rt_symbols, "period": rt_period, "panel": panel,
+                                                      "dq_report": dq_report, "missing": [t for t in tickers
+                                                                                          if t not in panel.columns]}
+                except Exception as e:
+                    st.session_state.pop('returns_table', None)
+                    st.error(f"数据错误: {e}")
+
+        # 面板放在 session_state，切换 Ticker / 滚动窗口时不重新取数；收益表按面板指纹缓存在 shared_cache
+        rt_state = st.session_state.get('returns_table')
+        if rt_state and rt_state['symbols'] == rt_symbols and rt_state['period'] == rt_period:
+            panel = rt_state['panel']
+            show_quality_warnings(rt_state['dq_report'])
+            if rt_state['missing']:
+                st.warning(f"⚠️ 未获取到数据: {', '.join(rt_state['missing'])}")
+            if panel.empty:
+                st.error("没有可用的数据。")
+            else:
+                st.caption(f"收益口径: {corporate_actions.BASIS_NAMES[panel.attrs.get('basis', corporate_actions.RETURN_BASIS)]}"
+                           f"；第一期 (或上市当期) 从该期第一个收盘价起算，是不完整的一期。")
+                tables = returns_table.cached(panel, rt_years)
+
+                st.subheader("📊 年度收益")
+                with perf_monitor.stage("st.plotly_chart", chart="yearly"):
+                    st.plotly_chart(build_returns_heatmap(tables['yearly'].T, "各资产日历年收益"),
+                                    use_container_width=True)
+
+                rt_ticker = st.selectbox("月度明细", list(panel.columns))
+                with perf_monitor.stage("st.plotly_chart", chart="monthly"):
+                    st.plotly_chart(build_returns_heatmap(
+                        returns_table.calendar_table(tables['monthly'], tables['yearly'], rt_ticker),
+                        f"{rt_ticker} 月度收益"), use_container_width=True)
+
+                st.subheader(f"📈 滚动 {rt_years} 年年化收益")
+                with perf_monitor.stage("st.line_chart") as s:
+                    st.line_chart(s.set_frame(tables['rolling'].dropna(how='all')))
+
+                summary = tables['summary']
+                view = pd.DataFrame({
+                    '全区间年化': summary['cagr'],
+                    '最好月份': summary['best_month'], '最好月份时间': summary['best_month_at'].astype(str),
+                    '最差月份': summary['worst_month'], '最差月份时间': summary['worst_month_at'].astype(str),
+                    '最好年份': summary['best_year'], '最好年份时间': summary['best_year_at'].astype(str),
+                    '最差年份': summary['worst_year'], '最差年份时间': summary['worst_year_at'].astype(str),
+                    f'最好 {rt_years} 年年化': summary['best_window'],
+                    f'最差 {rt_years} 年年化': summary['worst_window'],
+                    '最差窗口结束日': pd.to_datetime(summary['worst_window_at']).dt.date.astype(str),
+                    '上涨月份占比': summary['positive_months'],
+                })
+                pct_cols = [c for c in view.columns if not c.endswith(('时间', '结束日'))]
+                st.dataframe(view.style.format("{:.1%}", subset=pct_cols, na_rep="-"), use_container_width=True)
 
-            except Exception as e:
-                st.error(f"AI 预测模型崩溃了: {e}")
\ No newline at end of file
+
+# =========================================================
+# 🐞 性能调试面板 (侧边栏)
+# =========================================================
+if show_debug:
+    with st.sidebar.expander("⏱️ 本次运行耗时", expanded=True):
+        stage_df = perf_trace.to_frame()
+        if stage_df.empty:
+            st.caption("本次运行没有记录到任何阶段 (点击页面上的按钮后再看)。")
+        else:
+            st.metric("总耗时", f"{perf_trace.wall_seconds:.3f}s",
+                      help=f"从页面开始到结束的墙钟时间；顶层阶段合计 {perf_trace.total_seconds:.3f}s")
+            st.dataframe(stage_df[["stage", "seconds", "rows", "bytes", "cache_hits", "cache_misses"]],
+                         hide_index=True, use_container_width=True)
+        cache_stats = shared_cache.stats()
+        st.caption(f"共享缓存: {cache_stats['entries']} 项 / {cache_stats['mb']:.1f} MB，"
+                   f"命中 {cache_stats['hits']}、等待 {cache_stats['waits']}、未命中 {cache_stats['misses']}、"
+                   f"淘汰 {cache_stats['evictions']}")
+        st.download_button("导出 JSON (最近请求)", perf_monitor.export_json(),
+                           file_name="perf_trace.json", mime="application/json")
+        if perf_trace.profile_text:
+            st.text_area("Profile 输出", perf_trace.profile_text, height=300)
@@ -0,0 +1,95 @@
+"""data_service 的 Python 客户端 (脚本 / notebook 用它代替直接调用 yf.download)
+
+    import data_client
+    bars = data_client.fetch_bars("NVDA", "1y", columns=["Close", "MA200"])
+    panel = data_client.fetch_panel(["BTC-USD", "^GSPC"], "3y", basis="price")
+
+服务地址由环境变量 DATA_SERVICE_URL 指定 (http://127.0.0.1:8765 或 unix:///tmp/finance_data.sock)。
+没有配置、或者服务没有启动时，自动回退为在本进程里直接读 price_store，返回的数据完全相同，只是不共享缓存。
+"""
+import http.client
+import json
+import os
+import socket
+from urllib.parse import urlencode, urlparse
+
+import pyarrow as pa
+
+import data_service
+
+# --- 配置区域 ---
+SERVICE_URL = os.environ.get("DATA_SERVICE_URL", "")
+TIMEOUT = 60  # 秒；服务端首次请求可能要整段下载历史
+
+_fallback_warned = False
+
+
+class ServiceError(RuntimeError):
+    """服务端返回了错误 (参数不对 / 取不到数据)"""
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def _connection(url):
+    parsed = urlparse(url)
+    if parsed.scheme == 'unix':
+        return _UnixConnection(parsed.path)
+    return http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=TIMEOUT)
+
+
+def _request(url, path, params):
+    """GET 请求，返回 (状态码, Content-Type, 响应体)"""
+    conn = _connection(url)
+    try:
+        query = urlencode({k: v for k, v in params.items() if v is not None})
+        conn.request("GET", f"{path}?{query}" if query else path)
+        resp = conn.getresponse()
+        return resp.status, resp.getheader("Content-Type", ""), resp.read()
+    finally:
+        conn.close()
+
+
+def fetch_table(kind, url=None, **params):
+    """取 Arrow 表 (零拷贝: 直接在响应缓冲区上读出列)；服务不可用时在本地计算同样的结果"""
+    global _fallback_warned
+    url = SERVICE_URL if url is None else url
+    query = {k: ','.join(v) if isinstance(v, (list, tuple)) else v for k, v in params.items()}
+    if url:
+        try:
+            status, content_type, body = _request(url, f"/{kind}", query)
+        except OSError as e:
+            if not _fallback_warned:
+                print(f"⚠️ 数据服务 {url} 不可用 ({e})，改为本地读取")
+                _fallback_warned = True
+        else:
+            if status != 200:
+                error = json.loads(body).get('error') if content_type.startswith('application/json') else body[:200]
+                raise ServiceError(f"数据服务返回 {status}: {error}")
+            return pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    # 本地回退: 与服务端走同一段代码 (参数格式也一致)
+    local = {k: [str(v)] for k, v in query.items() if v is not None}
+    return data_service.query_table(kind, local)
+
+
+def fetch_bars(ticker, period='1y', resolution='auto', columns=None, start=None, end=None, indicators=False,
+               as_arrow=False):
+    """单个 Ticker 的 K 线 (与 price_store.load_bars 相同的列)；indicators=True 时附带 RSI / MACD / 布林带"""
+    table = fetch_table('bars', ticker=ticker, period=period, resolution=resolution, columns=columns,
+                        start=start, end=end, indicators=1 if indicators else None)
+    return table if as_arrow else data_service.frame_from_table(table)
+
+
+def fetch_panel(tickers, period='1y', basis=None, columns=None, start=None, end=None, as_arrow=False):
+    """多个 Ticker 的日线收盘价面板 (与 price_store.load_close_panel 相同)"""
+    table = fetch_table('panel', tickers=list(tickers), period=period, basis=basis, columns=columns,
+                        start=start, end=end)
+    return table if as_arrow else data_service.frame_from_table(table)
@@ -0,0 +1,325 @@
+"""下载数据质量校验 (在指标计算 / 估值之前执行)
+
+对整个价格面板 (列 = Ticker) 一次性向量化检查:
+- 形状异常: 缺少 Ticker、重复列、重复日期、日期未排序
+- 缺失交易日: 与预期交易日历对比 (美股按 NYSE 休市日，加密货币 7x24，外汇按工作日)
+- 价格停滞: 连续多天收盘价完全相同 (数据源卡住)
+- 疑似拆股跳变: 单日涨跌接近 2/3/4/5/10 倍或其倒数
+  只有同一天有比例吻合的拆股记录 (Stock Splits，没传时读 corporate_actions 的本地缓存) 才算 "确认的拆股";
+  雅虎的 Close 本身已按拆股调整，没有拆股记录的跳变多半是真实的暴涨暴跌 (加密货币 / 小盘股很常见)，只提示不改数据
+- 零值 / 负值
+
+mode='repair'     修复后放行: 非正数置空后向前填充，确认的拆股跳变向前复权
+mode='quarantine' 有问题的 Ticker 直接隔离 (从面板中移除)，由调用方决定怎么提示
+每个 Ticker 的最新报告保存在进程内，可用 report_frame() 查看。
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import (AbstractHolidayCalendar, GoodFriday, Holiday, USLaborDay,
+                                    USMartinLutherKingJr, USMemorialDay, USPresidentsDay,
+                                    USThanksgivingDay, nearest_workday)
+from pandas.tseries.offsets import CustomBusinessDay
+
+# --- 配置区域 ---
+STALE_RUN = 5  # 连续 N 个交易日价格完全不变视为停滞
+SPLIT_RATIOS = np.array([2, 3, 4, 5, 8, 10, 15, 20], dtype=float)
+SPLIT_TOLERANCE = 0.03  # 与拆股比例相差 3% 以内才算"像拆股"
+MISSING_WARN_RATIO = 0.01  # 缺失交易日超过 1% 才提示 (日历是近似的，早年的临时休市会产生少量误报)
+MAX_MISSING_RATIO = 0.2  # 缺失交易日超过 20% 的 Ticker 直接隔离
+FILL_LIMIT = 5  # repair 模式下最多连续向前填充的天数
+
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    """近似的纽交所休市日历 (不含临时休市)"""
+    rules = [
+        Holiday('NewYearsDay', month=1, day=1, observance=nearest_workday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-06-19', observance=nearest_workday),
+        Holiday('USIndependenceDay', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas', month=12, day=25, observance=nearest_workday),
+    ]
+
+
+_NYSE_DAY = CustomBusinessDay(calendar=NYSEHolidayCalendar())
+
+_reports = {}
+_reports_lock = threading.Lock()
+
+
+def calendar_for(ticker):
+    """根据代码判断交易日历: crypto (7x24) / fx (工作日) / nyse"""
+    if ticker.endswith('-USD'):
+        return 'crypto'
+    if ticker.endswith('=X'):
+        return 'fx'
+    return 'nyse'
+
+
+def expected_sessions(calendar, start, end):
+    """某个日历在 [start, end] 内应有的交易日"""
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    if calendar == 'crypto':
+        return pd.date_range(start, end, freq='D')
+    if calendar == 'fx':
+        return pd.date_range(start, end, freq='B')
+    return pd.date_range(start, end, freq=_NYSE_DAY)
+
+
+def check_download_shape(data, tickers):
+    """检查 yf.download 结果的列结构，返回问题列表 (空列表表示正常)"""
+    issues = []
+    if data is None or data.empty:
+        return ["empty"]
+    if data.index.has_duplicates:
+        issues.append("duplicate_dates")
+    if not data.index.is_monotonic_increasing:
+        issues.append("unsorted_index")
+    if data.columns.has_duplicates:
+        issues.append("duplicate_columns")
+    if isinstance(data.columns, pd.MultiIndex):
+        names = set(data.columns.get_level_values(0)) | set(data.columns.get_level_values(1))
+        missing = [t for t in tickers if t not in names]
+        if missing and len(tickers) > 1:
+            issues.append("missing_tickers:" + ",".join(missing))
+    elif len(tickers) > 1:
+        issues.append("flat_columns_for_multi_ticker")
+    return issues
+
+
+def _tz_naive_dates(index):
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.normalize()
+
+
+def _missing_sessions(panel, calendars):
+    """每个 Ticker 在自身首尾有效日期之间缺失的预期交易日数量"""
+    dates = _tz_naive_dates(panel.index)
+    missing = pd.Series(0, index=panel.columns, dtype=int)
+    expected_total = pd.Series(0, index=panel.columns, dtype=int)
+    valid = panel.notna().set_axis(dates)
+    for cal in set(calendars.values()):
+        cols = [c for c in panel.columns if calendars[c] == cal]
+        sub = valid[cols]
+        sub = sub[~sub.index.duplicated()]
+        if sub.empty or not sub.to_numpy().any():
+            continue
+        expected = expected_sessions(cal, sub.index.min(), sub.index.max())
+        on_cal = sub.reindex(expected, fill_value=False)
+        # 只统计每列首个有效值到最后一个有效值之间 (上市前 / 数据截止后不算缺失)
+        inside = on_cal.cummax() & on_cal[::-1].cummax()[::-1]
+        missing[cols] = (inside & ~on_cal).sum().astype(int)
+        expected_total[cols] = inside.sum().astype(int)
+    return missing, expected_total
+
+
+def _max_run(mask, counted=None):
+    """每列连续 True 的最长长度 (向量化 run-length)；counted 为 False 的行不计数也不打断"""
+    m = mask.to_numpy(dtype=bool)
+    if m.size == 0:
+        return pd.Series(0, index=mask.columns)
+    w = m if counted is None else m & counted.to_numpy(dtype=bool)
+    csum = np.cumsum(w, axis=0)
+    reset = np.where(~m, csum, 0)
+    run = csum - np.maximum.accumulate(reset, axis=0)
+    return pd.Series(run.max(axis=0), index=mask.columns)
+
+
+def _split_jumps(panel):
+    """疑似拆股的跳变: 返回与面板同形状的比例矩阵 (非跳变处为 NaN)"""
+    ratio = panel / panel.ffill().shift(1)
+    r = ratio.to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        big = np.where(r >= 1, r, 1 / r)
+    near = np.abs(big[..., None] / SPLIT_RATIOS - 1) <= SPLIT_TOLERANCE
+    is_split = near.any(axis=-1) & np.isfinite(big)
+    return pd.DataFrame(np.where(is_split, r, np.nan), index=panel.index, columns=panel.columns)
+
+
+def _split_events(ticker, splits):
+    """一个 Ticker 的拆股记录 (日期 -> 比例，只含非零行)；splits 里没有的从 corporate_actions 的本地缓存读"""
+    if splits is not None and ticker in splits:
+        events = pd.Series(splits[ticker], dtype=float)
+    else:
+        import corporate_actions
+
+        events = corporate_actions.load_actions(str(ticker))['Stock Splits'].astype(float)
+    events = events[events > 0]
+    events.index = _tz_naive_dates(events.index)
+    return events[~events.index.duplicated(keep='last')]
+
+
+def _confirm_splits(jumps, splits=None):
+    """只保留有拆股记录佐证的跳变: 同一天有拆股，且 价格比 × 拆股比例 ≈ 1 (如 2 拆 1: 0.5 × 2)"""
+    confirmed = pd.DataFrame(np.nan, index=jumps.index, columns=jumps.columns)
+    dates = _tz_naive_dates(jumps.index)
+    for ticker in jumps.columns[jumps.notna().any().to_numpy()]:
+        events = _split_events(ticker, splits)
+        if events.empty:
+            continue
+        ratio = events.reindex(dates).to_numpy()
+        r = jumps[ticker].to_numpy()
+        with np.errstate(invalid='ignore'):
+            ok = np.abs(r * ratio - 1) <= SPLIT_TOLERANCE
+        confirmed[ticker] = np.where(ok, r, np.nan)
+    return confirmed
+
+
+def validate_panel(panel, mode='repair', calendars=None, splits=None):
+    """校验收盘价面板 (列 = Ticker)，返回 (处理后的面板, 每个 Ticker 一行的报告)
+
+    splits: {Ticker: 拆股比例 Series} (yfinance 的 Stock Splits 列)，用来确认拆股跳变；没给的 Ticker 读本地缓存。
+    """
+    panel = panel.loc[~panel.index.duplicated(keep='last')].sort_index()
+    panel = panel.loc[:, ~panel.columns.duplicated()].astype(float)
+    calendars = calendars or {c: calendar_for(str(c)) for c in panel.columns}
+
+    nonpositive = panel <= 0
+    clean = panel.mask(nonpositive)
+    missing, expected_total = _missing_sessions(clean, calendars)
+    # 混合日历的面板里，美股在周末是空值：空值行既不计入也不打断停滞区间
+    valid = clean.notna()
+    stale_len = _max_run(clean.ffill().diff().eq(0) | ~valid, counted=valid) + 1
+    stale_len[stale_len == 1] = 0
+    jumps = _split_jumps(clean)
+    confirmed = _confirm_splits(jumps, splits)
+
+    report = pd.DataFrame({
+        'rows': clean.notna().sum(),
+        'first': clean.apply(pd.Series.first_valid_index),
+        'last': clean.apply(pd.Series.last_valid_index),
+        'missing_sessions': missing,
+        'missing_ratio': (missing / expected_total.where(expected_total > 0)).fillna(0.0),
+        'max_stale_run': stale_len.astype(int),
+        'split_jumps': jumps.notna().sum(),  # 全部疑似跳变 (含已确认的拆股)
+        'confirmed_splits': confirmed.notna().sum(),
+        'nonpositive': nonpositive.sum(),
+        'nan_values': panel.isna().sum(),
+    })
+    report.index.name = 'Ticker'
+
+    has_issue = ((report['missing_ratio'] > MISSING_WARN_RATIO) | (report['max_stale_run'] >= STALE_RUN)
+                 | (report['split_jumps'] > 0) | (report['nonpositive'] > 0))
+    fatal = (report['rows'] == 0) | (report['missing_ratio'] > MAX_MISSING_RATIO)
+    if mode == 'quarantine':
+        fatal |= (report['confirmed_splits'] > 0) | (report['nonpositive'] > 0) \
+                 | (report['max_stale_run'] >= STALE_RUN)
+
+    # repair 模式下真正改过数据的才算 "已修复"；没有确认的跳变 / 缺失 / 停滞只提示
+    repaired = (mode == 'repair') & ((report['confirmed_splits'] > 0) | (report['nonpositive'] > 0))
+    report['status'] = np.where(fatal, 'quarantined', np.where(repaired, 'repaired',
+                                                              np.where(has_issue, 'warning', 'ok')))
+
+    keep = report.index[report['status'] != 'quarantined']
+    clean = clean[keep]
+    if mode == 'repair':
+        # 确认的拆股跳变: 把跳变之前的价格除以比例 (向前复权)，让序列连续
+        factor = confirmed[keep].fillna(1.0)[::-1].cumprod()[::-1].shift(-1).fillna(1.0)
+        clean = (clean * factor).ffill(limit=FILL_LIMIT)
+
+    with _reports_lock:
+        for ticker, row in report.iterrows():
+            _reports[ticker] = {**row.to_dict(), 'checked_at': pd.Timestamp.now()}
+    return clean, report
+
+
+def validate_download(data, tickers, mode='repair', field='Close'):
+    """yf.download 结果 -> (校验后的收盘价面板, 报告)，形状异常会写进报告的 shape 列"""
+    from indicators import extract_close_panel
+
+    shape_issues = check_download_shape(data, tickers)
+    if shape_issues == ["empty"]:
+        report = pd.DataFrame({'status': 'quarantined', 'shape': 'empty'}, index=pd.Index(tickers, name='Ticker'))
+        return pd.DataFrame(), report
+
+    present = [t for t in tickers if not any(i.startswith('missing_tickers') and t in i.split(':')[1].split(',')
+                                             for i in shape_issues)]
+    panel = extract_close_panel(data, present, field=field)
+    splits = None
+    if 'Stock Splits' in data.columns.get_level_values(0):  # actions=True 的下载结果自带拆股记录
+        splits = extract_close_panel(data, present, field='Stock Splits').fillna(0.0)
+    clean, report = validate_panel(panel, mode=mode, splits=splits)
+    for t in tickers:
+        if t not in report.index:
+            report.loc[t, 'status'] = 'quarantined'
+    report['shape'] = ";".join(shape_issues)
+    return clean, report
+
+
+def validate_ohlcv(df, ticker, mode='repair', splits=None):
+    """单个 Ticker 的 OHLCV 表 (列已经拍平) -> (校验后的表, 一行报告)
+
+    以 Close 为准做判断；repair 时 Open/High/Low 使用同样的复权因子和填充。
+    splits 为拆股比例 Series，默认取表里的 Stock Splits 列，没有时读 corporate_actions 的本地缓存。
+    """
+    if df.empty or 'Close' not in df.columns:
+        report = pd.DataFrame({'status': ['quarantined'], 'shape': ['empty']}, index=pd.Index([ticker], name='Ticker'))
+        return df.iloc[0:0], report
+
+    df = df.loc[~df.index.duplicated(keep='last')].sort_index()
+    if splits is None and 'Stock Splits' in df.columns:
+        splits = df['Stock Splits'].fillna(0.0)
+    close, report = validate_panel(df[['Close']].rename(columns={'Close': ticker}), mode=mode,
+                                   calendars={ticker: calendar_for(ticker)},
+                                   splits=None if splits is None else {ticker: splits})
+    report['shape'] = ";".join(check_download_shape(df, [ticker]))
+    if ticker not in close.columns:
+        return df.iloc[0:0], report
+
+    if mode == 'repair':
+        price_cols = [c for c in ('Open', 'High', 'Low') if c in df.columns]
+        raw_close = df['Close'].where(df['Close'] > 0)
+        factor = (close[ticker] / raw_close).where(raw_close.notna(), np.nan).ffill().fillna(1.0)
+        df = df.copy()
+        for c in price_cols:
+            df[c] = (df[c].where(df[c] > 0) * factor).ffill(limit=FILL_LIMIT)
+        df['Close'] = close[ticker]
+        df = df.dropna(subset=['Close'])
+    return df, report
+
+
+def describe_issues(row):
+    """把报告中的一行翻译成简短中文说明 (给终端 / 页面提示用)"""
+    parts = []
+    if row.get('missing_ratio', 0) > MISSING_WARN_RATIO:
+        parts.append(f"缺失 {int(row['missing_sessions'])} 个交易日")
+    if row.get('max_stale_run', 0) >= STALE_RUN:
+        parts.append(f"价格连续 {int(row['max_stale_run'])} 天不变")
+    confirmed = int(row.get('confirmed_splits', 0) or 0)
+    if confirmed:
+        parts.append(f"{confirmed} 次拆股跳变 (已有拆股记录)")
+    if row.get('split_jumps', 0) > confirmed:
+        parts.append(f"{int(row['split_jumps']) - confirmed} 次单日暴涨暴跌 (没有拆股记录，未修改)")
+    if row.get('nonpositive', 0):
+        parts.append(f"{int(row['nonpositive'])} 个零值/负值")
+    if isinstance(row.get('shape'), str) and row['shape']:
+        parts.append(f"结构异常 ({row['shape']})")
+    return "，".join(parts) or "正常"
+
+
+def print_report(report):
+    """终端脚本用: 只打印有问题的 Ticker"""
+    for ticker, row in report[report['status'] != 'ok'].iterrows():
+        print(f"⚠️ [{ticker}] 数据质量 {row['status']}: {describe_issues(row)}")
+
+
+def report_frame():
+    """所有已校验 Ticker 的最新数据质量报告"""
+    with _reports_lock:
+        return pd.DataFrame.from_dict(_reports, orient='index').rename_axis('Ticker')
+
+
+def latest_report(tickers):
+    """指定 Ticker 的最新报告 (本进程内没校验过的 Ticker 不在结果里)"""
+    with _reports_lock:
+        rows = {t: _reports[t] for t in tickers if t in _reports}
+    return pd.DataFrame.from_dict(rows, orient='index', columns=None).rename_axis('Ticker') if rows \
+        else pd.DataFrame(columns=['status']).rename_axis('Ticker')
@@ -0,0 +1,203 @@
+"""本地行情数据服务: 以 Apache Arrow IPC 流提供缓存好的 K 线 / 收盘价面板
+
+脚本、dashboard、notebook 原本各自调用 yf.download 再各自整理格式。这个服务常驻一个进程:
+- 数据来自 price_store 的本地仓库，算好的结果放在 shared_cache 里 (Arrow 表也一并缓存)
+- 响应是 Arrow IPC 流，客户端 pa.ipc.open_stream 直接得到列式数据，不用再解析 CSV / JSON
+- 列投影 (columns=) 和日期区间 (start= / end=) 在服务端用 Table.select / Table.slice 完成，都是零拷贝
+- 可以监听 TCP 端口，也可以监听 Unix socket (只给本机用户用，不占端口)
+
+接口 (GET):
+    /bars?ticker=NVDA&period=1y&resolution=auto&columns=Close,MA200&start=2024-01-01&indicators=1
+    /panel?tickers=BTC-USD,^GSPC&period=1y&basis=total_return&start=...&end=...
+    /health
+
+启动: python data_service.py [--port 8765 | --socket /tmp/finance_data.sock]
+客户端见 data_client.py。
+"""
+import argparse
+import json
+import os
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import corporate_actions
+import perf_monitor
+import price_store
+import shared_cache
+from indicators import add_technical_indicators
+
+# --- 配置区域 ---
+HOST = os.environ.get("DATA_SERVICE_HOST", "127.0.0.1")
+PORT = int(os.environ.get("DATA_SERVICE_PORT", 8765))
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+INDEX_COL = 'Date'
+META_KEYS = ('resolution', 'basis')  # DataFrame.attrs 里随 Arrow schema metadata 一起传递的字段
+
+
+# --- 数据 (服务端与客户端的本地回退共用) ---
+def load_frame(kind, ticker=None, tickers=None, period='1y', resolution='auto', basis=None, indicators=False):
+    """按请求参数取出完整的 DataFrame (以日期为索引)，经 shared_cache 在会话 / 请求之间共享"""
+    if kind == 'bars':
+        if not ticker:
+            raise ValueError("缺少参数 ticker")
+        key = ('bars', ticker, period, resolution, bool(indicators))
+
+        def load():
+            bars = price_store.load_bars(ticker, period, resolution=resolution)
+            if indicators and not bars.empty:
+                # 与 dashboard 个股页一致: RSI / MACD / 布林带按显示分辨率算，MA200 保留日线口径
+                ma200 = bars['MA200']
+                bars = add_technical_indicators(bars)
+                bars['MA200'] = ma200
+            return bars
+    elif kind == 'panel':
+        if not tickers:
+            raise ValueError("缺少参数 tickers")
+        basis = basis or corporate_actions.RETURN_BASIS
+        if basis not in corporate_actions.BASES:
+            raise ValueError(f"未知的复权口径: {basis} (可选 {', '.join(corporate_actions.BASES)})")
+        key = ('close_panel', tuple(tickers), period, basis)
+
+        def load():
+            return price_store.load_close_panel(list(tickers), period, basis=basis)
+    else:
+        raise ValueError(f"未知的数据类型: {kind}")
+    return shared_cache.get_or_load(key, load, ttl=price_store.REFRESH_SECONDS)
+
+
+def to_table(frame):
+    """DataFrame -> Arrow 表: 日期索引变成第一列 Date，attrs 写进 schema metadata"""
+    table = pa.Table.from_pandas(frame.rename_axis(INDEX_COL).reset_index(), preserve_index=False)
+    meta = dict(table.schema.metadata or {})
+    meta.update({f"finance.{k}".encode(): str(frame.attrs[k]).encode() for k in META_KEYS if k in frame.attrs})
+    return table.replace_schema_metadata(meta)
+
+
+def project(table, columns=None, start=None, end=None):
+    """列投影 + 日期区间 (闭区间)；表按日期升序，区间用二分查找定位后 slice，不复制数据"""
+    if start is not None or end is not None:
+        dates = table.column(INDEX_COL).to_numpy()
+        lo = np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side='left') if start is not None else 0
+        hi = np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side='right') if end is not None else len(dates)
+        table = table.slice(lo, max(hi - lo, 0))
+    if columns:
+        missing = [c for c in columns if c not in table.column_names]
+        if missing:
+            raise ValueError(f"没有这些列: {', '.join(missing)} (可选 {', '.join(table.column_names[1:])})")
+        table = table.select([INDEX_COL] + [c for c in columns if c != INDEX_COL])
+    return table
+
+
+def frame_from_table(table):
+    """Arrow 表 -> 以 Date 为索引的 DataFrame，恢复 attrs"""
+    frame = table.to_pandas().set_index(INDEX_COL)
+    meta = table.schema.metadata or {}
+    for k in META_KEYS:
+        if f"finance.{k}".encode() in meta:
+            frame.attrs[k] = meta[f"finance.{k}".encode()].decode()
+    return frame
+
+
+def serialize(table):
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def query_table(kind, params):
+    """解析查询参数 -> 投影后的 Arrow 表 (转换好的整表也放进 shared_cache，重复请求只做 slice / select)"""
+    def one(name, default=None):
+        return params.get(name, [default])[0]
+
+    def many(name):
+        values = [v for item in params.get(name, []) for v in item.split(',') if v.strip()]
+        return [v.strip() for v in values] or None
+
+    tickers = many('tickers')
+    args = {
+        'ticker': (one('ticker') or '').upper() or None,
+        'tickers': tuple(t.upper() for t in tickers) if tickers else None,
+        'period': one('period', '1y'),
+        'resolution': one('resolution', 'auto'),
+        'basis': one('basis'),
+        'indicators': one('indicators', '0') in ('1', 'true', 'yes'),
+    }
+    key = ('arrow', kind) + tuple(sorted((k, v) for k, v in args.items() if v is not None))
+    table = shared_cache.get_or_load(key, lambda: to_table(load_frame(kind, **args)),
+                                     ttl=price_store.REFRESH_SECONDS)
+    return project(table, many('columns'), one('start'), one('end'))
+
+
+# --- HTTP ---
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # Unix socket 上 client_address 是空字符串
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, obj):
+        self._send(status, json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8"),
+                   "application/json; charset=utf-8")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        kind = url.path.strip('/')
+        if kind == 'health':
+            return self._send_json(200, {'status': 'ok', 'cache': shared_cache.stats()})
+        if kind not in ('bars', 'panel'):
+            return self._send_json(404, {'error': f"未知的接口: {url.path}"})
+        try:
+            table = query_table(kind, parse_qs(url.query))
+            # 只计序列化本身: 加载过程已经有 shared_cache / price_store 各自的阶段，嵌套会重复计时
+            with perf_monitor.stage("arrow.serialize", kind=kind, cols=table.num_columns) as s:
+                body = serialize(table)
+                s.rows, s.nbytes = table.num_rows, body.size
+        except ValueError as e:
+            return self._send_json(400, {'error': str(e)})
+        except Exception as e:
+            return self._send_json(500, {'error': f"{type(e).__name__}: {e}"})
+        self._send(200, body, ARROW_MIME)  # pa.Buffer 支持 buffer 协议，直接写出不再复制
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(host=HOST, port=PORT, socket_path=None):
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # 上次异常退出留下的 socket 文件
+        return UnixHTTPServer(socket_path, Handler)
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地行情数据服务 (Arrow IPC)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--socket", default=None, help="监听 Unix socket 而不是 TCP 端口")
+    a = parser.parse_args()
+    server = make_server(a.host, a.port, a.socket)
+    print(f"📡 数据服务已启动: {'unix://' + a.socket if a.socket else f'http://{a.host}:{a.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if a.socket and os.path.exists(a.socket):
+            os.remove(a.socket)
@@ -0,0 +1,199 @@
+"""轻量预测引擎 (Prophet 的快速替代)
+
+Prophet 在 5 年 BTC 日线上要训练几秒到几分钟，还依赖 cmdstan，不适合拖动滑块实时看结果。
+这里提供两个纯 numpy 的模型，几十毫秒内完成，输出与 Prophet 的 forecast DataFrame 同样的列:
+    ds / trend / trend_lower / trend_upper / yhat / yhat_lower / yhat_upper / additive_terms / weekly [/ yearly]
+行同样是 "全部历史日期 + 之后 periods 个自然日"，页面上的画图代码可以直接复用。
+
+- fourier: 分段线性趋势 (带岭惩罚的变点，相当于 Prophet 的 changepoint prior) + 傅里叶季节项，一次最小二乘
+- holt_winters: 加法 Holt-Winters (ETS(A,Ad,A))，参数网格向量化搜索，预测区间用解析方差公式
+"""
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# --- 配置区域 ---
+INTERVAL_WIDTH = 0.8  # 与 Prophet 默认一致
+N_CHANGEPOINTS = 25
+CHANGEPOINT_RANGE = 0.8  # 变点只放在前 80% 的历史里
+CHANGEPOINT_PRIOR_SCALE = 0.05
+SEASONALITY_PRIOR_SCALE = 10.0
+WEEKLY_ORDER = 3
+YEARLY_ORDER = 10
+
+# Holt-Winters 参数网格 (alpha: 水平, beta: 趋势, gamma: 季节, phi: 趋势阻尼)
+HW_ALPHA = np.array([0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9])
+HW_BETA = np.array([0.0, 0.01, 0.05, 0.2])
+HW_GAMMA = np.array([0.0, 0.05, 0.2])
+HW_PHI = np.array([0.9, 0.98, 1.0])
+
+METHODS = ('fourier', 'holt_winters')
+_DAY_NS = 86400 * 10 ** 9
+
+
+def _seasonalities(ds):
+    """按 Prophet 的自动规则决定开哪些季节项: 周度需要日频且 >= 2 周，年度需要 >= 2 年"""
+    span = (ds.iloc[-1] - ds.iloc[0]).days
+    step = ds.diff().dt.days.median() if len(ds) > 1 else 1
+    out = {}
+    if span >= 14 and step < 7:
+        out['weekly'] = (7.0, WEEKLY_ORDER)
+    if span >= 730:
+        out['yearly'] = (365.25, YEARLY_ORDER)
+    return out
+
+
+def _fourier(days, period, order):
+    """傅里叶特征 (以 1970-01-01 起的天数计，和 Prophet 一样保证周几的相位固定)"""
+    k = np.arange(1, order + 1)
+    x = 2 * np.pi * days[:, None] * k[None, :] / period
+    return np.hstack([np.sin(x), np.cos(x)])
+
+
+def future_dates(ds, periods):
+    """历史日期 + 之后 periods 个自然日 (等价于 Prophet 的 make_future_dataframe)"""
+    ds = pd.to_datetime(pd.Series(ds)).reset_index(drop=True)
+    future = pd.date_range(ds.iloc[-1], periods=periods + 1, freq='D')[1:]
+    return pd.concat([ds, pd.Series(future)], ignore_index=True)
+
+
+def _frame(ds, trend, trend_band, seasonal, yhat, band):
+    out = pd.DataFrame({'ds': ds, 'trend': trend,
+                        'yhat_lower': yhat - band, 'yhat_upper': yhat + band,
+                        'trend_lower': trend - trend_band, 'trend_upper': trend + trend_band})
+    additive = np.zeros(len(ds))
+    for name, values in seasonal.items():
+        out[name] = values
+        additive = additive + values
+    out['additive_terms'] = additive
+    out['yhat'] = yhat
+    return out
+
+
+# --- 趋势 + 傅里叶最小二乘 ---
+def _fit_fourier(df_train, periods, z):
+    ds = df_train['ds'].reset_index(drop=True)
+    y = df_train['y'].to_numpy(dtype=float)
+    all_ds = future_dates(ds, periods)
+    n = len(y)
+
+    # 与 Prophet 一样先缩放: y / max|y|，t 归一化到 [0, 1]
+    y_scale = np.abs(y).max() or 1.0
+    days = all_ds.to_numpy('datetime64[ns]').astype(np.int64) / _DAY_NS
+    t = (days - days[0]) / max(days[n - 1] - days[0], 1.0)
+    cps = np.linspace(0, CHANGEPOINT_RANGE, N_CHANGEPOINTS + 1)[1:]
+
+    trend_X = np.column_stack([np.ones_like(t), t, np.maximum(t[:, None] - cps[None, :], 0)])
+    season_X = {name: _fourier(days, period, order) for name, (period, order) in _seasonalities(ds).items()}
+    X = np.hstack([trend_X] + list(season_X.values()))
+    penalty = np.concatenate([[0.0, 0.0], np.full(len(cps), 1 / CHANGEPOINT_PRIOR_SCALE ** 2)]
+                             + [np.full(m.shape[1], 1 / SEASONALITY_PRIOR_SCALE ** 2) for m in season_X.values()])
+
+    ys = y / y_scale
+    Xh = X[:n]
+    # 先用不带变点的最小二乘估计噪声水平，再按 MAP (高斯先验 = 岭回归) 解完整模型
+    base = np.ones(X.shape[1], dtype=bool)
+    base[2:2 + len(cps)] = False
+    coef0, *_ = np.linalg.lstsq(Xh[:, base], ys, rcond=None)
+    sigma0 = max(np.std(ys - Xh[:, base] @ coef0), 1e-6)
+    A = np.vstack([Xh / sigma0, np.diag(np.sqrt(penalty))])
+    b = np.concatenate([ys / sigma0, np.zeros(X.shape[1])])
+    coef, *_ = np.linalg.lstsq(A, b, rcond=None)
+
+    n_trend = trend_X.shape[1]
+    trend = trend_X @ coef[:n_trend] * y_scale
+    seasonal = {}
+    pos = n_trend
+    for name, m in season_X.items():
+        seasonal[name] = m @ coef[pos:pos + m.shape[1]] * y_scale
+        pos += m.shape[1]
+    yhat = X @ coef * y_scale
+
+    # 区间: 历史内 = 残差噪声；未来再叠加随预测步长 sqrt(h) 增长的趋势不确定性 (残差一阶差分的波动)
+    resid = y - yhat[:n]
+    sigma = resid.std()
+    sigma_step = np.diff(resid).std() if n > 2 else sigma
+    h = np.maximum(days - days[n - 1], 0)
+    trend_band = z * sigma_step * np.sqrt(h)
+    band = z * np.sqrt(sigma ** 2 + sigma_step ** 2 * h)
+    return _frame(all_ds, trend, trend_band, seasonal, yhat, band)
+
+
+# --- Holt-Winters (ETS(A,Ad,A)) ---
+def _hw_run(y, m, alpha, beta, gamma, phi, record=False):
+    """对所有参数组合同时跑一遍平滑递推；返回一步预测误差平方和 (以及 record=True 时的各分量)"""
+    k = len(alpha)
+    level = np.full(k, y[:m].mean())
+    trend = np.full(k, (y[m:2 * m].mean() - y[:m].mean()) / m if len(y) >= 2 * m else 0.0)
+    season = np.repeat((y[:m] - y[:m].mean())[:, None], k, axis=1)  # (m, k)，每行连续存放
+    sse = np.zeros(k)
+    if record:
+        hist = np.zeros((3, len(y)))  # 一步预测 / 水平+趋势 / 季节
+    b_gain = alpha * beta  # 误差修正形式: b_t = phi*b_{t-1} + alpha*beta*e_t
+    for i in range(len(y)):
+        s = season[i % m]
+        base = level + phi * trend
+        e = y[i] - base - s
+        if i >= m:
+            sse += e * e
+        if record:
+            hist[:, i] = base[0] + s[0], base[0], s[0]
+        level = base + alpha * e
+        trend = phi * trend + b_gain * e
+        s += gamma * e
+    if record:
+        return sse, level, trend, season, hist
+    return sse
+
+
+def _fit_holt_winters(df_train, periods, z):
+    ds = df_train['ds'].reset_index(drop=True)
+    # 周末 / 节假日没有交易的资产先补成连续日线 (沿用前一交易日价格)，这样周期 m=7 才对得上周几
+    daily = df_train.set_index('ds')['y'].astype(float)
+    daily = daily[~daily.index.duplicated(keep='last')]
+    daily = daily.reindex(pd.date_range(daily.index[0], daily.index[-1], freq='D')).ffill()
+    y = daily.to_numpy()
+    m = 7 if 'weekly' in _seasonalities(ds) and len(y) >= 14 else 1
+
+    gammas = HW_GAMMA if m > 1 else np.array([0.0])
+    grid = np.array(np.meshgrid(HW_ALPHA, HW_BETA, gammas, HW_PHI, indexing='ij')).reshape(4, -1)
+    sse = _hw_run(y, m, *grid)
+    best = grid[:, [int(np.argmin(sse))]]
+    sse, level, trend, season, hist = _hw_run(y, m, *best, record=True)
+    alpha, beta, gamma, phi = best[:, 0]
+    sigma = np.sqrt(sse[0] / max(len(y) - m, 1))
+
+    # 未来 h 步: 水平 + (phi + ... + phi^h) * 趋势 + 对应周几的季节项
+    h = np.arange(1, periods + 1)
+    phi_sum = np.cumsum(phi ** h)
+    f_trend = level[0] + phi_sum * trend[0]
+    f_season = season[(len(y) + h - 1) % m, 0]
+    # 解析方差: Var_h = sigma^2 * (1 + sum_{j<h} c_j^2)，c_j = alpha + alpha*beta*phi_j + gamma*[j % m == 0]
+    c = alpha + alpha * beta * phi_sum + gamma * (h % m == 0)
+    var_h = sigma ** 2 * (1 + np.concatenate([[0.0], np.cumsum(c[:-1] ** 2)]))
+    # 趋势本身的不确定性: 只包含水平 / 趋势平滑带来的部分
+    c_trend = alpha + alpha * beta * phi_sum
+    var_trend = sigma ** 2 * np.concatenate([[0.0], np.cumsum(c_trend[:-1] ** 2)])
+
+    in_sample = daily.index.get_indexer(ds)
+    all_ds = future_dates(ds, periods)
+    trend_all = np.concatenate([hist[1, in_sample], f_trend])
+    seasonal = {'weekly': np.concatenate([hist[2, in_sample], f_season])} if m > 1 else {}
+    yhat = np.concatenate([hist[0, in_sample], f_trend + f_season])
+    band = z * np.concatenate([np.full(len(ds), sigma), np.sqrt(var_h)])
+    trend_band = z * np.concatenate([np.zeros(len(ds)), np.sqrt(var_trend)])
+    return _frame(all_ds, trend_all, trend_band, seasonal, yhat, band)
+
+
+def forecast(df_train, periods, method='fourier', interval_width=INTERVAL_WIDTH):
+    """df_train: Prophet 格式 (ds / y)；返回与 Prophet forecast 同结构的 DataFrame"""
+    if method not in METHODS:
+        raise ValueError(f"未知的预测方法: {method} (可选 {', '.join(METHODS)})")
+    df_train = df_train.dropna(subset=['y']).sort_values('ds')
+    if len(df_train) < 14:
+        raise ValueError("训练数据太少 (至少需要 14 个点)")
+    z = NormalDist().inv_cdf(0.5 + interval_width / 2)
+    if method == 'holt_winters':
+        return _fit_holt_winters(df_train, periods, z)
+    return _fit_fourier(df_train, periods, z)
@@ -0,0 +1,105 @@
+"""图表渲染缓存 (进程级)
+
+以 "数据指纹 + 图表选项" 为 key 缓存三类结果:
+- 分析图的单个图层 (trace 对象)：切换 MA200 / 布林带 / RSI / MACD 时只生成新增的图层
+- 组装好的完整 Plotly 图：同样的选项 rerun 时直接复用
+- 相关性热力图的 PNG：rerun 时不再经过 matplotlib / seaborn
+"""
+import io
+import threading
+from collections import OrderedDict
+
+import matplotlib
+
+matplotlib.use("Agg")  # 服务端渲染，不需要 GUI 后端
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+
+import perf_monitor
+from charts import analysis_layers, analysis_layer_traces, compose_analysis_figure
+from shared_cache import fingerprint
+
+
+class LRUCache:
+    """线程安全的简单 LRU (Streamlit 每个会话跑在自己的线程里)"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_layers = LRUCache(256)
+_figures = LRUCache(64)
+_images = LRUCache(32)
+
+
+def _get_or_build(cache, key, builder, stage_name):
+    with perf_monitor.stage(stage_name) as s:
+        value = cache.get(key)
+        s.cache(value is not None)
+        if value is None:
+            value = builder()
+            cache.put(key, value)
+    return value
+
+
+def analysis_figure(df, show_ma200=True, show_boll=False, sub_chart="无", fp=None):
+    """带缓存的 build_analysis_figure；返回的 Figure 是共享对象，调用方不要修改它"""
+    fp = fp or fingerprint(df)
+
+    def compose():
+        layers = {
+            layer: _get_or_build(_layers, (fp, layer), lambda: analysis_layer_traces(df, layer),
+                                 "figure_cache.layer")
+            for layer in analysis_layers(show_ma200, show_boll, sub_chart)
+        }
+        return compose_analysis_figure(layers, sub_chart)
+
+    return _get_or_build(_figures, (fp, show_ma200, show_boll, sub_chart), compose, "figure_cache.figure")
+
+
+def heatmap_png(corr_matrix, figsize=(5, 4), dpi=100, fontsize=8):
+    """带缓存的相关性热力图 (PNG 字节)"""
+    key = (fingerprint(corr_matrix), figsize, dpi, fontsize)
+
+    def render():
+        fig, ax = plt.subplots(figsize=figsize, dpi=dpi)  # 尺寸控制
+        sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', vmin=-1, vmax=1,
+                    square=True, linewidths=.5, fmt=".2f", ax=ax, cbar_kws={"shrink": 0.7})
+        ax.tick_params(labelsize=fontsize)
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", bbox_inches="tight")
+        plt.close(fig)  # 释放 matplotlib 的全局 figure，避免长时间运行后内存上涨
+        return buf.getvalue()
+
+    return _get_or_build(_images, key, render, "figure_cache.heatmap")
+
+
+def clear():
+    """清空所有图表缓存"""
+    _layers.clear()
+    _figures.clear()
+    _images.clear()
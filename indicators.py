@@ -0,0 +1,82 @@
+import pandas as pd
+
+
+# --- 技术指标 (Dashboard 个股分析页) ---
+def add_technical_indicators(df):
+    # RSI
+    delta = df['Close'].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    rs = gain / loss
+    df['RSI'] = 100 - (100 / (1 + rs))
+
+    # MACD
+    exp1 = df['Close'].ewm(span=12, adjust=False).mean()
+    exp2 = df['Close'].ewm(span=26, adjust=False).mean()
+    df['MACD'] = exp1 - exp2
+    df['Signal_Line'] = df['MACD'].ewm(span=9, adjust=False).mean()
+
+    # Bollinger Bands
+    df['MA20'] = df['Close'].rolling(window=20).mean()
+    df['STD20'] = df['Close'].rolling(window=20).std()
+    df['Upper_Band'] = df['MA20'] + (df['STD20'] * 2)
+    df['Lower_Band'] = df['MA20'] - (df['STD20'] * 2)
+
+    # MA200
+    df['MA200'] = df['Close'].rolling(window=200).mean()
+    return df
+
+
+# --- 牛熊线指标 (bp / nasdaq / crypto 脚本共用) ---
+def add_trend_indicators(data):
+    """MA200 牛熊线、历史最高点、回撤幅度、乖离率"""
+    # 注意：如果选择的时间太短（如1mo），MA200 将无法计算（显示为NaN），这是正常的数学逻辑
+    data['MA200'] = data['Close'].rolling(window=200).mean()
+    data['Peak'] = data['Close'].cummax()
+    data['Drawdown'] = (data['Close'] - data['Peak']) / data['Peak']
+    data['Bias'] = (data['Close'] - data['MA200']) / data['MA200']  # 乖离率
+    return data
+
+
+# --- 多资产收盘价面板 (PK 模式 / 相关性) ---
+def extract_close_panel(data, tickers, field='Close'):
+    """从 yf.download 的结果中提取收盘价面板 (列 = Ticker)
+
+    兼容两种 MultiIndex 布局: 默认的 (字段, Ticker) 和 group_by='ticker' 的 (Ticker, 字段)；
+    单个 Ticker 下载时的普通列也能处理。找不到某个 Ticker 时抛出 KeyError。
+    """
+    if not isinstance(data.columns, pd.MultiIndex):
+        if len(tickers) == 1 and field in data.columns:
+            return data[[field]].rename(columns={field: tickers[0]})
+        raise KeyError(field)
+
+    if field in data.columns.get_level_values(0):
+        panel = data[field]
+    else:
+        panel = data.xs(field, axis=1, level=1)
+
+    missing = [t for t in tickers if t not in panel.columns]
+    if missing:
+        raise KeyError(", ".join(missing))
+    return panel[tickers]
+
+
+def align_panel(df_close):
+    """对齐不同交易日历 (美股周末休市，BTC 不休市)：先向前填充，再用第一个有效值回填开头"""
+    return df_close.ffill().bfill()
+
+
+def normalize_returns(df_close):
+    """归一化为累计收益率: 0.10 代表涨了 10%"""
+    return (df_close / df_close.iloc[0]) - 1
+
+
+# --- Prophet 数据预处理 ---
+def prepare_prophet_frame(data):
+    """Prophet 的格式要求极其严格：必须只有两列 'ds' (时间) 和 'y' (数值)"""
+    df_train = data.reset_index()[['Date', 'Close']]
+    df_train.columns = ['ds', 'y']
+
+    # ⚠️ 关键修复：去除时区信息 (tz-naive)，否则 Prophet 会报错
+    df_train['ds'] = df_train['ds'].dt.tz_localize(None)
+    return df_train
@@ -0,0 +1,217 @@
+"""后台任务: 把耗时的计算 (Prophet 训练、walk-forward 回测) 放到页面脚本之外的线程池里跑
+
+Streamlit 的脚本每次 rerun 都从头执行，在脚本里同步训练模型时页面卡在 spinner 上，动一下任何控件还会打断重来。
+这里的任务在进程级线程池里运行，与会话 / rerun 无关:
+- submit 返回 Job (带 id)，页面只需把 id 放进 session_state，rerun 之后用 get(id) 取回同一个任务
+- 任务函数的第一个参数是 job 本身，用 job.report(进度, 说明) 汇报进度；report 同时是取消检查点，
+  任务被取消后下一次 report 会抛出 Cancelled (Prophet 单次 fit 无法中途打断，取消在它返回后生效)
+- 同一个 key 的任务同时只跑一份: 多个会话 / 连点两次拿到的是同一个 Job，全部取消后才真正停止
+- 结果留在进程里 RESULT_TTL 秒，过期的已结束任务在下次 submit 时清理
+- 每个任务单独记一条 perf_monitor 请求记录 ("job:名称")，不会混进提交它的那次 rerun
+
+Prophet 的采样在 cmdstan 子进程里、numpy / pandas 的大块运算也会释放 GIL，所以用线程池即可；
+需要多进程的部分 (walk_forward 的各折) 由任务函数自己开进程池。
+"""
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import perf_monitor
+
+# --- 配置区域 ---
+MAX_WORKERS = int(os.environ.get("JOB_WORKERS", 2))  # 同时运行的任务数，其余排队
+RESULT_TTL = 30 * 60  # 已结束的任务保留多久 (秒)
+POLL_SECONDS = 0.5  # 页面刷新进度的间隔 (dashboard 用)
+
+STATUS_NAMES = {'queued': "排队中", 'running': "运行中", 'done': "已完成", 'failed': "失败",
+                'cancelled': "已取消"}
+FINISHED = ('done', 'failed', 'cancelled')
+
+_jobs = {}  # id -> Job
+_active = {}  # key -> 尚未结束的 Job
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_executor = None
+
+
+class Cancelled(Exception):
+    """任务被取消 (由 Job.report / Job.check 抛出)"""
+
+
+class Job:
+    """一个后台任务的状态、进度和结果；属性都只由工作线程写入，页面直接读取即可"""
+
+    def __init__(self, name, key=None):
+        self.id = f"{name}-{next(_ids)}"
+        self.name = name
+        self.key = key
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = STATUS_NAMES['queued']
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.subscribers = 1  # 等待这个任务的提交方个数 (同 key 重复提交时加一)
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._future = None
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    @property
+    def cancelled(self):
+        """是否已请求取消 (任务函数里可以据此提前收尾)"""
+        return self._cancel.is_set()
+
+    @property
+    def seconds(self):
+        """已运行 / 总共运行的秒数 (排队时间不算)"""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def check(self):
+        """取消检查点: 已请求取消时抛出 Cancelled"""
+        if self._cancel.is_set():
+            raise Cancelled(self.id)
+
+    def report(self, progress=None, message=None):
+        """汇报进度 (0~1) 和当前步骤说明，同时检查是否已被取消"""
+        if progress is not None:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+        self.check()
+
+    def cancel(self):
+        """取消一个提交方的等待；所有提交方都取消后才真正停止 (排队中的直接移出队列)"""
+        with _lock:
+            if self.done:
+                return False
+            self.subscribers -= 1
+            if self.subscribers > 0:
+                return False
+            self._cancel.set()
+            if _active.get(self.key) is self:
+                del _active[self.key]
+        if self._future is not None and self._future.cancel():
+            self._finish('cancelled', message=STATUS_NAMES['cancelled'])
+        return True
+
+    def wait(self, timeout=None):
+        """阻塞到任务结束，返回是否已结束"""
+        return self._done.wait(timeout)
+
+    def _finish(self, status, result=None, error=None, message=None):
+        self.status = status
+        self.result = result
+        self.error = error
+        if message is not None:
+            self.message = message
+        if status == 'done':
+            self.progress = 1.0
+        self.finished_at = time.time()
+        with _lock:
+            if _active.get(self.key) is self:
+                del _active[self.key]
+        self._done.set()
+
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="job")
+        return _executor
+
+
+def _run(job, fn, args, kwargs):
+    if job.cancelled:
+        job._finish('cancelled', message=STATUS_NAMES['cancelled'])
+        return
+    job.started_at = time.time()
+    job.status, job.message = 'running', STATUS_NAMES['running']
+    try:
+        with perf_monitor.request(f"job:{job.name}"), perf_monitor.stage(f"job.{job.name}"):
+            result = fn(job, *args, **kwargs)
+        job.check()  # 最后一步之后才取消的，结果也不再交付
+    except Cancelled:
+        job._finish('cancelled', message=STATUS_NAMES['cancelled'])
+    except Exception as e:
+        job._finish('failed', error=e, message=f"{STATUS_NAMES['failed']}: {e}")
+    else:
+        job._finish('done', result=result, message=STATUS_NAMES['done'])
+
+
+def _prune():
+    cutoff = time.time() - RESULT_TTL
+    with _lock:
+        for job_id in [i for i, j in _jobs.items() if j.done and j.finished_at < cutoff]:
+            del _jobs[job_id]
+
+
+def submit(name, fn, *args, key=None, **kwargs):
+    """提交任务 fn(job, *args, **kwargs)，返回 Job；key 相同且还没结束的任务直接复用"""
+    _prune()
+    with _lock:
+        if key is not None and key in _active:
+            job = _active[key]
+            job.subscribers += 1
+            return job
+        job = Job(name, key)
+        _jobs[job.id] = job
+        if key is not None:
+            _active[key] = job
+    job._future = _pool().submit(_run, job, fn, args, kwargs)
+    return job
+
+
+def get(job_id):
+    """按 id 取回任务 (不存在或已过期返回 None)"""
+    if job_id is None:
+        return None
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def cancel(job_id):
+    job = get(job_id)
+    return job.cancel() if job is not None else False
+
+
+def jobs(active_only=False):
+    """全部任务 (按提交顺序)，active_only=True 时只要还没结束的"""
+    with _lock:
+        found = list(_jobs.values())
+    return [j for j in found if not (active_only and j.done)]
+
+
+def wait_all(timeout=None):
+    """等待当前所有未结束的任务 (压测 / 命令行用)，返回是否全部结束"""
+    deadline = None if timeout is None else time.time() + timeout
+    for job in jobs(active_only=True):
+        left = None if deadline is None else max(deadline - time.time(), 0.0)
+        if not job.wait(left):
+            return False
+    return True
+
+
+def shutdown(wait=True):
+    """取消排队中的任务并关闭线程池 (之后再 submit 会新建线程池)"""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+        pending = [j for j in _jobs.values() if not j.done]
+    for job in pending:
+        job._cancel.set()
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
+    for job in pending:
+        if job.status == 'queued':
+            job._finish('cancelled', message=STATUS_NAMES['cancelled'])
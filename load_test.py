@@ -0,0 +1,256 @@
+"""dashboard 压测: N 个模拟会话同时操作各个页面，行情来自本地假数据或录好的归档 (延迟可调)
+
+- 每个会话是一个 Streamlit AppTest (与真实部署一样在同一个进程里，共享 shared_cache / price_store / figure_cache)
+- 行情走 market_data 的假数据源 (或 --archive 回放录好的归档)，外面包一层 LatencyProvider 模拟网络延迟
+- 本地仓库和账本放在临时目录，不会动到 data_store / portfolio.db；账本从 trade_log.xlsx 导入
+- 报告: 每个页面 / 每个操作的 p50 / p95 耗时 (会话看到的墙钟时间)，以及 perf_monitor 记录的各阶段 p50 / p95
+- 提交后台任务的操作 (AI 预测) 会等任务结束再 rerun 一次，耗时 = 提交 + 后台计算 + 画结果
+
+命令行: python load_test.py --sessions 8 --rounds 2 --latency 0.3
+        python load_test.py --pages 个股/加密货币分析 周期收益表 --warm --json load_test.json
+"""
+import argparse
+import contextlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+import corporate_actions
+import job_runner
+import market_data
+import perf_monitor
+import portfolio_store
+import price_store
+import shared_cache
+
+# --- 配置区域 ---
+DASHBOARD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard.py")
+EXCEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), portfolio_store.EXCEL_PATH)
+SESSIONS = 4
+ROUNDS = 2  # 每个会话把所有页面走几遍 (第二遍起主要测缓存命中后的耗时)
+LATENCY = 0.2  # 模拟的每次下载延迟 (秒)
+JITTER = 0.5  # 延迟的随机浮动 (±比例)
+TIMEOUT = 300  # 单次 rerun 的超时 (秒)
+MENU_LABEL = "功能导航"
+# 每个页面切换过去之后依次点击的按钮
+SCENARIOS = {
+    "个股/加密货币分析": ["开始分析"],
+    "资产对比 (PK模式)": ["开始PK"],
+    "我的实盘账户(汇率版)": ["🔄 刷新最新市值", "📐 开始对比"],
+    "资产相关性热力图": ["🔍 计算矩阵"],
+    "周期收益表": ["📅 计算收益表"],
+    "AI 趋势预测 (Prophet)": ["启动 AI 预测"],
+}
+
+
+@contextlib.contextmanager
+def simulated(provider, root):
+    """期间行情走 provider，行情仓库 / 账本放在 root 下，进程级缓存清空"""
+    saved = price_store.STORE_DIR, corporate_actions.STORE_DIR, portfolio_store.DB_PATH
+    price_store.STORE_DIR = corporate_actions.STORE_DIR = os.path.join(root, "data_store")
+    portfolio_store.DB_PATH = os.path.join(root, "portfolio.db")
+    shared_cache.clear()
+    try:
+        with market_data.use(provider):
+            portfolio_store.import_excel(EXCEL_PATH)
+            yield provider
+    finally:
+        price_store.STORE_DIR, corporate_actions.STORE_DIR, portfolio_store.DB_PATH = saved
+        shared_cache.clear()
+
+
+@contextlib.contextmanager
+def _threaded_apptest():
+    """让多个 AppTest 能在不同线程里同时运行 (AppTest 本身是为单线程测试写的，每次 run 都会改全局状态)
+
+    - 每次 run 都新建 ScriptCache 重新编译脚本，而 Python 3.11 的 ast.parse 多线程同时调用会报
+      "AST constructor recursion depth mismatch" -> 所有会话共用一份编译结果 (与 streamlit 服务端一样)
+    - 每次 run 结束会把 Runtime 单例置空，其他线程正在跑的脚本随即报 "Runtime hasn't been created"
+      -> Runtime.instance() 固定返回第一个会话创建的 Runtime
+    - global.appTest 配置项每次 run 临时打开、结束时恢复，并发时会被别的线程提前恢复 -> 整个压测期间保持打开
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1.util import patch_config_options
+
+    original_bytecode, original_instance, original_exists = ScriptCache.get_bytecode, Runtime.instance, Runtime.exists
+    compiled, pinned = {}, []
+    lock = threading.Lock()
+
+    def get_bytecode(self, script_path):
+        with lock:
+            if script_path not in compiled:
+                compiled[script_path] = original_bytecode(self, script_path)
+            return compiled[script_path]
+
+    def instance(cls):
+        with lock:
+            if not pinned and cls._instance is not None:
+                pinned.append(cls._instance)
+        return pinned[0] if pinned else original_instance()
+
+    ScriptCache.get_bytecode = get_bytecode
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: bool(pinned) or original_exists())
+    try:
+        with patch_config_options({"global.appTest": True}):
+            yield
+    finally:
+        ScriptCache.get_bytecode, Runtime.instance, Runtime.exists = original_bytecode, original_instance, original_exists
+
+
+def _widget(widgets, label):
+    found = [w for w in widgets if w.label == label]
+    if not found:
+        raise LookupError(f"页面上找不到: {label}")
+    return found[0]
+
+
+def _settle(at, timeout):
+    """页面提交了后台任务 (session_state 里以 _job 结尾的 id) 时，等任务结束后再 rerun 一次把结果画出来"""
+    pending = [job for job in (job_runner.get(at.session_state[k]) for k in at.session_state.keys()
+                               if str(k).endswith('_job')) if job is not None and not job.done]
+    if not pending:
+        return at
+    for job in pending:
+        if not job.wait(timeout):
+            raise TimeoutError(f"后台任务 {job.id} 超时 ({timeout}s)")
+    return at.run()
+
+
+def _step(at, steps, session, round_, page, action, fn):
+    """执行一次交互并记录耗时；页面报错 (异常 / st.error) 记为失败，会话继续往下走"""
+    t0 = time.perf_counter()
+    error = None
+    try:
+        fn()
+        shown = [e.value for e in at.exception] + [e.value for e in at.error]
+        error = str(shown[0]) if shown else None
+    except Exception as e:
+        error = repr(e)
+    steps.append({'session': session, 'round': round_, 'page': page, 'action': action,
+                  'seconds': time.perf_counter() - t0, 'error': error})
+
+
+def _session(session, pages, rounds, timeout, ramp, steps):
+    """一个模拟用户: 打开首页，然后每一轮按自己的顺序走一遍页面 (不同会话错开起点，同一时刻分散在各页面)"""
+    from streamlit.testing.v1 import AppTest
+
+    time.sleep(ramp)
+    at = AppTest.from_file(DASHBOARD, default_timeout=timeout)
+    _step(at, steps, session, 0, "首页", "打开", at.run)
+    k = session % len(pages)
+    order = pages[k:] + pages[:k]
+    for round_ in range(rounds):
+        for page in order:
+            _step(at, steps, session, round_, page, "切换",
+                  lambda: _widget(at.sidebar.radio, MENU_LABEL).set_value(page).run())
+            for label in SCENARIOS[page]:
+                _step(at, steps, session, round_, page, label,
+                      lambda: _settle(_widget(at.button, label).click().run(), timeout))
+
+
+def _latency_table(frame, by):
+    """按 by 分组的 次数 / p50 / p95 / 最大耗时 (秒) / 失败次数"""
+    if frame.empty:
+        return pd.DataFrame(columns=['count', 'p50', 'p95', 'max', 'errors'])
+    g = frame.groupby(by, sort=False)
+    return pd.DataFrame({
+        'count': g.size(),
+        'p50': g['seconds'].quantile(0.5),
+        'p95': g['seconds'].quantile(0.95),
+        'max': g['seconds'].max(),
+        'errors': g['error'].count(),
+    })
+
+
+def run(sessions=SESSIONS, rounds=ROUNDS, pages=None, latency=LATENCY, jitter=JITTER, ramp=0.0, warm=False,
+        timeout=TIMEOUT, seed=0, archive=None):
+    """跑一次压测，返回 dict:
+    steps (每次交互一行)、pages (每个页面一次访问的总耗时)、actions (每个页面每个操作)、
+    stages (perf_monitor 各阶段)、market (数据源的调用次数 / 模拟等待)、wall_seconds、traces (原始请求记录)
+    """
+    pages = list(pages or SCENARIOS)
+    unknown = [p for p in pages if p not in SCENARIOS]
+    if unknown:
+        raise ValueError(f"未知页面: {', '.join(unknown)} (可选 {', '.join(SCENARIOS)})")
+    if sessions < 1 or rounds < 1:
+        raise ValueError("会话数和轮数至少为 1")
+
+    # 默认用假数据；给了 archive 则回放录好的真实行情 (market_data 的 record 模式录制)
+    source = market_data.ReplayProvider(archive) if archive else market_data.FakeProvider(seed=seed)
+    market = market_data.LatencyProvider(source, latency, jitter, seed=seed)
+    with tempfile.TemporaryDirectory() as root, simulated(market, root), _threaded_apptest():
+        if warm:
+            # 预热: 单个会话先走一遍，下面测的是缓存 / 本地仓库都已就绪之后的耗时
+            _session(0, pages, 1, timeout, 0.0, [])
+        steps = []
+        with perf_monitor.collect() as traces:
+            t0 = time.perf_counter()
+            threads = [threading.Thread(target=_session, name=f"session-{i}",
+                                        args=(i, pages, rounds, timeout, ramp * i / sessions, steps))
+                       for i in range(sessions)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            wall = time.perf_counter() - t0
+
+    steps = pd.DataFrame(steps, columns=['session', 'round', 'page', 'action', 'seconds', 'error'])
+    visits = steps[steps['page'] != "首页"].groupby(['session', 'round', 'page'], sort=False).agg(
+        seconds=('seconds', 'sum'), error=('error', 'first')).reset_index()
+    stages = pd.DataFrame([{'page': t.name, 'stage': s.name, 'seconds': s.seconds, 'error': s.error}
+                           for t in traces for s in t.stages], columns=['page', 'stage', 'seconds', 'error'])
+    return {
+        'steps': steps,
+        'pages': _latency_table(visits, 'page'),
+        'actions': _latency_table(steps, ['page', 'action']),
+        'stages': _latency_table(stages, ['page', 'stage']).sort_values('p95', ascending=False),
+        'market': market.stats(),
+        'wall_seconds': wall,
+        'traces': traces,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="dashboard 压测 (模拟会话 + 假行情源)")
+    parser.add_argument("--sessions", type=int, default=SESSIONS)
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    parser.add_argument("--pages", nargs="+", default=None, choices=list(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=LATENCY, help="每次下载的延迟 (秒)")
+    parser.add_argument("--jitter", type=float, default=JITTER)
+    parser.add_argument("--archive", default=None, help="回放这个归档里录好的行情 (默认用假数据)")
+    parser.add_argument("--ramp", type=float, default=0.0, help="在这么多秒内陆续启动各会话")
+    parser.add_argument("--warm", action="store_true", help="先用一个会话预热缓存再开始计时")
+    parser.add_argument("--top", type=int, default=20, help="阶段表显示最慢的前几行")
+    parser.add_argument("--json", default=None, help="把全部请求记录导出为 JSON")
+    a = parser.parse_args()
+
+    # 不刷屏: 每次 rerun 都会打印的参数弃用 / 缺少 ScriptRunContext 提示 (streamlit 每次运行会重设日志级别，所以直接禁用)
+    for name in ("streamlit.deprecation_util", "streamlit.runtime.scriptrunner_utils.script_run_context"):
+        logging.getLogger(name).disabled = True
+    result = run(a.sessions, a.rounds, a.pages, a.latency, a.jitter, a.ramp, a.warm, archive=a.archive)
+    m = result['market']
+    print("-" * 60)
+    print(f"{a.sessions} 个会话 × {a.rounds} 轮，总耗时 {result['wall_seconds']:.1f}s | 数据源: {m['calls']} 次下载 / "
+          f"{m['tickers']} 个 Ticker / 模拟等待 {m['wait_seconds']:.1f}s")
+    with pd.option_context('display.float_format', '{:.3f}'.format, 'display.width', 160,
+                           'display.max_colwidth', 40):
+        print("\n[页面] 一次访问 (切换 + 全部操作) 的耗时 (秒)")
+        print(result['pages'].to_string())
+        print("\n[操作]")
+        print(result['actions'].to_string())
+        print(f"\n[阶段] p95 最慢的 {a.top} 个")
+        print(result['stages'].head(a.top).to_string())
+    errors = result['steps'].dropna(subset=['error'])
+    if not errors.empty:
+        print(f"\n⚠️ {len(errors)} 次交互失败:")
+        for r in errors.drop_duplicates(['page', 'action', 'error']).itertuples():
+            print(f"  [{r.page}] {r.action}: {r.error[:200]}")
+    if a.json:
+        perf_monitor.export_json(a.json, result['traces'])
+        print(f"\n已导出请求记录: {a.json}")
@@ -0,0 +1,330 @@
+"""行情数据源: 所有 yf.download / yf.Ticker(...).history 调用都经过这里，可以整体换成录制 / 回放 / 假数据
+
+环境变量 MARKET_DATA 选择模式:
+- live (默认): 直连雅虎财经 (需要网络，本机需要代理)
+- record: 直连，同时把每次返回的数据写进本地归档 MARKET_ARCHIVE (默认 market_archive/)
+- replay: 只读归档，不联网；同样的请求总是得到同样的数据 (离线开发 / CI)
+- fake: 不联网，按 Ticker 生成固定随机种子的假日线 (load_test 用的就是它)
+
+归档按 Ticker 拆开保存: market_archive/<kind>/<Ticker>/<区间>_<参数>.parquet (zstd 压缩)，
+多 Ticker 的一次下载回放时再拼回 yf.download 的 MultiIndex 结构。区间为 period ('1y' / 'max') 或 start~end。
+回放时没有完全相同的记录，会退回到同一 Ticker 的 'max' 记录按区间切片 (period 相对最后一根 K 线计算)，
+所以录一次 period='max' 的完整历史，之后任意周期 / 增量更新都能离线跑。
+
+    MARKET_DATA=record streamlit run dashboard.py      # 联网点一遍要用的页面
+    MARKET_DATA=replay streamlit run dashboard.py      # 之后离线、磁盘速度
+"""
+import contextlib
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+# --- 配置区域 ---
+MODE = os.environ.get("MARKET_DATA", "live")
+ARCHIVE_DIR = os.environ.get("MARKET_ARCHIVE", "market_archive")
+PROXY = os.environ.get("MARKET_PROXY", "http://127.0.0.1:7890")  # 设为空字符串则不走代理
+MODES = ('live', 'record', 'replay', 'fake')
+OFFLINE_MODES = ('replay', 'fake')
+# 影响返回数据的 yf.download 参数及其默认值 (yfinance 1.x)；其余参数 (progress / threads / group_by ...) 不进 key
+DATA_KWARGS = {'interval': '1d', 'auto_adjust': True, 'actions': False, 'back_adjust': False,
+               'repair': False, 'keepna': False, 'prepost': False, 'rounding': False}
+DEFAULT_PERIOD = '1mo'  # yf.download 不给 start / end / period 时的默认周期
+FAKE_YEARS = 10  # 假数据源每个 Ticker 的历史长度
+
+
+class NotRecorded(LookupError):
+    """回放模式下归档里没有这个请求 (也没有可切片的 'max' 记录)"""
+
+
+# --- 请求 key 与归档路径 ---
+def _names(tickers):
+    return tickers.replace(',', ' ').split() if isinstance(tickers, str) else list(tickers)
+
+
+def _window(kwargs):
+    """请求的区间: start~end (日期) 或 period"""
+    start, end = kwargs.get('start'), kwargs.get('end')
+    if start is None and end is None:
+        return kwargs.get('period') or DEFAULT_PERIOD
+    day = lambda d: pd.Timestamp(d).strftime('%Y-%m-%d') if d is not None else ''
+    return f"{day(start)}~{day(end)}"
+
+
+def _flags(kwargs):
+    """参数里与默认值不同的部分，拼成文件名 (全部默认为 'default')"""
+    parts = [f"{k}={kwargs[k]}" for k in DATA_KWARGS if k in kwargs and kwargs[k] != DATA_KWARGS[k]]
+    return '_'.join(parts) or 'default'
+
+
+def _archive_path(root, kind, ticker, window, flags):
+    safe = lambda s: str(s).replace('^', '_').replace('=', '_').replace('/', '_').replace(':', '-')
+    return os.path.join(root, kind, safe(ticker), f"{safe(window)}__{safe(flags)}.parquet")
+
+
+# --- yf.download 结果的拆分 / 拼装 ---
+def _split(data, names, group_by='column'):
+    """yf.download 的结果 -> {Ticker: 单层列的 DataFrame}；多 Ticker 对齐日历产生的全空行去掉"""
+    if data is None or data.empty:
+        return {t: pd.DataFrame() for t in names}
+    if not isinstance(data.columns, pd.MultiIndex):
+        return {names[0]: data}
+    level = 'Ticker' if 'Ticker' in data.columns.names else (0 if group_by == 'ticker' else 1)
+    out = {}
+    for t in names:
+        if t in data.columns.get_level_values(level):
+            out[t] = data.xs(t, axis=1, level=level).dropna(how='all')
+        else:
+            out[t] = pd.DataFrame()
+    return out
+
+
+def _assemble(frames, group_by='column', multi_level_index=True):
+    """{Ticker: DataFrame} -> 与 yf.download 相同结构的结果 (默认 (Price, Ticker) 两层列)"""
+    frames = {t: f for t, f in frames.items() if f is not None and not f.empty}
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1 and not multi_level_index:
+        return next(iter(frames.values()))
+    data = pd.concat(frames, axis=1, sort=True, names=['Ticker', 'Price'])
+    if group_by != 'ticker':
+        data = data.swaplevel(0, 1, axis=1).sort_index(axis=1, level=0, sort_remaining=False)
+    return data
+
+
+def _slice(frame, kwargs):
+    """把完整历史切成请求的区间: start (含) ~ end (不含)，或相对最后一根 K 线的 period"""
+    if frame.empty:
+        return frame
+    start, end = kwargs.get('start'), kwargs.get('end')
+    index = frame.index.tz_localize(None) if frame.index.tz is not None else frame.index
+    keep = np.ones(len(frame), dtype=bool)
+    if start is None and end is None:
+        from price_store import period_start  # price_store 依赖本模块，延迟导入
+        keep &= index >= period_start(kwargs.get('period') or DEFAULT_PERIOD, index[-1])
+    if start is not None:
+        keep &= index >= pd.Timestamp(start)
+    if end is not None:
+        keep &= index < pd.Timestamp(end)
+    return frame[keep]
+
+
+# --- 数据源 ---
+class LiveProvider:
+    """直连雅虎财经"""
+
+    def download(self, tickers, **kwargs):
+        return yf.download(tickers, **kwargs)
+
+    def history(self, ticker, **kwargs):
+        return yf.Ticker(ticker).history(**kwargs)
+
+
+class ReplayProvider:
+    """从归档回放，不联网；按 Ticker 读出后拼回请求的结构"""
+
+    def __init__(self, root=None):
+        self.root = root or ARCHIVE_DIR
+        self.hits = 0
+        self.sliced = 0
+
+    def _read(self, kind, ticker, kwargs):
+        flags = _flags(kwargs)
+        path = _archive_path(self.root, kind, ticker, _window(kwargs), flags)
+        if os.path.exists(path):
+            self.hits += 1
+            return pd.read_parquet(path)
+        full = _archive_path(self.root, kind, ticker, 'max', flags)
+        if os.path.exists(full):
+            self.sliced += 1
+            return _slice(pd.read_parquet(full), kwargs)
+        raise NotRecorded(f"归档里没有 {ticker} ({kind} {_window(kwargs)} {flags})，"
+                          f"请先用 MARKET_DATA=record 联网运行一次")
+
+    def download(self, tickers, group_by='column', multi_level_index=True, **kwargs):
+        frames = {t: self._read('download', t, kwargs) for t in _names(tickers)}
+        return _assemble(frames, group_by, multi_level_index)
+
+    def history(self, ticker, **kwargs):
+        return self._read('history', ticker, kwargs)
+
+
+class RecordingProvider(LiveProvider):
+    """直连，同时把返回的数据按 Ticker 写进归档 (同一个请求再录一次会覆盖)"""
+
+    def __init__(self, root=None):
+        self.root = root or ARCHIVE_DIR
+        self._lock = threading.Lock()
+
+    def _write(self, kind, ticker, kwargs, frame):
+        path = _archive_path(self.root, kind, ticker, _window(kwargs), _flags(kwargs))
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            frame.to_parquet(tmp, compression='zstd')
+            os.replace(tmp, path)
+
+    def download(self, tickers, **kwargs):
+        data = super().download(tickers, **kwargs)
+        for t, frame in _split(data, _names(tickers), kwargs.get('group_by', 'column')).items():
+            self._write('download', t, kwargs, frame)
+        return data
+
+    def history(self, ticker, **kwargs):
+        frame = super().history(ticker, **kwargs)
+        self._write('history', ticker, kwargs, frame)
+        return frame
+
+
+class FakeProvider:
+    """假数据源: 每个 Ticker 一段固定随机种子的日线 (几何布朗运动)；只支持日线
+
+    -USD 按自然日 (加密货币)，=X 为汇率量级，其余按工作日。结束日默认为今天，所以本地仓库的增量更新也能走通。
+    """
+
+    def __init__(self, years=FAKE_YEARS, seed=0, end=None):
+        self.years = years
+        self.seed = seed
+        self.end = pd.Timestamp(end).normalize() if end else pd.Timestamp.today().normalize()
+        self._bars = {}
+        self._lock = threading.Lock()
+
+    def bars(self, ticker):
+        """一个 Ticker 的完整日线 (含 Adj Close / Dividends / Stock Splits)"""
+        with self._lock:
+            if ticker in self._bars:
+                return self._bars[ticker]
+        rng = np.random.default_rng([self.seed, zlib.crc32(ticker.encode())])
+        freq = 'D' if ticker.endswith('-USD') else 'B'
+        index = pd.date_range(self.end - pd.DateOffset(years=self.years), self.end, freq=freq, name='Date')
+        n = len(index)
+        if ticker.endswith('=X'):
+            start, vol = 7.0, 0.003
+        else:
+            start, vol = rng.uniform(20, 500), 0.035 if ticker.endswith('-USD') else 0.015
+        close = start * np.exp(np.cumsum(rng.normal(0.0003, vol, n)))
+        open_ = close * (1 + rng.normal(0, vol / 5, n))
+        spread = np.abs(rng.normal(0, vol / 2, n))
+        df = pd.DataFrame({
+            'Open': open_, 'High': np.maximum(open_, close) * (1 + spread),
+            'Low': np.minimum(open_, close) * (1 - spread), 'Close': close, 'Adj Close': close,
+            'Volume': rng.integers(1_000_000, 50_000_000, n), 'Dividends': 0.0, 'Stock Splits': 0.0,
+        }, index=index)
+        with self._lock:
+            return self._bars.setdefault(ticker, df)
+
+    def _frame(self, ticker, kwargs, actions):
+        if kwargs.get('interval', '1d') != '1d':
+            raise ValueError(f"假数据源只支持日线: interval={kwargs['interval']}")
+        df = _slice(self.bars(ticker), kwargs)
+        drop = ['Adj Close'] if kwargs.get('auto_adjust', True) else []
+        return df.drop(columns=drop + ([] if actions else ['Dividends', 'Stock Splits']))
+
+    def download(self, tickers, group_by='column', multi_level_index=True, **kwargs):
+        frames = {t: self._frame(t, kwargs, kwargs.get('actions', False)) for t in _names(tickers)}
+        return _assemble(frames, group_by, multi_level_index)
+
+    def history(self, ticker, **kwargs):
+        return self._frame(ticker, kwargs, kwargs.get('actions', True))
+
+
+class LatencyProvider:
+    """给任意数据源加上每次调用的固定延迟 (±jitter 随机浮动)，并统计调用次数，压测时模拟网络"""
+
+    def __init__(self, inner, latency=0.2, jitter=0.5, seed=0):
+        self.inner = inner
+        self.latency = latency
+        self.jitter = jitter
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.tickers = 0
+        self.wait_seconds = 0.0
+
+    def _wait(self, n_tickers):
+        with self._lock:
+            wait = self.latency * self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+            self.calls += 1
+            self.tickers += n_tickers
+            self.wait_seconds += wait
+        time.sleep(wait)
+
+    def download(self, tickers, **kwargs):
+        self._wait(len(_names(tickers)))
+        return self.inner.download(tickers, **kwargs)
+
+    def history(self, ticker, **kwargs):
+        self._wait(1)
+        return self.inner.history(ticker, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'tickers': self.tickers, 'wait_seconds': self.wait_seconds}
+
+
+# --- 当前数据源 ---
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def from_env(mode=None, archive=None):
+    """按 MARKET_DATA / MARKET_ARCHIVE 创建数据源"""
+    mode = mode or MODE
+    if mode == 'live':
+        return LiveProvider()
+    if mode == 'record':
+        return RecordingProvider(archive)
+    if mode == 'replay':
+        return ReplayProvider(archive)
+    if mode == 'fake':
+        return FakeProvider()
+    raise ValueError(f"未知的行情模式: {mode} (可选 {', '.join(MODES)})")
+
+
+def get_provider():
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = from_env()
+        return _provider
+
+
+def set_provider(provider):
+    """替换当前数据源，返回原来的数据源"""
+    global _provider
+    with _provider_lock:
+        previous, _provider = _provider, provider
+    return previous
+
+
+@contextlib.contextmanager
+def use(provider):
+    """期间所有下载都走 provider：with market_data.use(FakeProvider()): ..."""
+    previous = set_provider(provider)
+    try:
+        yield provider
+    finally:
+        set_provider(previous)
+
+
+def download(tickers, **kwargs):
+    """代替 yf.download，参数和返回结构相同"""
+    return get_provider().download(tickers, **kwargs)
+
+
+def history(ticker, **kwargs):
+    """代替 yf.Ticker(ticker).history，参数和返回结构相同"""
+    return get_provider().history(ticker, **kwargs)
+
+
+def configure_proxy():
+    """设置本机代理 (原来各脚本写死的 127.0.0.1:7890)；离线模式不联网、MARKET_PROXY 为空时不设，返回是否设置"""
+    if MODE in OFFLINE_MODES or not PROXY:
+        return False
+    os.environ["http_proxy"] = PROXY
+    os.environ["https_proxy"] = PROXY
+    return True
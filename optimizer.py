@@ -0,0 +1,215 @@
+"""组合配置优化: 最小方差 / 风险平价 / 最大分散化 + 定投资金分配建议
+
+只依赖 numpy:
+- 协方差: 样本协方差 + Ledoit-Wolf 收缩 (资产多、历史短时样本协方差不可逆 / 噪声大)
+- 约束: 权重和为 1、每个资产 min_weight <= w <= max_weight (long-only)
+- 求解: 在 "带上下限的单纯形" 上做投影梯度 (FISTA)，投影用二分法，全部向量化；500 个资产 < 1 秒
+
+所有函数的输入都是以日期为索引、Ticker 为列的价格面板 (或其收益率)，输出为以 Ticker 为索引的权重 Series。
+"""
+import numpy as np
+import pandas as pd
+
+# --- 配置区域 ---
+TRADING_DAYS = 252
+METHODS = ('min_variance', 'risk_parity', 'max_diversification')
+METHOD_NAMES = {'min_variance': '最小方差', 'risk_parity': '风险平价', 'max_diversification': '最大分散化'}
+MAX_ITER = 2000
+TOL = 1e-10
+
+
+# --- 协方差估计 ---
+def returns_from_prices(prices):
+    """日收益率 (只保留所有资产都有数据的日期)"""
+    return prices.sort_index().pct_change().dropna(how='any')
+
+
+def ledoit_wolf(returns):
+    """Ledoit-Wolf 收缩协方差 (目标为等方差对角阵)，返回 (年化协方差 DataFrame, 收缩强度)"""
+    X = returns.to_numpy(dtype=float)
+    n, p = X.shape
+    X = X - X.mean(axis=0)
+    S = X.T @ X / n
+    mu = np.trace(S) / p
+    target = mu * np.eye(p)
+    d2 = ((S - target) ** 2).sum()
+    # b2: 样本协方差的估计误差 (逐样本外积与 S 的距离的平均)，向量化为 Σ_k ||x_k x_k'||² 的形式
+    row_sq = (X ** 2).sum(axis=1)
+    b2 = ((row_sq ** 2).sum() / n - (S ** 2).sum()) / n
+    shrink = 0.0 if d2 == 0 else float(np.clip(b2 / d2, 0.0, 1.0))
+    cov = (shrink * target + (1 - shrink) * S) * TRADING_DAYS
+    return pd.DataFrame(cov, index=returns.columns, columns=returns.columns), shrink
+
+
+# --- 约束集合上的投影 ---
+def project_capped_simplex(v, lo, hi, total=1.0):
+    """把 v 投影到 {lo <= w <= hi, sum(w) = total} (欧氏距离最近)；v 可以是二维 (每行一个向量)"""
+    v = np.atleast_2d(np.asarray(v, float))
+    lo = np.broadcast_to(lo, v.shape[-1:]).astype(float)
+    hi = np.broadcast_to(hi, v.shape[-1:]).astype(float)
+    a = (v - hi).min(axis=1) - 1.0
+    b = (v - lo).max(axis=1) + 1.0
+    for _ in range(100):  # 二分法找平移量 tau，使 sum(clip(v - tau)) = total
+        tau = (a + b) / 2
+        s = np.clip(v - tau[:, None], lo, hi).sum(axis=1)
+        a = np.where(s > total, tau, a)
+        b = np.where(s > total, b, tau)
+        if np.max(b - a) < 1e-13:
+            break
+    w = np.clip(v - ((a + b) / 2)[:, None], lo, hi)
+    return w[0] if w.shape[0] == 1 else w
+
+
+def _check_bounds(p, min_weight, max_weight):
+    if min_weight * p > 1 + 1e-12 or max_weight * p < 1 - 1e-12:
+        raise ValueError(f"约束不可行: {p} 个资产无法满足 {min_weight:.1%} <= 权重 <= {max_weight:.1%}")
+
+
+def _power_iteration(A, iters=50):
+    """最大特征值 (对称正定矩阵)，用作梯度步长的 Lipschitz 常数"""
+    x = np.ones(A.shape[0]) / np.sqrt(A.shape[0])
+    lam = 0.0
+    for _ in range(iters):
+        y = A @ x
+        lam = np.linalg.norm(y)
+        if lam == 0:
+            return 1.0
+        x = y / lam
+    return lam
+
+
+# --- 三种目标 ---
+def _min_variance(S, lo, hi):
+    """min w'Sw，FISTA 加速投影梯度"""
+    p = S.shape[0]
+    step = 1.0 / (2 * _power_iteration(S))
+    w = project_capped_simplex(np.full(p, 1.0 / p), lo, hi)
+    z, t = w.copy(), 1.0
+    for _ in range(MAX_ITER):
+        w_new = project_capped_simplex(z - step * 2 * (S @ z), lo, hi)
+        t_new = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        z = w_new + (t - 1) / t_new * (w_new - w)
+        if np.abs(w_new - w).max() < TOL:
+            return w_new
+        w, t = w_new, t_new
+    return w
+
+
+def _risk_parity(S, lo, hi, budget=None):
+    """等风险贡献: 求解凸问题 min 0.5 x'Sx - Σ b_i ln x_i (Spinu)，Newton 法，再归一化"""
+    p = S.shape[0]
+    b = np.full(p, 1.0 / p) if budget is None else np.asarray(budget, float) / np.sum(budget)
+    x = b / np.sqrt(np.diag(S))  # 逆波动率作为初值
+    x = x / np.sqrt(x @ S @ x)
+    for _ in range(100):
+        grad = S @ x - b / x
+        H = S + np.diag(b / x ** 2)
+        dx = np.linalg.solve(H, grad)
+        # 保证 x 保持为正的步长
+        step = 1.0
+        while np.any(x - step * dx <= 0):
+            step /= 2
+        x = x - step * dx
+        if np.abs(step * dx).max() < 1e-12 * max(1.0, np.abs(x).max()):
+            break
+    w = x / x.sum()
+    # 上下限有约束时，等风险贡献不一定可行，退而求其次投影到可行域
+    if np.any(w < lo - 1e-12) or np.any(w > hi + 1e-12):
+        w = project_capped_simplex(w, lo, hi)
+    return w
+
+
+def _max_diversification(S, lo, hi):
+    """max (w'σ) / sqrt(w'Sw)
+
+    无上下限时等价于在相关系数矩阵上做最小方差 (y = w·σ 归一化)；这里先用它得到初值，
+    再在带上下限的单纯形上对 -ln(比率) 做带回溯的投影梯度，保证约束精确满足。
+    """
+    sigma = np.sqrt(np.diag(S))
+    corr = S / np.outer(sigma, sigma)
+    y = _min_variance(corr, 0.0, 1.0)
+    w = project_capped_simplex((y / sigma) / (y / sigma).sum(), lo, hi)
+
+    def f(w):
+        return 0.5 * np.log(w @ S @ w) - np.log(w @ sigma)
+
+    def grad(w):
+        return (S @ w) / (w @ S @ w) - sigma / (w @ sigma)
+
+    step = 1.0
+    fw = f(w)
+    for _ in range(MAX_ITER):
+        g = grad(w)
+        while True:
+            w_new = project_capped_simplex(w - step * g, lo, hi)
+            f_new = f(w_new)
+            if f_new <= fw - 1e-4 / step * ((w_new - w) ** 2).sum() or step < 1e-12:
+                break
+            step /= 2
+        if np.abs(w_new - w).max() < TOL:
+            return w_new
+        w, fw = w_new, f_new
+        step *= 2
+    return w
+
+
+def optimize(prices, method='min_variance', min_weight=0.0, max_weight=1.0, cov=None):
+    """计算目标权重；prices 为价格面板 (或直接传入年化协方差 cov)"""
+    if method not in METHODS:
+        raise ValueError(f"未知的优化方法: {method} (可选 {', '.join(METHODS)})")
+    if cov is None:
+        cov, _ = ledoit_wolf(returns_from_prices(prices))
+    S = cov.to_numpy(dtype=float)
+    p = S.shape[0]
+    _check_bounds(p, min_weight, max_weight)
+    if method == 'min_variance':
+        w = _min_variance(S, min_weight, max_weight)
+    elif method == 'risk_parity':
+        w = _risk_parity(S, min_weight, max_weight)
+    else:
+        w = _max_diversification(S, min_weight, max_weight)
+    w = np.where(np.abs(w) < 1e-10, 0.0, w)
+    return pd.Series(w / w.sum(), index=cov.index, name=method)
+
+
+def portfolio_stats(weights, cov):
+    """年化波动率、分散化比率、每个资产的风险贡献占比"""
+    w = weights.reindex(cov.index).fillna(0).to_numpy()
+    S = cov.to_numpy()
+    vol = np.sqrt(w @ S @ w)
+    contrib = w * (S @ w) / (vol ** 2) if vol > 0 else np.zeros_like(w)
+    div_ratio = (w @ np.sqrt(np.diag(S))) / vol if vol > 0 else np.nan
+    return {'volatility': vol, 'diversification_ratio': div_ratio,
+            'risk_contribution': pd.Series(contrib, index=cov.index)}
+
+
+def compare_methods(prices, min_weight=0.0, max_weight=1.0):
+    """三种方法的权重放在一张表里 (协方差只估计一次)，附带年化波动率 / 分散化比率"""
+    cov, shrink = ledoit_wolf(returns_from_prices(prices))
+    weights = pd.concat([optimize(None, m, min_weight, max_weight, cov=cov) for m in METHODS], axis=1)
+    stats = pd.DataFrame({m: portfolio_stats(weights[m], cov) for m in METHODS}).T
+    stats = stats[['volatility', 'diversification_ratio']].astype(float)
+    weights.attrs['shrinkage'] = shrink
+    return weights, stats
+
+
+# --- 定投资金分配 ---
+def dca_split(current_values, target_weights, contribution):
+    """下一笔定投怎么分: 只买不卖，使投入后的持仓尽量接近目标权重
+
+    解 min ||(current + a) - w·T||²  s.t. a >= 0, Σa = contribution (T = 投入后的总市值)，
+    即把 "目标金额 - 现有金额" 投影到单纯形上；最缺的资产先补。
+    """
+    target_weights = target_weights / target_weights.sum()
+    current = current_values.reindex(target_weights.index).fillna(0.0).astype(float)
+    total = current.sum() + contribution
+    gap = target_weights * total - current
+    alloc = project_capped_simplex(gap.to_numpy(), 0.0, contribution, total=contribution)
+    out = pd.DataFrame({
+        'current': current,
+        'target_weight': target_weights,
+        'buy': alloc,
+    })
+    out['after'] = out['current'] + out['buy']
+    out['after_weight'] = out['after'] / total
+    return out
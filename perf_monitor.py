@@ -0,0 +1,247 @@
+import cProfile
+import contextlib
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+# --- 配置区域 ---
+# 设置环境变量 PERF_LOG=1 后，每个阶段都会以一行 JSON 写入日志 (方便 grep / 导入分析)
+PERF_LOG_ENABLED = os.environ.get("PERF_LOG", "0") == "1"
+# 进程内保留最近多少次请求的记录 (Streamlit 每次 rerun 算一次请求)
+HISTORY_SIZE = 50
+
+logger = logging.getLogger("finance.perf")
+
+_local = threading.local()
+_history = deque(maxlen=HISTORY_SIZE)
+_history_lock = threading.Lock()
+_collectors = []  # collect() 期间额外保存全部请求记录的列表
+
+
+class StageRecord:
+    """单个阶段的计时记录 (耗时 / 字节数 / 行数 / 缓存命中)"""
+
+    def __init__(self, name, **tags):
+        self.name = name
+        self.tags = tags
+        self.started_at = None
+        self.depth = 0  # 嵌套层数: 0 为顶层阶段
+        self.parent = None  # 外层阶段的名称
+        self.seconds = 0.0
+        self.nbytes = 0
+        self.rows = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.error = None
+
+    def set_frame(self, df):
+        """根据 DataFrame 自动填写行数与内存字节数"""
+        if isinstance(df, (pd.DataFrame, pd.Series)) and not df.empty:
+            self.rows += len(df)
+            self.nbytes += int(df.memory_usage(deep=True).sum()) if isinstance(df, pd.DataFrame) \
+                else int(df.memory_usage(deep=True))
+        return df
+
+    def cache(self, hit):
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+
+    def to_dict(self):
+        return {
+            "stage": self.name,
+            "started_at": self.started_at,
+            "seconds": round(self.seconds, 6),
+            "bytes": self.nbytes,
+            "rows": self.rows,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "error": self.error,
+            "depth": self.depth,
+            "parent": self.parent,
+            **self.tags,
+        }
+
+
+class RequestTrace:
+    """一次请求 (一次脚本运行 / 一次页面 rerun) 内所有阶段的集合"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.stages = []
+        self.profile_text = None
+        self.wall_seconds = None  # end_request 时记下的墙钟总耗时
+        self._t0 = time.perf_counter()
+
+    @property
+    def total_seconds(self):
+        """顶层阶段的耗时之和 (嵌套阶段已包含在外层阶段里，不重复计算)"""
+        return sum(s.seconds for s in self.stages if s.depth == 0)
+
+    def to_frame(self):
+        if not self.stages:
+            return pd.DataFrame(columns=["stage", "seconds", "bytes", "rows", "cache_hits", "cache_misses"])
+        return pd.DataFrame([s.to_dict() for s in self.stages])
+
+    def to_dict(self):
+        return {
+            "request": self.name,
+            "started_at": self.started_at,
+            "total_seconds": round(self.total_seconds, 6),
+            "wall_seconds": None if self.wall_seconds is None else round(self.wall_seconds, 6),
+            "stages": [s.to_dict() for s in self.stages],
+        }
+
+
+def begin_request(name):
+    """开始一次新的请求记录，之后的 stage() 都会挂到这个请求上"""
+    trace = RequestTrace(name)
+    _local.trace = trace
+    with _history_lock:
+        _history.append(trace)
+        for traces in _collectors:
+            traces.append(trace)
+    return trace
+
+
+def current_request():
+    """返回当前线程的请求记录 (没有则自动创建一个)"""
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        trace = begin_request("default")
+    return trace
+
+
+def end_request(trace=None):
+    """结束一次请求: 记下从 begin_request 到现在的墙钟耗时"""
+    trace = trace or current_request()
+    trace.wall_seconds = time.perf_counter() - trace._t0
+    return trace
+
+
+@contextlib.contextmanager
+def request(name, profile=None, top=30):
+    """with request(名称, profile='cprofile') as trace: 一次完整的请求 (可选 Profile)
+
+    正常结束、抛出异常或被 Streamlit 的 rerun / stop 打断时，都会停止 Profile 并结束这次请求。
+    """
+    trace = begin_request(name)
+    try:
+        with profile_request(profile, top) if profile else contextlib.nullcontext(trace):
+            yield trace
+    finally:
+        end_request(trace)
+
+
+@contextlib.contextmanager
+def stage(name, **tags):
+    """计时上下文管理器：with stage('yf.download', ticker='BTC-USD') as s: ..."""
+    record = StageRecord(name, **tags)
+    record.started_at = datetime.now().isoformat(timespec="milliseconds")
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    if stack:
+        record.depth, record.parent = len(stack), stack[-1].name
+    stack.append(record)
+    t0 = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record.error = repr(e)
+        raise
+    finally:
+        record.seconds = time.perf_counter() - t0
+        stack.remove(record)
+        current_request().stages.append(record)
+        if PERF_LOG_ENABLED:
+            logger.info(json.dumps(record.to_dict(), ensure_ascii=False, default=str))
+
+
+def timed(name=None, **tags):
+    """计时装饰器：返回值是 DataFrame 时自动统计行数和字节数"""
+
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name, **tags) as record:
+                result = func(*args, **kwargs)
+                record.set_frame(result)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+@contextlib.contextmanager
+def profile_request(engine="cprofile", top=30):
+    """可选的完整 Profile：engine 为 'cprofile' 或 'pyinstrument' (需另行安装)"""
+    trace = current_request()
+    if engine == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("未安装 pyinstrument，自动退回 cProfile")
+            engine = "cprofile"
+
+    if engine == "pyinstrument":
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield trace
+        finally:
+            profiler.stop()
+            trace.profile_text = profiler.output_text(unicode=True, color=False)
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield trace
+        finally:
+            profiler.disable()
+            buf = io.StringIO()
+            pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(top)
+            trace.profile_text = buf.getvalue()
+
+
+def history():
+    """最近若干次请求的记录 (新的在后)"""
+    with _history_lock:
+        return list(_history)
+
+
+@contextlib.contextmanager
+def collect():
+    """收集期间开始的全部请求记录 (不受 HISTORY_SIZE 限制，压测时用)：with collect() as traces: ..."""
+    traces = []
+    with _history_lock:
+        _collectors.append(traces)
+    try:
+        yield traces
+    finally:
+        with _history_lock:
+            _collectors.remove(traces)
+
+
+def export_json(path=None, traces=None):
+    """把请求记录导出为 JSON；不给 path 时返回字符串"""
+    traces = history() if traces is None else traces
+    payload = json.dumps([t.to_dict() for t in traces], ensure_ascii=False, indent=2, default=str)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(payload)
+    return payload
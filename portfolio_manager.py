@@ -1,12 +1,17 @@
+import sys
+
 import pandas as pd
-import yfinance as yf
-from pyxirr import xirr
 from datetime import datetime
-import requests
+
+import market_data
+from data_client import fetch_bars, fetch_panel
+import portfolio_store
+import tax_lots
+from data_quality import validate_download, print_report
+from xirr_solver import xirr, holdings_value_curve, xirr_curve
 
 # --- 配置区域 ---
 EXCEL_PATH = 'trade_log.xlsx'
-BARK_KEY = "qCYBDbni3Wp4r3FjypKQEJ"  # 🔴 记得把这里换回你的 Key！
 
 
 def get_realtime_price(ticker_list):
@@ -14,11 +19,13 @@ def get_realtime_price(ticker_list):
     print("正在获取实时价格...")
     try:
         # 获取过去 5 天的数据，避免周一早上拿不到数据
-        data = yf.download(ticker_list, period="5d", progress=False)['Close']
+        data = market_data.download(ticker_list, period="5d", progress=False)
+        close, report = validate_download(data, ticker_list)
+        print_report(report)
         # 向前填充：如果今天没数据，就用昨天的
-        data = data.ffill()
-        # 返回最新的一行
-        return data.iloc[-1]
+        close = close.ffill()
+        # 返回最新的一行 (被隔离 / 取不到的 Ticker 不在结果里)
+        return close.iloc[-1] if not close.empty else None
     except Exception as e:
         print(f"获取价格失败: {e}")
         return None
@@ -27,119 +34,155 @@ def get_realtime_price(ticker_list):
 def get_usd_cny_rate():
     """获取美元兑人民币汇率"""
     try:
-        rate = yf.Ticker("CNY=X").history(period="1d")['Close'].iloc[-1]
+        rate = market_data.history("CNY=X", period="1d")['Close'].iloc[-1]
         print(f"当前汇率: 1 USD = {rate:.4f} CNY")
         return rate
     except:
         return 7.25
 
 
-def send_to_iphone(content, profit_money):
-    """发送高级美化版通知 (Bark)"""
-    url = "https://api.day.app/push"
-
-    today_str = datetime.now().strftime('%m-%d')
-    title = f"📅 投资日报 ({today_str})"
+def xirr_flows(df, total_value_cny, as_of=None):
+    """XIRR 现金流 (日期列表, 金额列表): 买入 (含手续费) 为负，卖出收回 (扣除手续费) 为正，最后一天加上当前市值"""
+    fee = df['Fee_CNY'].fillna(0.0) if 'Fee_CNY' in df.columns else 0.0
+    return list(df['Date']) + [as_of or datetime.now()], list(-(df['Cost_CNY'] + fee)) + [total_value_cny]
+
+
+def value_portfolio(df, current_prices, rate, as_of=None, method='fifo', solve_xirr=True):
+    """纯计算部分 (不联网): 交易记录 + 最新价格 + 汇率 -> 持仓明细与汇总
+
+    交易记录支持卖出 (负份额 / 负金额) 和手续费 (Fee_CNY)，按 method (fifo / lifo / average) 匹配持仓批次。
+    返回 (holdings, summary)。holdings 以 Ticker 为索引，包含 Shares / Invested_CNY (剩余持仓成本) / Value_CNY /
+    Profit_Rate (未实现) / Realized_CNY；summary 包含 total_invested (累计买入，含手续费) / total_value_cny /
+    total_profit_money (已实现 + 未实现) / total_profit_rate / realized_profit / unrealized_profit / xirr，
+    以及 xirr_status (求解诊断: ok / no_sign_change / no_bracket / max_iter)，不收敛时 xirr 为 NaN；
+    missing_prices 列出没有取到价格、按成本计值的 Ticker。
+    solve_xirr=False 时不求 XIRR (xirr 为 NaN、xirr_status 为 'skipped')，由调用方批量求解 (见 daily_report)。
+    """
+    if current_prices is None:
+        current_prices = pd.Series(dtype=float)
+
+    positions = tax_lots.summarize(df, method)
+    holdings = positions[['Shares']].assign(Invested_CNY=positions['Cost_Basis'])
+    holdings = holdings.reindex(df['Ticker'].unique())  # 保持账本里出现的顺序
+
+    # 容错处理：如果某个资产价格没取到，现值按投入成本计 (不再用 0 冒充，否则会显示 -100%)，并记录下来提示
+    prices = pd.Series(current_prices, dtype=float).reindex(holdings.index)
+    missing_prices = holdings.index[prices.isna() & (holdings['Shares'] > tax_lots.EPS)].tolist()
+    holdings['Value_CNY'] = (holdings['Shares'] * prices * rate).fillna(holdings['Invested_CNY'])
+
+    # 只有当投入大于0才计算收益率，避免除以0
+    invested = holdings['Invested_CNY']
+    holdings['Profit_Rate'] = ((holdings['Value_CNY'] - invested) / invested * 100).where(invested > 0, 0.0)
+    holdings['Realized_CNY'] = positions['Realized_PnL'].reindex(holdings.index)
+
+    total_invested = positions['Invested'].sum()
+    total_value_cny = holdings['Value_CNY'].sum()
+    realized_profit = holdings['Realized_CNY'].sum()
+    unrealized_profit = total_value_cny - holdings['Invested_CNY'].sum()
+    total_profit_money = realized_profit + unrealized_profit
+    if total_invested > 0:
+        total_profit_rate = total_profit_money / total_invested * 100
+    else:
+        total_profit_rate = 0
 
-    # 根据是否赚钱切换图标
-    if profit_money >= 0:
-        icon_url = "https://cdn-icons-png.flaticon.com/512/3177/3177440.png"  # 红色钱袋
-        group_name = "我的定投(赚钱中)"
+    if solve_xirr:
+        xirr_result = xirr(*xirr_flows(df, total_value_cny, as_of))
     else:
-        icon_url = "https://cdn-icons-png.flaticon.com/512/2567/2567520.png"  # 绿色折线
-        group_name = "我的定投(蓄力中)"
-
-    payload = {
-        "device_key": BARK_KEY,
-        "title": title,
-        "body": content,
-        "group": "长期定投监控",
-        "icon": icon_url,
-        "sound": "glass",
-        "level": "active",
-        "url": "https://finance.yahoo.com/quote/SPY",  # 点击跳转
-        "isArchive": 1,
-        "badge": 1
+        xirr_result = {'rate': float('nan'), 'status': 'skipped'}
+    portfolio_xirr = xirr_result['rate'] * 100
+
+    summary = {
+        "total_invested": total_invested,
+        "total_value_cny": total_value_cny,
+        "total_profit_money": total_profit_money,
+        "total_profit_rate": total_profit_rate,
+        "realized_profit": realized_profit,
+        "unrealized_profit": unrealized_profit,
+        "xirr": portfolio_xirr,
+        "xirr_status": xirr_result['status'],
+        "missing_prices": missing_prices,
     }
+    return holdings, summary
 
-    try:
-        headers = {'Content-Type': 'application/json; charset=utf-8'}
-        requests.post(url, json=payload, headers=headers)
-        print("✅ 推送已发送！")
-    except Exception as e:
-        print(f"❌ 推送失败: {e}")
+
+def load_ledger():
+    """读取交易账本: 先把 trade_log.xlsx 中新增的行同步进 portfolio_store，再读出全部记录 (含 Dashboard 录入的交易)"""
+    added = portfolio_store.import_excel(EXCEL_PATH)
+    if added:
+        print(f"📥 从 {EXCEL_PATH} 同步了 {added} 条新交易")
+    return portfolio_store.load_trades().dropna(subset=['Cost_CNY'])
 
 
 def calculate_portfolio():
     """核心计算逻辑"""
-    df = pd.read_excel(EXCEL_PATH)
+    df = load_ledger()
     rate = get_usd_cny_rate()
     tickers = df['Ticker'].unique().tolist()
 
     current_prices = get_realtime_price(tickers)
-
-    total_invested = 0
-    total_value_cny = 0
-
-    xirr_dates = []
-    xirr_amounts = []
+    holdings, summary = value_portfolio(df, current_prices, rate)
 
     print("\n--- 持仓详情 ---")
-    for ticker in tickers:
-        record = df[df['Ticker'] == ticker]
-        total_shares = record['Shares'].sum()
-        invested_cny = record['Cost_CNY'].sum()
-
-        # 容错处理：如果某个资产价格没取到，暂时用0代替，避免程序崩溃
-        if ticker in current_prices:
-            current_price = current_prices[ticker]
-        else:
-            current_price = 0
-
-        current_val = total_shares * current_price * rate
-
-        total_invested += invested_cny
-        total_value_cny += current_val
-
-        # 只有当投入大于0才计算收益率，避免除以0
-        if invested_cny > 0:
-            profit_rate = (current_val - invested_cny) / invested_cny * 100
-        else:
-            profit_rate = 0
-
-        print(f"[{ticker}] 持仓: {total_shares:.4f} | 现值: ¥{current_val:.2f} | 收益率: {profit_rate:.2f}%")
-
-        for _, row in record.iterrows():
-            xirr_dates.append(row['Date'])
-            xirr_amounts.append(-row['Cost_CNY'])
-
-    xirr_dates.append(datetime.now())
-    xirr_amounts.append(total_value_cny)
-
-    total_profit_money = total_value_cny - total_invested
-    if total_invested > 0:
-        total_profit_rate = total_profit_money / total_invested * 100
+    for ticker, row in holdings.iterrows():
+        line = f"[{ticker}] 持仓: {row['Shares']:.4f} | 现值: ¥{row['Value_CNY']:.2f} | 收益率: {row['Profit_Rate']:.2f}%"
+        if row['Realized_CNY']:
+            line += f" | 已实现: ¥{row['Realized_CNY']:+.2f}"
+        print(line)
+
+    if summary['xirr_status'] == 'ok':
+        xirr_text = f"{summary['xirr']:.2f}%"
     else:
-        total_profit_rate = 0
-
-    try:
-        portfolio_xirr = xirr(xirr_dates, xirr_amounts) * 100
-    except:
-        portfolio_xirr = 0.0
+        xirr_text = f"无法计算 ({summary['xirr_status']})"
 
     result_msg = (
-        f"总投入: ¥{total_invested:.0f}\n"
-        f"总市值: ¥{total_value_cny:.0f}\n"
-        f"总浮盈: ¥{total_profit_money:.0f} ({total_profit_rate:.2f}%)\n"
-        f"年化效率 (XIRR): {portfolio_xirr:.2f}%"
+        f"总投入: ¥{summary['total_invested']:.0f}\n"
+        f"总市值: ¥{summary['total_value_cny']:.0f}\n"
+        f"总浮盈: ¥{summary['total_profit_money']:.0f} ({summary['total_profit_rate']:.2f}%)\n"
     )
+    if summary['realized_profit']:
+        result_msg += f"其中已实现: ¥{summary['realized_profit']:.0f}\n"
+    result_msg += f"年化效率 (XIRR): {xirr_text}"
+    if summary['missing_prices']:
+        result_msg += f"\n⚠️ 缺少价格 (按成本计): {', '.join(summary['missing_prices'])}"
     print(result_msg)
 
     # 返回两个值：文本消息 和 浮盈金额
-    return result_msg, total_profit_money
+    return result_msg, summary['total_profit_money']
+
+
+def plot_xirr_history(freq='ME', show=True):
+    """画出整个交易记录的 XIRR 随时间演变 (每个月末一个点，一次批量求解)；返回 (曲线, 图表)"""
+    from charts import build_xirr_figure
+
+    df = load_ledger()
+    tickers = df['Ticker'].unique().tolist()
+    start = pd.to_datetime(df['Date']).min().strftime('%Y-%m-%d')
+
+    print("正在获取历史价格...")
+    # 持仓市值要用实际成交价口径 (不含分红调整)；经数据服务读取，与 dashboard / 其他脚本共用同一份缓存
+    prices = fetch_panel(tickers, 'max', basis='price', start=start)
+    fx = fetch_bars("CNY=X", 'max', resolution='1d', columns=['Close'], start=start)['Close']
+
+    # 手续费也是投入 (卖出时从收回金额里扣掉)，并进 Cost_CNY 一起作为现金流
+    if 'Fee_CNY' in df.columns:
+        df = df.assign(Cost_CNY=df['Cost_CNY'] + df['Fee_CNY'].fillna(0.0))
+    curve = xirr_curve(df, holdings_value_curve(df, prices, fx), freq=freq)
+    failed = curve[~curve['converged']]
+    if not failed.empty:
+        print(f"⚠️ {len(failed)} 个观察日 XIRR 无法计算: {failed['status'].value_counts().to_dict()}")
+    fig = build_xirr_figure(curve)
+    if show:
+        fig.show()
+    return curve, fig
 
 
 # --- 主程序入口 ---
 if __name__ == "__main__":
-    msg, profit = calculate_portfolio()
-    send_to_iphone(msg, profit)
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "curve":
+        # python portfolio_manager.py curve -> 画 XIRR 演变曲线
+        plot_xirr_history()
+    else:
+        # 日报: 所有订阅的组合 / 设备，带相对上一份快照的日变化 (见 daily_report)
+        import daily_report
+
+        daily_report.run()
\ No newline at end of file
@@ -0,0 +1,304 @@
+"""持久化交易账本 (SQLite, WAL 模式)
+
+Dashboard 与 portfolio_manager 共用同一张 trades 表:
+- trade_log.xlsx 的记录通过 import_excel() 导入 (可重复执行，不会重复插入)
+- Dashboard 录入的交易直接 add_trade() 追加，O(1)，不再对整个 DataFrame 做 pd.concat
+- 每个线程复用自己的连接 (Streamlit 每个会话一个线程)，WAL 模式下多个会话可以同时读写
+- 卖出记为负份额、负金额 (收回的人民币)，手续费单独一列 (见 tax_lots)
+- 日报快照 (snapshots / snapshot_holdings) 也存在这里，见 daily_report
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+# --- 配置区域 ---
+DB_PATH = os.environ.get("PORTFOLIO_DB", "portfolio.db")
+EXCEL_PATH = 'trade_log.xlsx'
+DEFAULT_PORTFOLIO = 'default'
+
+# 每个元素是一次 schema 升级，按顺序执行；PRAGMA user_version 记录已经执行到第几个
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS trades (
+        id            INTEGER PRIMARY KEY AUTOINCREMENT,
+        portfolio     TEXT NOT NULL DEFAULT 'default',
+        date          TEXT NOT NULL,              -- YYYY-MM-DD
+        ticker        TEXT NOT NULL,
+        shares        REAL NOT NULL,
+        unit_cost_usd REAL,                       -- 成交价 (USD)，Excel 导入的记录可能为空
+        cost_cny      REAL,                       -- 投入金额 (CNY)
+        currency      TEXT NOT NULL DEFAULT 'CNY',-- 录入时使用的币种
+        source        TEXT NOT NULL DEFAULT 'dashboard',
+        import_key    TEXT UNIQUE,                -- Excel 导入去重用
+        deleted       INTEGER NOT NULL DEFAULT 0, -- 软删除: 删掉的 Excel 记录再次导入时不会复活
+        created_at    TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_trades_ticker_date ON trades (portfolio, ticker, date);
+    CREATE INDEX IF NOT EXISTS idx_trades_date ON trades (portfolio, date);
+    """,
+    # 卖出 + 手续费: 卖出用负的 shares / cost_cny 表示，老记录全是买入，不需要迁移数据
+    """
+    ALTER TABLE trades ADD COLUMN fee_cny REAL NOT NULL DEFAULT 0;
+    """,
+    # 日报快照: 每个组合每天一行汇总 + 每个持仓一行，第二天的日报据此计算日变化
+    """
+    CREATE TABLE IF NOT EXISTS snapshots (
+        portfolio     TEXT NOT NULL,
+        date          TEXT NOT NULL,              -- YYYY-MM-DD
+        value_cny     REAL NOT NULL,
+        invested_cny  REAL NOT NULL,              -- 累计买入 (含手续费)
+        profit_cny    REAL NOT NULL,              -- 已实现 + 未实现
+        xirr          REAL,                       -- 百分数，无法求解时为空
+        usd_cny       REAL,
+        created_at    TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (portfolio, date)
+    );
+    CREATE TABLE IF NOT EXISTS snapshot_holdings (
+        portfolio     TEXT NOT NULL,
+        date          TEXT NOT NULL,
+        ticker        TEXT NOT NULL,
+        shares        REAL NOT NULL,
+        price         REAL,                       -- USD，没取到价格时为空
+        value_cny     REAL NOT NULL,
+        invested_cny  REAL NOT NULL,              -- 剩余持仓成本
+        PRIMARY KEY (portfolio, date, ticker)
+    );
+    """,
+]
+
+# 数据库列名 -> DataFrame 列名 (与 trade_log.xlsx 保持一致: Date / Ticker / Shares / Cost_CNY)
+COLUMNS = {
+    'id': 'id', 'date': 'Date', 'ticker': 'Ticker', 'shares': 'Shares', 'cost_cny': 'Cost_CNY',
+    'unit_cost_usd': 'Unit_Cost_USD', 'fee_cny': 'Fee_CNY', 'currency': 'Currency', 'source': 'Source',
+}
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+def connect(path=None):
+    """当前线程的连接 (连接池: 每个线程 / 每个数据库文件一个连接)"""
+    path = path or DB_PATH
+    pool = getattr(_local, 'pool', None)
+    if pool is None:
+        pool = _local.pool = {}
+    conn = pool.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None)  # 手动控制事务
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        pool[path] = conn
+        _migrate(conn, path)
+    return conn
+
+
+def _migrate(conn, path):
+    with _init_lock:
+        if path in _initialized:
+            return
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for i, script in enumerate(MIGRATIONS[version:], start=version + 1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 其他进程可能刚刚升级过，拿到写锁后再确认一次
+                if conn.execute("PRAGMA user_version").fetchone()[0] < i:
+                    for statement in script.split(';'):
+                        if statement.strip():
+                            conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version = {i}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        _initialized.add(path)
+
+
+def _normalize_date(value):
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+
+def _signed_cost(shares, cost_cny):
+    """金额的符号跟随份额: 卖出时填的正数收回金额也统一存成负数"""
+    if cost_cny is None or pd.isna(cost_cny):
+        return None
+    return -abs(float(cost_cny)) if float(shares) < 0 else abs(float(cost_cny))
+
+
+def add_trade(ticker, date, shares, unit_cost_usd=None, cost_cny=None, currency='USD',
+              source='dashboard', portfolio=DEFAULT_PORTFOLIO, path=None, fee_cny=0.0):
+    """追加一笔交易 (shares < 0 为卖出)，返回新记录的 id"""
+    conn = connect(path)
+    cur = conn.execute(
+        "INSERT INTO trades (portfolio, date, ticker, shares, unit_cost_usd, cost_cny, fee_cny, currency, source) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (portfolio, _normalize_date(date), ticker.upper(), float(shares),
+         None if unit_cost_usd is None else float(unit_cost_usd),
+         _signed_cost(shares, cost_cny), float(fee_cny or 0.0), currency, source),
+    )
+    return cur.lastrowid
+
+
+def update_trade(trade_id, path=None, **fields):
+    """修改一笔交易；fields 使用 DataFrame 列名 (Date / Ticker / Shares / ...)"""
+    reverse = {v: k for k, v in COLUMNS.items() if k != 'id'}
+    sets = {reverse[k]: v for k, v in fields.items() if k in reverse}
+    if not sets:
+        return
+    if 'date' in sets:
+        sets['date'] = _normalize_date(sets['date'])
+    if 'fee_cny' in sets:
+        sets['fee_cny'] = float(sets['fee_cny'] or 0.0)
+    conn = connect(path)
+    if 'shares' in sets or 'cost_cny' in sets:
+        # 改了份额或金额: 按修改后的买卖方向重新确定金额符号
+        shares, cost = conn.execute("SELECT shares, cost_cny FROM trades WHERE id = ?", (int(trade_id),)).fetchone()
+        sets['cost_cny'] = _signed_cost(sets.get('shares', shares), sets.get('cost_cny', cost))
+    assignments = ", ".join(f"{col} = ?" for col in sets)
+    conn.execute(f"UPDATE trades SET {assignments} WHERE id = ?", (*sets.values(), int(trade_id)))
+
+
+def delete_trades(trade_ids, path=None):
+    conn = connect(path)
+    conn.executemany("UPDATE trades SET deleted = 1 WHERE id = ?", [(int(i),) for i in trade_ids])
+
+
+def load_trades(portfolio=DEFAULT_PORTFOLIO, ticker=None, start=None, end=None, path=None):
+    """按组合读取交易 (可按 Ticker / 日期范围过滤，走索引)，按日期排序"""
+    sql = "SELECT " + ", ".join(COLUMNS) + " FROM trades WHERE portfolio = ? AND deleted = 0"
+    params = [portfolio]
+    if ticker:
+        sql += " AND ticker = ?"
+        params.append(ticker.upper())
+    if start:
+        sql += " AND date >= ?"
+        params.append(_normalize_date(start))
+    if end:
+        sql += " AND date <= ?"
+        params.append(_normalize_date(end))
+    sql += " ORDER BY date, id"
+
+    df = pd.read_sql_query(sql, connect(path), params=params).rename(columns=COLUMNS)
+    df['Date'] = pd.to_datetime(df['Date'])
+    for c in ['Shares', 'Cost_CNY', 'Unit_Cost_USD', 'Fee_CNY']:
+        df[c] = df[c].astype(float)  # 整列为 NULL 时 read_sql 会给 object 列
+    return df
+
+
+def list_portfolios(path=None):
+    """账本里出现过的组合名 (按名称排序)"""
+    rows = connect(path).execute("SELECT DISTINCT portfolio FROM trades WHERE deleted = 0 ORDER BY portfolio")
+    return [r[0] for r in rows]
+
+
+def import_excel(excel_path=EXCEL_PATH, portfolio=DEFAULT_PORTFOLIO, path=None):
+    """把 trade_log.xlsx (Date / Ticker / Shares / Cost_CNY [/ Fee_CNY]) 导入账本；已导入过的行会被跳过，返回新增行数
+
+    卖出: Shares 填负数，Cost_CNY 填收回金额 (正负都可以，统一存成负数)。
+    """
+    if not os.path.exists(excel_path):
+        return 0
+    df = pd.read_excel(excel_path)
+    if 'Fee_CNY' not in df.columns:
+        df['Fee_CNY'] = 0.0
+    rows = []
+    seen = {}
+    for r in df.itertuples(index=False):
+        cost = _signed_cost(r.Shares, r.Cost_CNY)
+        fee = 0.0 if pd.isna(r.Fee_CNY) else float(r.Fee_CNY)
+        base = (f"{portfolio}|{_normalize_date(r.Date)}|{r.Ticker}|{float(r.Shares):.10g}|"
+                f"{float('nan') if cost is None else cost:.10g}")
+        if fee:
+            base += f"|fee={fee:.10g}"  # 没有手续费的行保持旧的 key，已导入的记录不会重复
+        # 同一天同一金额重复定投是合法的，用出现次序区分
+        seen[base] = seen.get(base, 0) + 1
+        key = hashlib.sha1(f"{base}|{seen[base]}".encode()).hexdigest()
+        rows.append((portfolio, _normalize_date(r.Date), str(r.Ticker).upper(), float(r.Shares),
+                     cost, fee, 'CNY', 'excel', key))
+
+    conn = connect(path)
+    before = conn.total_changes
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT OR IGNORE INTO trades "
+            "(portfolio, date, ticker, shares, cost_cny, fee_cny, currency, source, import_key) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return conn.total_changes - before
+
+
+def apply_editor_changes(view, changes, path=None):
+    """把 st.data_editor 的改动 (edited_rows / added_rows / deleted_rows) 写回数据库
+
+    view 是传给 data_editor 的 DataFrame (必须包含 id 列)，changes 是 st.session_state[editor_key]。
+    """
+    if not changes:
+        return
+    for pos, fields in changes.get('edited_rows', {}).items():
+        update_trade(view.iloc[int(pos)]['id'], path=path, **fields)
+    for row in changes.get('added_rows', []):
+        if row.get('Ticker') and row.get('Shares') is not None and row.get('Date'):
+            add_trade(row['Ticker'], row['Date'], row['Shares'], unit_cost_usd=row.get('Unit_Cost_USD'),
+                      cost_cny=row.get('Cost_CNY'), currency=row.get('Currency') or 'USD', path=path,
+                      fee_cny=row.get('Fee_CNY') or 0.0)
+    deleted = changes.get('deleted_rows', [])
+    if deleted:
+        delete_trades([view.iloc[int(pos)]['id'] for pos in deleted], path=path)
+
+
+# 快照表列名 -> 汇总 dict 的 key / 持仓 DataFrame 列名
+SNAPSHOT_FIELDS = {'value_cny': 'value', 'invested_cny': 'invested', 'profit_cny': 'profit', 'xirr': 'xirr',
+                   'usd_cny': 'rate'}
+HOLDING_COLUMNS = {'ticker': 'Ticker', 'shares': 'Shares', 'price': 'Price', 'value_cny': 'Value_CNY',
+                   'invested_cny': 'Invested_CNY'}
+
+
+def save_snapshot(portfolio, date, summary, holdings, path=None):
+    """保存 (覆盖) 某个组合某一天的快照；summary 使用 SNAPSHOT_FIELDS 的 key，holdings 以 Ticker 为索引"""
+    date = _normalize_date(date)
+    conn = connect(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO snapshots (portfolio, date, " + ", ".join(SNAPSHOT_FIELDS) + ") "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (portfolio, date, *[None if pd.isna(summary.get(k)) else float(summary[k])
+                                for k in SNAPSHOT_FIELDS.values()]))
+        conn.execute("DELETE FROM snapshot_holdings WHERE portfolio = ? AND date = ?", (portfolio, date))
+        conn.executemany(
+            "INSERT INTO snapshot_holdings (portfolio, date, " + ", ".join(HOLDING_COLUMNS) + ") "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(portfolio, date, str(t), float(r.Shares), None if pd.isna(r.Price) else float(r.Price),
+              float(r.Value_CNY), float(r.Invested_CNY)) for t, r in holdings.iterrows()])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def load_snapshot(portfolio, before=None, path=None):
+    """最近一次快照 (before 给定时只找这一天之前的)，返回 (日期, 汇总 dict, 持仓 DataFrame)；没有则返回 None"""
+    sql = "SELECT date, " + ", ".join(SNAPSHOT_FIELDS) + " FROM snapshots WHERE portfolio = ?"
+    params = [portfolio]
+    if before is not None:
+        sql += " AND date < ?"
+        params.append(_normalize_date(before))
+    conn = connect(path)
+    row = conn.execute(sql + " ORDER BY date DESC LIMIT 1", params).fetchone()
+    if row is None:
+        return None
+    summary = dict(zip(SNAPSHOT_FIELDS.values(), row[1:]))
+    holdings = pd.read_sql_query(
+        "SELECT " + ", ".join(HOLDING_COLUMNS) + " FROM snapshot_holdings WHERE portfolio = ? AND date = ?",
+        conn, params=[portfolio, row[0]]).rename(columns=HOLDING_COLUMNS).set_index('Ticker')
+    for c in holdings.columns:
+        holdings[c] = holdings[c].astype(float)
+    return pd.Timestamp(row[0]), summary, holdings
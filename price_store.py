@@ -0,0 +1,348 @@
+"""本地行情仓库 + 多分辨率 (日 / 周 / 月) 预聚合
+
+每个 Ticker 在 STORE_DIR 下保存三个 parquet 文件:
+    <ticker>_1d.parquet   日线 OHLCV + 牛熊线指标 (MA200 / Peak / Drawdown / Bias，全部在日线上计算)
+    <ticker>_1wk.parquet  周线 (由日线聚合，指标取周内最后一个值)
+    <ticker>_1mo.parquet  月线
+拆股 / 分红记录由 corporate_actions 缓存；Adj Close (全收益) 不落盘，读取时按本地分红记录现算。
+
+更新是增量的: 只下载最后一根日线之后的数据，指标只重算尾部，周线 / 月线只重算受影响的最后几个周期。
+读取时按请求的周期自动选择分辨率，保证图上的点数不超过 MAX_POINTS (例如 ^GSPC max 约 25k 根日线 -> 月线)。
+"""
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+import corporate_actions
+import market_data
+import perf_monitor
+from data_quality import validate_ohlcv
+
+# --- 配置区域 ---
+STORE_DIR = os.environ.get("PRICE_STORE_DIR", "data_store")
+REFRESH_SECONDS = 15 * 60  # 距上次更新不足 15 分钟时不再联网
+MAX_POINTS = 1500  # 单条曲线最多画多少个点
+OVERLAP_DAYS = 7  # 增量下载时与已有数据重叠的天数 (覆盖最近几天的修正)
+RESTATE_TOLERANCE = 0.02  # 重叠区间收盘价与本地相差超过 2% (中位数) 视为历史被改写
+MA_WINDOW = 200
+ROW_GROUP_ROWS = 512  # parquet 每个 row group 的行数 (约 2 年日线)；按窗口读取时只读与窗口重叠的 row group
+
+RESOLUTIONS = {'1d': None, '1wk': 'W-SUN', '1mo': 'ME'}
+_PERIOD_ALIAS = {'W-SUN': 'W-SUN', 'ME': 'M'}  # resample 规则 -> Period 频率
+RESOLUTION_NAMES = {'1d': '日线', '1wk': '周线', '1mo': '月线'}
+PRICE_COLS = ['Open', 'High', 'Low', 'Close', 'Volume']  # Close 为拆股调整后、未按分红调整的价格
+INDICATOR_COLS = ['MA200', 'Peak', 'Drawdown', 'Bias']
+
+_locks = {}
+_locks_guard = threading.Lock()
+_meta_lock = threading.Lock()
+
+
+def _lock_for(ticker):
+    with _locks_guard:
+        return _locks.setdefault(ticker, threading.Lock())
+
+
+def _path(ticker, resolution):
+    safe = ticker.replace('^', '_').replace('=', '_').replace('/', '_')
+    return os.path.join(STORE_DIR, f"{safe}_{resolution}.parquet")
+
+
+def _meta_path():
+    return os.path.join(STORE_DIR, "_meta.json")
+
+
+def _read_meta():
+    try:
+        with open(_meta_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(ticker, **fields):
+    with _meta_lock:
+        meta = _read_meta()
+        meta.setdefault(ticker, {}).update(fields)
+        tmp = _meta_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, _meta_path())
+
+
+def _read(ticker, resolution):
+    path = _path(ticker, resolution)
+    if not os.path.exists(path):
+        return None
+    # 旧版本落盘过雅虎的 Adj Close；现在改为按分红记录现算，读到时丢掉
+    return pd.read_parquet(path).drop(columns=['Adj Close'], errors='ignore')
+
+
+def _write(ticker, resolution, df):
+    # 先写临时文件再替换，避免其他会话读到写了一半的文件
+    path = _path(ticker, resolution)
+    df.to_parquet(path + ".tmp", row_group_size=ROW_GROUP_ROWS)
+    os.replace(path + ".tmp", path)
+
+
+def _date_stats(parquet_file):
+    """每个 row group 的 (最早日期, 最晚日期)，只读文件尾部的统计信息"""
+    md = parquet_file.metadata
+    col = parquet_file.schema_arrow.names.index('Date')
+    stats = [md.row_group(g).column(col).statistics for g in range(md.num_row_groups)]
+    return [(pd.Timestamp(st.min), pd.Timestamp(st.max)) if st is not None and st.has_min_max else (None, None)
+            for st in stats]
+
+
+def history_range(ticker, resolution='1d'):
+    """本地仓库里这个 Ticker 的 (第一根, 最后一根) 日期，不读数据本身；没有数据返回 None"""
+    path = _path(ticker, resolution)
+    if not os.path.exists(path):
+        return None
+    stats = _date_stats(pq.ParquetFile(path))
+    if not stats or stats[0][0] is None:
+        df = _read(ticker, resolution)
+        return (df.index[0], df.index[-1]) if not df.empty else None
+    return stats[0][0], stats[-1][1]
+
+
+def read_window(ticker, start=None, end=None, resolution='1d'):
+    """读取 [start, end) 区间的 K 线: 按 row group 的日期统计跳过不重叠的部分，不读整段历史
+
+    不含 Adj Close (全收益复权要用到窗口之后的分红，见 load_bars)；没有数据返回 None。
+    """
+    path = _path(ticker, resolution)
+    if not os.path.exists(path):
+        return None
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    with perf_monitor.stage("price_store.read_window", ticker=ticker, resolution=resolution) as s:
+        f = pq.ParquetFile(path)
+        groups = [g for g, (lo, hi) in enumerate(_date_stats(f))
+                  if lo is None or ((start is None or hi >= start) and (end is None or lo < end))]
+        df = f.read_row_groups(groups).to_pandas() if groups else _read(ticker, resolution).iloc[:0]
+        df = df.drop(columns=['Adj Close'], errors='ignore')
+        if start is not None:
+            df = df[df.index >= start]
+        if end is not None:
+            df = df[df.index < end]
+        s.set_frame(df)
+    return df
+
+
+def _download(ticker, **kwargs):
+    """下载行情并顺带取回这段时间的拆股 / 分红，返回 (行情, 公司行为)"""
+    with perf_monitor.stage("yf.download", ticker=ticker, **{k: str(v) for k, v in kwargs.items()}) as s:
+        df = market_data.download(ticker, auto_adjust=False, actions=True, progress=False, **kwargs)
+        s.set_frame(df)
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    if df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    df.index.name = 'Date'
+    return df[[c for c in PRICE_COLS if c in df.columns]], corporate_actions.extract_actions(df)
+
+
+# --- 指标 (只重算尾部) ---
+def _trend_indicators(daily, start_pos=0):
+    """在日线上计算牛熊线指标；start_pos 之前的行保持不变 (MA200 需要往前多取 199 行做种子)"""
+    if start_pos <= 0 or not set(INDICATOR_COLS).issubset(daily.columns):
+        start_pos = 0
+    seed = max(start_pos - (MA_WINDOW - 1), 0)
+    close = daily['Close'].iloc[seed:]
+    ma = close.rolling(window=MA_WINDOW).mean()
+    prev_peak = daily['Peak'].iloc[start_pos - 1] if start_pos > 0 else float('-inf')
+    peak = close.iloc[start_pos - seed:].cummax().clip(lower=prev_peak)
+
+    tail = pd.DataFrame(index=daily.index[start_pos:])
+    tail['MA200'] = ma.iloc[start_pos - seed:]
+    tail['Peak'] = peak
+    tail['Drawdown'] = (close.iloc[start_pos - seed:] - peak) / peak
+    tail['Bias'] = (close.iloc[start_pos - seed:] - tail['MA200']) / tail['MA200']
+
+    out = daily.copy()
+    for c in INDICATOR_COLS:
+        if c not in out.columns:
+            out[c] = float('nan')
+        out.loc[tail.index, c] = tail[c]
+    return out
+
+
+# --- 重采样 ---
+def resample_bars(daily, rule):
+    """日线 -> 周线 / 月线；索引使用每个周期内最后一个真实交易日"""
+    agg = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Adj Close': 'last', 'Volume': 'sum'}
+    agg.update({c: 'last' for c in INDICATOR_COLS})
+    agg = {c: f for c, f in agg.items() if c in daily.columns}
+    frame = daily.assign(_last_date=daily.index)
+    out = frame.resample(rule).agg({**agg, '_last_date': 'last'}).dropna(subset=['Close'])
+    out = out.set_index('_last_date')
+    out.index.name = 'Date'
+    return out
+
+
+def _update_tiers(ticker, daily, changed_from=None):
+    """只重算 changed_from 所在周期及之后的周线 / 月线"""
+    for resolution, rule in RESOLUTIONS.items():
+        if rule is None:
+            continue
+        tier = _read(ticker, resolution) if changed_from is not None else None
+        if tier is None or tier.empty:
+            tier = resample_bars(daily, rule)
+        else:
+            bucket_start = pd.Timestamp(changed_from).to_period(_PERIOD_ALIAS[rule]).start_time
+            head = tier[tier.index < bucket_start]
+            tier = pd.concat([head, resample_bars(daily[daily.index >= bucket_start], rule)])
+        _write(ticker, resolution, tier)
+
+
+def update(ticker, force=False):
+    """增量更新一个 Ticker 的本地数据，返回日线 (含指标)"""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    with _lock_for(ticker):
+        meta = _read_meta().get(ticker, {})
+        daily = _read(ticker, '1d')
+        fresh = time.time() - meta.get('updated_at', 0) < REFRESH_SECONDS
+        if daily is not None and fresh and not force:
+            return daily
+
+        if daily is None or daily.empty or force:
+            return _rebuild(ticker)
+
+        start = (daily.index[-1] - timedelta(days=OVERLAP_DAYS)).strftime('%Y-%m-%d')
+        fetched, actions = _download(ticker, start=start)
+        if fetched.empty:
+            _write_meta(ticker, updated_at=time.time())
+            return daily
+
+        first_new = fetched.index[0]
+        old = daily[daily.index < first_new]
+        changed_from = first_new
+        # 新分红: 只记录下来，Adj Close 读取时现算；新拆股: 把本地旧行情按比例换算，指标 / 周月线全部重算
+        new_actions = corporate_actions.record_actions(ticker, actions)
+        new_splits = new_actions['Stock Splits'][new_actions['Stock Splits'] > 0]
+        if not new_splits.empty and not old.empty:
+            old = corporate_actions.rebase_for_splits(old, new_splits[new_splits.index > old.index[0]])
+            changed_from = None
+
+        # 与本地重叠的几天对不上 (没拿到拆股记录的拆股 / 雅虎改写了历史) -> 整段重建；
+        # 单纯的暴涨暴跌不会改动重叠部分，不触发重建
+        if changed_from is not None:
+            overlap = daily.index.intersection(fetched.index)
+            diff = (fetched.loc[overlap, 'Close'] / daily.loc[overlap, 'Close'] - 1).abs()
+            if len(overlap) and diff.median() > RESTATE_TOLERANCE:
+                return _rebuild(ticker)
+
+        # 带上最后 20 根旧数据一起校验；接缝处还有确认的拆股跳变 (旧数据没换算过) -> 整段重建
+        context = pd.concat([old[fetched.columns].iloc[-20:], fetched])
+        repaired, report = validate_ohlcv(context, ticker)
+        if report['confirmed_splits'].iloc[0] > 0 or report['status'].iloc[0] == 'quarantined':
+            return _rebuild(ticker)
+        fetched = repaired[repaired.index >= first_new]
+
+        merged = pd.concat([old, fetched])
+        merged = _trend_indicators(merged, start_pos=len(old) if changed_from is not None else 0)
+        _write(ticker, '1d', merged)
+        _update_tiers(ticker, merged, changed_from=changed_from)
+        # 整段历史被改写 (拆股换算) 时记下时间，按窗口缓存的旧数据据此失效
+        rewritten = {'history_at': time.time()} if changed_from is None else {}
+        _write_meta(ticker, updated_at=time.time(), rows=len(merged), last=str(merged.index[-1].date()), **rewritten)
+        return merged
+
+
+def ticker_meta(ticker):
+    """该 Ticker 的更新记录 (updated_at / rows / last / history_at)"""
+    return _read_meta().get(ticker, {})
+
+
+def ensure_fresh(ticker):
+    """只保证本地数据是新的 (过期才联网增量更新)，不把整段日线读进内存；返回该 Ticker 的 meta"""
+    meta = ticker_meta(ticker)
+    if os.path.exists(_path(ticker, '1d')) and time.time() - meta.get('updated_at', 0) < REFRESH_SECONDS:
+        return meta
+    update(ticker)
+    return ticker_meta(ticker)
+
+
+def _rebuild(ticker):
+    daily, actions = _download(ticker, period='max')
+    corporate_actions.record_actions(ticker, actions, replace=True)
+    daily, _ = validate_ohlcv(daily, ticker)
+    if daily.empty:
+        return daily
+    daily = _trend_indicators(daily)
+    _write(ticker, '1d', daily)
+    _update_tiers(ticker, daily)
+    now = time.time()
+    _write_meta(ticker, updated_at=now, rows=len(daily), last=str(daily.index[-1].date()), history_at=now)
+    return daily
+
+
+# --- 读取 ---
+def period_start(period, end):
+    """把 yfinance 风格的 period ('6mo' / '5y' / 'ytd' / 'max') 换算成起始日期"""
+    end = pd.Timestamp(end)
+    if period == 'max':
+        return pd.Timestamp.min
+    if period == 'ytd':
+        return pd.Timestamp(year=end.year, month=1, day=1)
+    for suffix, unit in (('mo', 'months'), ('y', 'years'), ('d', 'days'), ('wk', 'weeks')):
+        if period.endswith(suffix) and period[:-len(suffix)].isdigit():
+            return end - pd.DateOffset(**{unit: int(period[:-len(suffix)])})
+    raise ValueError(f"无法识别的周期: {period}")
+
+
+def pick_resolution(n_daily_bars, max_points=MAX_POINTS):
+    """点数不超过 max_points 的最细分辨率"""
+    if n_daily_bars <= max_points:
+        return '1d'
+    if n_daily_bars / 5 <= max_points:
+        return '1wk'
+    return '1mo'
+
+
+def load_bars(ticker, period='1y', resolution='auto', refresh=True):
+    """读取某个周期的 K 线，resolution='auto' 时按点数自动选择日 / 周 / 月线
+
+    返回的 DataFrame 含 OHLCV + Adj Close (全收益，按本地分红记录现算) + MA200 / Peak / Drawdown / Bias，
+    df.attrs['resolution'] 记录实际分辨率。
+    """
+    daily = update(ticker) if refresh else _read(ticker, '1d')
+    if daily is None or daily.empty:
+        return pd.DataFrame()
+    start = period_start(period, daily.index[-1])
+    n_daily = int((daily.index >= start).sum())
+    if resolution == 'auto':
+        resolution = pick_resolution(n_daily)
+
+    bars = daily if resolution == '1d' else _read(ticker, resolution)
+    if bars is None:
+        bars = resample_bars(daily, RESOLUTIONS[resolution])
+    bars = bars[bars.index >= start].copy()
+    # 复权因子在完整日线上算 (除息前一日收盘价可能早于所选周期)，再对齐到周 / 月线的日期
+    adj = corporate_actions.adjusted_close(daily['Close'], corporate_actions.load_actions(ticker), 'total_return')
+    bars['Adj Close'] = adj.reindex(bars.index)
+    bars.attrs['resolution'] = resolution
+    return bars
+
+
+def load_close_panel(tickers, period='1y', basis=None, refresh=True):
+    """多个 Ticker 的日线收盘价面板 (按日期外连接，不同交易日历的空值留给调用方处理)
+
+    basis 为 corporate_actions 的口径 ('price' / 'total_return')，缺省使用 RETURN_BASIS，保证各页面收益率一致。
+    """
+    basis = basis or corporate_actions.RETURN_BASIS
+    column = 'Adj Close' if basis == 'total_return' else 'Close'
+    panel = {}
+    for t in tickers:
+        bars = load_bars(t, period, resolution='1d', refresh=refresh)
+        if not bars.empty:
+            panel[t] = bars[column]
+    out = pd.DataFrame(panel).sort_index()
+    out.attrs['basis'] = basis
+    return out
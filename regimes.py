@@ -0,0 +1,268 @@
+"""牛熊区间 / 回撤区间统计 (完整日线历史)
+
+- 牛熊: Close >= MA200 为牛市，Close < MA200 为熊市；开头不足 200 根、MA200 为空的部分不划分
+- 回撤: Drawdown < 0 的连续一段为一次回撤，前一根 K 线为前高 (Peak)，重新回到前高的那天为修复日
+
+多个 Ticker 的日线拼成一条长数组，做一次游程 (run-length) 分段: Ticker 或状态变化的位置开新段，
+每段的天数 / 收益 / 最深回撤用 np.*.reduceat、np.lexsort 一次算完，不逐个 Ticker、逐段循环。
+
+增量: 新 K 线只会改变每个 Ticker 最后的几段 (仍在进行中的区间)。RegimeBook 记住每个 Ticker 的重算起点
+(覆盖 price_store 重叠下载的最后 OVERLAP_DAYS 天所在的段)，新数据到来时只从这个起点往后重算;
+起点之前的历史变了 (拆股换算 / 整段重建) 则该 Ticker 整段重算。
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from data_client import fetch_bars
+from price_store import OVERLAP_DAYS
+
+# --- 配置区域 ---
+MIN_DEPTH = 0.10  # 统计 / 着色的回撤下限 (小于 10% 的回撤视为正常波动)
+MIN_REGIME_BARS = 20  # 短于 20 根的牛熊区间视为在均线附近来回穿越，不计入次数 / 平均天数，也不着色
+REGIME_NAMES = {'bull': '牛市', 'bear': '熊市'}
+BARS_COLS = ['Close', 'MA200', 'Drawdown', 'Bias']
+REGIME_COLS = ['Ticker', 'Regime', 'Start', 'End', 'Bars', 'Days', 'Return', 'Extreme_Bias', 'Ongoing']
+DRAWDOWN_COLS = ['Ticker', 'Peak_Date', 'Start', 'Trough_Date', 'Recovery_Date', 'Depth', 'Bars',
+                 'Decline_Days', 'Recovery_Days', 'Duration_Days', 'Ongoing']
+
+
+def _to_dates(days):
+    return pd.to_datetime(np.asarray(days, dtype='datetime64[D]'))
+
+
+def _stack(bars_by_ticker):
+    """{ticker: 日线} -> 拼接后的长数组；tid 为每一行所属 Ticker 的序号"""
+    tickers = [t for t, b in bars_by_ticker.items() if not b.empty]
+    frames = [bars_by_ticker[t] for t in tickers]
+    tid = np.repeat(np.arange(len(tickers)), [len(b) for b in frames])
+
+    def cat(col):
+        return np.concatenate([b[col].to_numpy(dtype=float) for b in frames]) if frames else np.zeros(0)
+
+    days = (np.concatenate([b.index.to_numpy('datetime64[D]') for b in frames]) if frames
+            else np.zeros(0, 'datetime64[D]')).astype(np.int64)
+    return tickers, tid, days, {c: cat(c) for c in BARS_COLS}
+
+
+def _runs(tid, state):
+    """游程分段: Ticker 或状态变化处开新段，返回每段的 (起点, 终点) 位置 (终点包含在段内)"""
+    n = len(state)
+    change = np.ones(n, dtype=bool)
+    change[1:] = (state[1:] != state[:-1]) | (tid[1:] != tid[:-1])
+    starts = np.flatnonzero(change)
+    ends = np.r_[starts[1:] - 1, n - 1] if n else starts
+    return starts, ends
+
+
+def _resume_points(tid, days, starts):
+    """每个 Ticker 的重算起点: 包含最后 OVERLAP_DAYS 天的第一段的起点位置"""
+    last = np.r_[np.flatnonzero(tid[1:] != tid[:-1]), len(tid) - 1] if len(tid) else np.zeros(0, int)
+    first = np.r_[0, last[:-1] + 1] if len(tid) else last
+    cutoff = days[last] - OVERLAP_DAYS
+    # 每个 Ticker 中第一根 >= cutoff 的 K 线，再往前找它所在段的起点
+    pos = first + np.array([np.searchsorted(days[f:l + 1], c) for f, l, c in zip(first, last, cutoff)], dtype=int)
+    return starts[np.searchsorted(starts, pos, side='right') - 1]
+
+
+def _regime_table(tickers, tid, days, cols):
+    close, ma, bias = cols['Close'], cols['MA200'], cols['Bias']
+    state = np.where(np.isnan(ma), 0, np.where(close >= ma, 1, -1))
+    starts, ends = _runs(tid, state)
+    if not len(starts):
+        return pd.DataFrame(columns=REGIME_COLS), starts
+    last_of_ticker = np.r_[tid[1:] != tid[:-1], True]
+    bias_filled = np.nan_to_num(bias, nan=0.0)
+    hi = np.maximum.reduceat(bias_filled, starts)
+    lo = np.minimum.reduceat(bias_filled, starts)
+    keep = state[starts] != 0
+    s, e, bull = starts[keep], ends[keep], state[starts][keep] == 1
+    out = pd.DataFrame({
+        'Ticker': np.asarray(tickers, dtype=object)[tid[s]],
+        'Regime': np.where(bull, 'bull', 'bear'),
+        'Start': _to_dates(days[s]),
+        'End': _to_dates(days[e]),
+        'Bars': e - s + 1,
+        'Days': days[e] - days[s],
+        'Return': close[e] / close[s] - 1,
+        'Extreme_Bias': np.where(bull, hi[keep], lo[keep]),  # 牛市离均线最远 / 熊市跌破均线最深
+        'Ongoing': last_of_ticker[e],
+    })
+    return out, starts
+
+
+def _drawdown_table(tickers, tid, days, cols):
+    dd = cols['Drawdown']
+    below = np.nan_to_num(dd, nan=0.0) < 0
+    starts, ends = _runs(tid, below)
+    if not len(starts):
+        return pd.DataFrame(columns=DRAWDOWN_COLS), starts
+    last_of_ticker = np.r_[tid[1:] != tid[:-1], True]
+    # 每段最深点: 按 (段号, 回撤) 排序后每段的第一个位置
+    run_id = np.repeat(np.arange(len(starts)), ends - starts + 1)
+    trough_all = np.lexsort((np.nan_to_num(dd, nan=0.0), run_id))[starts]
+    keep = below[starts]
+    s, e, trough = starts[keep], ends[keep], trough_all[keep]
+    ongoing = last_of_ticker[e]
+    has_peak = (s > 0) & (tid[np.maximum(s - 1, 0)] == tid[s])
+    peak = np.where(has_peak, s - 1, s)
+    recovery = np.where(ongoing, e, np.minimum(e + 1, len(days) - 1))  # 进行中的回撤: 以最后一根代替
+    out = pd.DataFrame({
+        'Ticker': np.asarray(tickers, dtype=object)[tid[s]],
+        'Peak_Date': _to_dates(days[peak]),
+        'Start': _to_dates(days[s]),
+        'Trough_Date': _to_dates(days[trough]),
+        'Recovery_Date': _to_dates(days[recovery]),
+        'Depth': dd[trough],
+        'Bars': e - s + 1,
+        'Decline_Days': days[trough] - days[peak],
+        'Recovery_Days': (days[recovery] - days[trough]).astype(float),
+        'Duration_Days': days[recovery] - days[peak],
+        'Ongoing': ongoing,
+    })
+    out.loc[out['Ongoing'], ['Recovery_Date', 'Recovery_Days']] = [pd.NaT, np.nan]
+    return out, starts
+
+
+def analyze(bars_by_ticker):
+    """一次性分段: {ticker: 日线 (含 Close / MA200 / Drawdown / Bias)} -> (牛熊区间表, 回撤区间表)"""
+    regimes, drawdowns, _ = _analyze(bars_by_ticker)
+    return regimes, drawdowns
+
+
+def _analyze(bars_by_ticker):
+    tickers, tid, days, cols = _stack(bars_by_ticker)
+    regimes, regime_starts = _regime_table(tickers, tid, days, cols)
+    drawdowns, dd_starts = _drawdown_table(tickers, tid, days, cols)
+    resume = {}
+    if len(tid):
+        pos = np.minimum(_resume_points(tid, days, regime_starts), _resume_points(tid, days, dd_starts))
+        resume = dict(zip(tickers, _to_dates(days[pos])))
+    return regimes, drawdowns, resume
+
+
+class RegimeBook:
+    """增量维护多个 Ticker 的牛熊 / 回撤区间表 (进程内，dashboard 的多个会话共用一份)"""
+
+    def __init__(self):
+        self.regimes = pd.DataFrame(columns=REGIME_COLS)
+        self.drawdowns = pd.DataFrame(columns=DRAWDOWN_COLS)
+        self.resume = {}  # ticker -> 重算起点 (日期)
+        self.anchor = {}  # ticker -> (起点前一根的日期, 收盘价): 用来判断起点之前的历史有没有变
+        self._lock = threading.Lock()
+
+    def _tail(self, ticker, bars):
+        """返回 (需要重算的尾部, 是否为增量)；尾部带上起点前一根 K 线作为回撤的前高"""
+        resume, anchor = self.resume.get(ticker), self.anchor.get(ticker)
+        if resume is None or anchor is None:
+            return bars, False
+        pos = bars.index.searchsorted(resume)
+        if pos == 0 or bars.index[pos - 1] != anchor[0] or bars['Close'].iloc[pos - 1] != anchor[1]:
+            return bars, False
+        return bars.iloc[pos - 1:], True
+
+    def update(self, bars_by_ticker):
+        """用最新的日线更新区间表，返回这些 Ticker 的 (牛熊区间表, 回撤区间表)"""
+        with self._lock:
+            tails, cut = {}, {}
+            for t, bars in bars_by_ticker.items():
+                if bars.empty:
+                    continue
+                tails[t], incremental = self._tail(t, bars)
+                cut[t] = self.resume[t] if incremental else pd.Timestamp.min
+
+            regimes, drawdowns, resume = _analyze(tails)
+            tickers = list(tails)
+
+            def merge(old, new):
+                # 旧表: 去掉这些 Ticker 在起点之后的段；新表: 去掉起点之前 (上下文那一根) 的段
+                old_cut = old['Ticker'].map(cut)
+                old = old[old_cut.isna() | (old['Start'] < old_cut)]
+                new = new[new['Start'] >= new['Ticker'].map(cut)]
+                parts = [f for f in (old, new) if not f.empty]
+                return pd.concat(parts, ignore_index=True) if parts else old.iloc[:0]
+
+            self.regimes = merge(self.regimes, regimes)
+            self.drawdowns = merge(self.drawdowns, drawdowns)
+            for t, start in resume.items():
+                bars = bars_by_ticker[t]
+                pos = bars.index.searchsorted(start)
+                self.resume[t] = start
+                self.anchor[t] = (bars.index[pos - 1], bars['Close'].iloc[pos - 1]) if pos > 0 else None
+
+            pick = self.regimes['Ticker'].isin(tickers)
+            regimes = self.regimes[pick].sort_values(['Ticker', 'Start'], kind='stable').reset_index(drop=True)
+            pick = self.drawdowns['Ticker'].isin(tickers)
+            drawdowns = self.drawdowns[pick].sort_values(['Ticker', 'Start'], kind='stable').reset_index(drop=True)
+            return regimes, drawdowns
+
+
+_book = RegimeBook()
+
+
+def load(tickers):
+    """读取各 Ticker 的完整日线并 (增量) 更新区间表，返回 (牛熊区间表, 回撤区间表)"""
+    bars = {t: fetch_bars(t, 'max', resolution='1d', columns=BARS_COLS) for t in tickers}
+    return _book.update(bars)
+
+
+def summarize(regimes, drawdowns, min_depth=MIN_DEPTH):
+    """每个 Ticker 一行: 当前区间及已持续天数、历史牛 / 熊市次数和平均天数 (不含短于 MIN_REGIME_BARS 的)、
+    超过 min_depth 的回撤次数和平均修复天数"""
+    rows = {}
+    for t, reg in regimes.groupby('Ticker', sort=False):
+        cur = reg.iloc[-1]
+        major = reg[reg['Bars'] >= MIN_REGIME_BARS]
+        days = major.groupby('Regime')['Days'].mean()
+        rows[t] = {
+            'regime': cur['Regime'] if cur['Ongoing'] else None,
+            'regime_days': cur['Days'] if cur['Ongoing'] else 0,
+            'bull_count': int((major['Regime'] == 'bull').sum()),
+            'bear_count': int((major['Regime'] == 'bear').sum()),
+            'bull_avg_days': days.get('bull', np.nan),
+            'bear_avg_days': days.get('bear', np.nan),
+            'bull_share': reg.loc[reg['Regime'] == 'bull', 'Bars'].sum() / reg['Bars'].sum(),
+        }
+    out = pd.DataFrame.from_dict(rows, orient='index')
+    deep = drawdowns[drawdowns['Depth'] <= -min_depth]
+    grouped = deep.groupby('Ticker')
+    out['drawdown_count'] = grouped.size().reindex(out.index).fillna(0).astype(int)
+    out['max_depth'] = grouped['Depth'].min().reindex(out.index)
+    done = deep[~deep['Ongoing'].astype(bool)].groupby('Ticker')
+    out['avg_recovery_days'] = done['Recovery_Days'].mean().reindex(out.index)
+    out['avg_duration_days'] = done['Duration_Days'].mean().reindex(out.index)
+    ongoing = drawdowns[drawdowns['Ongoing'].astype(bool)].set_index('Ticker')
+    out['current_depth'] = ongoing['Depth'].reindex(out.index)
+    out['current_drawdown_days'] = ongoing['Duration_Days'].reindex(out.index)
+    out.attrs['min_depth'] = min_depth
+    return out
+
+
+def shading_periods(regimes, drawdowns, ticker, min_depth=MIN_DEPTH):
+    """趋势图着色用的区间: (熊市区间, 超过 min_depth 的回撤区间 [前高, 修复日])，各为 Start / End 两列"""
+    reg = regimes[(regimes['Ticker'] == ticker) & (regimes['Regime'] == 'bear') & (regimes['Bars'] >= MIN_REGIME_BARS)]
+    dd = drawdowns[(drawdowns['Ticker'] == ticker) & (drawdowns['Depth'] <= -min_depth)]
+    end = dd['Recovery_Date'].fillna(dd['Peak_Date'] + pd.to_timedelta(dd['Duration_Days'], unit='D'))
+    return (reg[['Start', 'End']].reset_index(drop=True),
+            pd.DataFrame({'Start': dd['Peak_Date'], 'End': end}).reset_index(drop=True))
+
+
+def describe(summary, ticker):
+    """给脚本打印用的两行中文描述"""
+    if ticker not in summary.index:
+        return []
+    row = summary.loc[ticker]
+    lines = []
+    if row['regime']:
+        avg = row[f"{row['regime']}_avg_days"]
+        lines.append(f"{'🐂' if row['regime'] == 'bull' else '🐻'} 当前{REGIME_NAMES[row['regime']]}已持续 "
+                     f"{row['regime_days']:.0f} 天 (历史上 MA200 {REGIME_NAMES[row['regime']]}共 "
+                     f"{row[row['regime'] + '_count']} 次，平均 {avg:.0f} 天)")
+    depth = summary.attrs.get('min_depth', MIN_DEPTH)
+    recovery = (f"，平均 {row['avg_recovery_days']:.0f} 天从谷底修复" if pd.notna(row['avg_recovery_days']) else "")
+    lines.append(f"📏 历史上超过 {depth:.0%} 的回撤 {row['drawdown_count']} 次，最深 {row['max_depth']:.1%}{recovery}"
+                 if row['drawdown_count'] else f"📏 历史上没有超过 {depth:.0%} 的回撤")
+    if pd.notna(row['current_depth']):
+        lines.append(f"⏳ 当前这次回撤已持续 {row['current_drawdown_days']:.0f} 天，最深 {row['current_depth']:.1%}")
+    return lines
@@ -0,0 +1,107 @@
+"""N 个资产的相对强弱: 两两比值、滚动跑赢率、排名变化、排行榜
+
+所有两两比较都用一次广播完成，不写 N² 的循环:
+- 累计净值 g[t, i] = P[t, i] / P[0, i]，两两比值 g[t, i] / g[t, j] 即 i 相对 j 的强弱曲线
+- 滚动 WINDOW 天收益 r[t, i]，跑赢率 = 平均 (r[t, i] > r[t, j])，按时间分块累加，50+ 个资产内存也不会爆
+- 排名: 每天按滚动收益排序 (1 = 最强)
+
+输入为 price_store.load_close_panel 的收盘价面板；不同交易日历先用 align_panel 对齐 (与 PK 页面一致)。
+"""
+import numpy as np
+import pandas as pd
+
+import perf_monitor
+import shared_cache
+from indicators import align_panel
+
+# --- 配置区域 ---
+WINDOW = 63  # 滚动比较的窗口 (约 3 个月交易日)
+CHUNK_CELLS = 4_000_000  # 两两比较时每块最多的 (天 × N × N) 元素个数
+
+
+def _prices(panel):
+    prices = align_panel(panel.sort_index()).dropna(axis=1, how='all')
+    if prices.shape[1] < 2:
+        raise ValueError("至少需要两个有数据的资产才能比较")
+    return prices
+
+
+def ratio_curves(panel, ticker):
+    """ticker 相对其他每个资产的强弱曲线: 列 j = ticker 的累计净值 / j 的累计净值 (> 1 表示跑赢 j)
+
+    完整的两两比值是 (T, N, N)，资产多、周期长时很大，所以页面上只按选中的资产取其中一个切片。
+    """
+    prices = _prices(panel)
+    growth = prices.to_numpy(dtype=float) / prices.iloc[0].to_numpy(dtype=float)
+    i = prices.columns.get_loc(ticker)
+    out = pd.DataFrame(growth[:, [i]] / growth, index=prices.index, columns=prices.columns)
+    return out.drop(columns=ticker)
+
+
+def pair_matrix(panel):
+    """整个区间 i 相对 j 的超额收益 (净值比值 - 1)，行为 i、列为 j"""
+    prices = _prices(panel)
+    growth = prices.iloc[-1].to_numpy(dtype=float) / prices.iloc[0].to_numpy(dtype=float)
+    return pd.DataFrame(growth[:, None] / growth[None, :] - 1, index=prices.columns, columns=prices.columns)
+
+
+def rolling_returns(panel, window=WINDOW):
+    """每天的滚动 window 天收益 (开头不足 window 天的行为 NaN)"""
+    prices = _prices(panel)
+    return prices / prices.shift(window) - 1
+
+
+def win_rates(rolling):
+    """滚动跑赢率: [i, j] = i 的滚动收益高于 j 的天数占比；按时间分块广播比较再累加"""
+    values = rolling.dropna(how='any').to_numpy(dtype=float)
+    t, n = values.shape
+    wins = np.zeros((n, n))
+    step = max(1, CHUNK_CELLS // max(n * n, 1))
+    for lo in range(0, t, step):
+        chunk = values[lo:lo + step]
+        wins += (chunk[:, :, None] > chunk[:, None, :]).sum(axis=0)
+    out = wins / t if t else np.full((n, n), np.nan)
+    np.fill_diagonal(out, np.nan)
+    return pd.DataFrame(out, index=rolling.columns, columns=rolling.columns)
+
+
+def ranks(rolling):
+    """每天按滚动收益排名 (1 = 最强)；收益为 NaN 的资产当天不参与排名"""
+    values = rolling.to_numpy(dtype=float)
+    filled = np.where(np.isnan(values), -np.inf, values)
+    order = (-filled).argsort(axis=1, kind='stable').argsort(axis=1, kind='stable') + 1.0
+    return pd.DataFrame(np.where(np.isnan(values), np.nan, order), index=rolling.index, columns=rolling.columns)
+
+
+def leaderboard(panel, window=WINDOW):
+    """排行榜 (按累计收益排序) + 两两超额矩阵 + 滚动跑赢率矩阵 + 每天的排名
+
+    返回 (board, pairs, wins, rank_history)；board 的列:
+    total_return 区间累计收益 / recent_return 最近 window 天收益 / rank 最新排名 / avg_rank 平均排名 /
+    win_rate 对其他资产的平均滚动跑赢率 / beats 整个区间跑赢了几个资产
+    """
+    with perf_monitor.stage("relative_strength.leaderboard", assets=panel.shape[1]) as s:
+        s.set_frame(panel)
+        prices = _prices(panel)
+        rolling = rolling_returns(prices, window)
+        rank_history = ranks(rolling).dropna(how='all')
+        pairs = pair_matrix(prices)
+        wins = win_rates(rolling)
+    board = pd.DataFrame({
+        'total_return': prices.iloc[-1] / prices.iloc[0] - 1,
+        'recent_return': rolling.iloc[-1],
+        'rank': rank_history.iloc[-1] if not rank_history.empty else np.nan,
+        'avg_rank': rank_history.mean(),
+        'win_rate': wins.mean(axis=1),
+        'beats': (pairs > 0).sum(axis=1),
+    })
+    board = board.sort_values('total_return', ascending=False)
+    board.attrs['window'] = window
+    order = board.index
+    return board, pairs.loc[order, order], wins.loc[order, order], rank_history[order]
+
+
+def cached(panel, window=WINDOW, fp=None):
+    """带缓存的 leaderboard；key 为面板内容指纹 + 窗口，返回的表是共享对象，调用方不要修改"""
+    fp = fp or shared_cache.fingerprint(panel)
+    return shared_cache.get_or_load(('relative_strength', fp, window), lambda: leaderboard(panel, window), ttl=None)
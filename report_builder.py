@@ -0,0 +1,215 @@
+"""批量生成静态 HTML 报告 (代替每张图一个 fig.show 浏览器标签页)
+
+每次 fig.show 都会打开一个新标签页，并各自内嵌一份几 MB 的 plotly.js。这里把所有分析
+(标普 / 纳指 / BTC / ETH 趋势图、BTC vs 标普 PK 图、持仓 XIRR) 渲染进:
+- 一个自包含的 HTML 文件 (plotly.js 只内嵌一次)，或
+- 一个目录: 每个分析一页 + index.html，所有页面共用同一个 plotly.min.js
+各分析在进程池里并行生成，全程不需要交互输入、不打开浏览器，适合定时任务:
+
+    python report_builder.py --period 1y                      # reports/report_YYYYmmdd.html
+    python report_builder.py --sections btc eth --split       # reports/report_YYYYmmdd/ 目录
+"""
+import argparse
+import contextlib
+import html
+import importlib
+import io
+import os
+import platform
+import time
+import webbrowser
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+import market_data
+import price_store
+
+# --- 配置区域 ---
+REPORT_DIR = os.environ.get("REPORT_DIR", "reports")
+PLOTLY_JS_NAME = "plotly.min.js"
+_PROXY_VARS = ("http_proxy", "https_proxy")
+
+# 分析名 -> 标题 / 需要预先更新的 Ticker
+SECTIONS = {
+    'sp500': {'title': '标普500 趋势分析', 'tickers': ['^GSPC']},
+    'nasdaq': {'title': '纳斯达克100 趋势分析', 'tickers': ['^NDX']},
+    'btc': {'title': 'Bitcoin 趋势分析', 'tickers': ['BTC-USD']},
+    'eth': {'title': 'Ethereum 趋势分析', 'tickers': ['ETH-USD']},
+    'compare': {'title': 'BTC vs 标普500 累计收益', 'tickers': ['BTC-USD', '^GSPC']},
+    'portfolio': {'title': '我的持仓 & XIRR 演变', 'tickers': []},
+}
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+{plotly_js}
+<style>
+body {{ background: #111; color: #ddd; font-family: -apple-system, "PingFang SC", sans-serif; margin: 0 auto;
+       max-width: 1200px; padding: 24px; }}
+h1, h2 {{ color: #fff; }}
+section {{ border-top: 1px solid #333; padding: 16px 0; }}
+pre {{ background: #1b1b1b; padding: 12px; overflow-x: auto; white-space: pre-wrap; }}
+.error {{ color: #ff6b6b; }}
+a {{ color: #00bfff; }}
+.meta {{ color: #888; font-size: 12px; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p class="meta">生成时间: {generated}</p>
+{body}
+</body>
+</html>
+"""
+
+
+def _import_script(module):
+    """导入分析脚本；脚本在 import 时会强制设置本机代理，这里恢复成报告进程自己的代理设置"""
+    saved = {k: os.environ.get(k) for k in _PROXY_VARS}
+    mod = importlib.import_module(module)
+    for k, v in saved.items():
+        if v is None:
+            os.environ.pop(k, None)
+        else:
+            os.environ[k] = v
+    return mod
+
+
+def _build_figure(name, period):
+    if name == 'sp500':
+        return _import_script('bp').analyze_sp500(period, show=False)
+    if name == 'nasdaq':
+        return _import_script('nasdaq_analysis').analyze_nasdaq(period, show=False)
+    if name in ('btc', 'eth'):
+        crypto = _import_script('crypto_analysis')
+        if name == 'btc':
+            return crypto.analyze_single_crypto("BTC-USD", "Bitcoin (BTC)", "#FFA500", period, show=False)
+        return crypto.analyze_single_crypto("ETH-USD", "Ethereum (ETH)", "#6A5ACD", period, show=False)
+    if name == 'compare':
+        return _import_script('compare_assets').compare_crypto_stock(period, show=False)
+    if name == 'portfolio':
+        pm = _import_script('portfolio_manager')
+        pm.calculate_portfolio()
+        _, fig = pm.plot_xirr_history(show=False)
+        return fig
+    raise ValueError(f"未知的分析: {name} (可选 {', '.join(SECTIONS)})")
+
+
+def render_section(name, period):
+    """生成一个分析 (在子进程里执行): 图表转成不含 plotly.js 的 <div>，控制台输出一并收集"""
+    buf = io.StringIO()
+    t0 = time.perf_counter()
+    fig, error = None, None
+    with contextlib.redirect_stdout(buf):
+        try:
+            fig = _build_figure(name, period)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    div = pio.to_html(fig, include_plotlyjs=False, full_html=False, div_id=f"fig-{name}") if fig is not None else ""
+    return {'name': name, 'title': SECTIONS[name]['title'], 'text': buf.getvalue(), 'div': div,
+            'error': error, 'seconds': time.perf_counter() - t0}
+
+
+def _prewarm(sections, max_workers=8):
+    """先在主进程里并发更新所有要用到的行情 (网络 IO)，子进程里只读本地仓库，同一 Ticker 不会被重复下载"""
+    tickers = sorted({t for s in sections for t in SECTIONS[s]['tickers']})
+    if not tickers:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tickers))) as pool:
+        for t, result in zip(tickers, pool.map(_safe_update, tickers)):
+            if result is not None:
+                print(f"⚠️ {t} 更新失败: {result}")
+
+
+def _safe_update(ticker):
+    try:
+        price_store.update(ticker)
+    except Exception as e:
+        return e
+    return None
+
+
+def _section_html(r):
+    parts = [f'<section id="{r["name"]}"><h2>{html.escape(r["title"])}</h2>']
+    if r['error']:
+        parts.append(f'<p class="error">❌ 生成失败: {html.escape(r["error"])}</p>')
+    parts.append(r['div'])
+    if r['text'].strip():
+        parts.append(f'<pre>{html.escape(r["text"].strip())}</pre>')
+    parts.append(f'<p class="meta">耗时 {r["seconds"]:.2f}s</p></section>')
+    return "\n".join(parts)
+
+
+def _page(title, body, plotly_js):
+    return PAGE_TEMPLATE.format(title=html.escape(title), plotly_js=plotly_js, body=body,
+                                generated=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+
+def build_report(sections=None, period="1y", out=None, split=False, max_workers=None, open_browser=False):
+    """生成报告，返回 HTML 文件路径 (split=True 时为目录里的 index.html)"""
+    sections = list(sections or SECTIONS)
+    unknown = [s for s in sections if s not in SECTIONS]
+    if unknown:
+        raise ValueError(f"未知的分析: {', '.join(unknown)} (可选 {', '.join(SECTIONS)})")
+
+    _prewarm(sections)
+    workers = min(max_workers or os.cpu_count() or 1, len(sections))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(render_section, sections, [period] * len(sections)))
+    else:
+        results = [render_section(s, period) for s in sections]
+
+    stamp = datetime.now().strftime('%Y%m%d')
+    title = f"投资分析报告 ({period})"
+    if not split:
+        out = out or os.path.join(REPORT_DIR, f"report_{stamp}.html")
+        os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        toc = " | ".join(f'<a href="#{r["name"]}">{html.escape(r["title"])}</a>' for r in results)
+        body = f"<p>{toc}</p>\n" + "\n".join(_section_html(r) for r in results)
+        # plotly.js 只内嵌一次，整个文件可以直接发给别人离线打开
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(_page(title, body, f'<script type="text/javascript">{get_plotlyjs()}</script>'))
+        path = out
+    else:
+        out = out or os.path.join(REPORT_DIR, f"report_{stamp}")
+        os.makedirs(out, exist_ok=True)
+        with open(os.path.join(out, PLOTLY_JS_NAME), "w", encoding="utf-8") as f:
+            f.write(get_plotlyjs())
+        shared_js = f'<script src="{PLOTLY_JS_NAME}"></script>'
+        links = []
+        for r in results:
+            with open(os.path.join(out, f"{r['name']}.html"), "w", encoding="utf-8") as f:
+                f.write(_page(r['title'], '<p><a href="index.html">← 返回目录</a></p>' + _section_html(r), shared_js))
+            status = ' <span class="error">(失败)</span>' if r['error'] else ''
+            links.append(f'<li><a href="{r["name"]}.html">{html.escape(r["title"])}</a>{status}</li>')
+        path = os.path.join(out, "index.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(_page(title, f"<ul>{''.join(links)}</ul>", ""))
+
+    failed = [r['name'] for r in results if r['error']]
+    print(f"✅ 报告已生成: {path}" + (f" (失败: {', '.join(failed)})" if failed else ""))
+    if open_browser:
+        webbrowser.open("file://" + os.path.abspath(path))
+    return path
+
+
+if __name__ == "__main__":
+    # 与 dashboard 相同: 只有 macOS (本机) 才走本地代理，服务器上的定时任务直连
+    if platform.system() == "Darwin":
+        market_data.configure_proxy()
+
+    parser = argparse.ArgumentParser(description="批量生成静态 HTML 分析报告")
+    parser.add_argument("--sections", nargs="+", default=list(SECTIONS), choices=list(SECTIONS))
+    parser.add_argument("--period", default="1y")
+    parser.add_argument("--out", default=None, help="输出文件 (或 --split 时的目录)")
+    parser.add_argument("--split", action="store_true", help="每个分析一页，共用一个 plotly.min.js")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--open", action="store_true", help="生成后用浏览器打开")
+    a = parser.parse_args()
+    build_report(a.sections, a.period, a.out, a.split, a.workers, a.open)
@@ -0,0 +1,134 @@
+"""周期收益表: 日历月 / 日历年收益、滚动 N 年年化 (CAGR)、最好 / 最差窗口
+
+输入都是 price_store.load_close_panel 的收盘价面板 (日期为索引、Ticker 为列，不同交易日历的空值保留)。
+所有 Ticker 一起算: 先按月 / 年给每一行编号，再用 np.add.reduceat 之类的分组归约一次得到每期的期末价，
+不逐个 Ticker 做 resample。结果按面板内容指纹放进 shared_cache，数据没变时切换页面 / rerun 不重算。
+
+收益口径:
+- 每期收益 = 本期最后一个收盘价 / 上期最后一个收盘价 - 1
+- 面板里第一期 (或 Ticker 上市的那一期) 没有上期，用本期第一个收盘价作基数，因此是不完整的一期
+- 某一期内完全没有数据 (停牌 / 退市之后) 记为 NaN，而不是 0
+"""
+import numpy as np
+import pandas as pd
+
+import perf_monitor
+import shared_cache
+
+# --- 配置区域 ---
+FREQS = {'M': '月', 'Y': '年'}
+DAYS_PER_YEAR = 365.25
+ROLLING_YEARS = 3  # 滚动年化的默认窗口
+MONTH_NAMES = [f"{m}月" for m in range(1, 13)]
+
+
+def _period_codes(index, freq):
+    """每一行所属的日历期编号 (同一个月 / 同一年编号相同，按时间递增)"""
+    if freq == 'M':
+        return index.year.to_numpy() * 12 + index.month.to_numpy() - 1
+    if freq == 'Y':
+        return index.year.to_numpy()
+    raise ValueError(f"未知的周期: {freq} (可选 {', '.join(FREQS)})")
+
+
+def period_returns(panel, freq='M'):
+    """各 Ticker 的日历月 (freq='M') / 日历年 (freq='Y') 收益，索引为 Period"""
+    panel = panel.sort_index()
+    if panel.empty:
+        return pd.DataFrame(columns=panel.columns, dtype=float)
+    codes = _period_codes(panel.index, freq)
+    ends = np.flatnonzero(np.r_[codes[1:] != codes[:-1], True])  # 每期最后一行
+    starts = np.r_[0, ends[:-1] + 1]
+
+    values = panel.to_numpy(dtype=float)
+    has_data = np.add.reduceat(~np.isnan(values), starts, axis=0) > 0
+    end = panel.ffill().to_numpy(dtype=float)[ends]
+    first = panel.bfill().to_numpy(dtype=float)[starts]  # 本期第一个收盘价 (上市当期用作基数)
+    prev = np.vstack([np.full((1, end.shape[1]), np.nan), end[:-1]])
+    base = np.where(np.isnan(prev), first, prev)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.where(has_data, end / base - 1, np.nan)
+    index = panel.index[ends].to_period(freq)
+    return pd.DataFrame(out, index=index, columns=panel.columns)
+
+
+def calendar_table(monthly, yearly, ticker):
+    """单个 Ticker 的 年 × 月 收益表，最后一列为全年收益 (行为年份，列为 1月..12月 + 全年)"""
+    s = monthly[ticker]
+    grid = np.full((0, 12), np.nan)
+    years = np.array([], dtype=int)
+    if len(s):
+        years = np.arange(s.index.year.min(), s.index.year.max() + 1)
+        grid = np.full((len(years), 12), np.nan)
+        grid[s.index.year - years[0], s.index.month - 1] = s.to_numpy()
+    out = pd.DataFrame(grid, index=pd.Index(years, name='年份'), columns=MONTH_NAMES)
+    out['全年'] = yearly[ticker].set_axis(yearly.index.year).reindex(years).to_numpy()
+    return out.dropna(how='all')
+
+
+def rolling_cagr(panel, years=ROLLING_YEARS):
+    """滚动 N 年年化收益: 每个交易日与 N 年前 (当天或之前最近的一个交易日) 相比的 CAGR"""
+    panel = panel.sort_index()
+    values = panel.ffill().to_numpy(dtype=float)
+    days = panel.index.to_numpy('datetime64[D]').astype(np.int64)
+    back = np.searchsorted(days, days - int(round(years * DAYS_PER_YEAR)), side='right') - 1
+    ok = back >= 0
+    out = np.full(values.shape, np.nan)
+    if ok.any():
+        elapsed = (days[ok] - days[back[ok]]) / DAYS_PER_YEAR
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[ok] = (values[ok] / values[back[ok]]) ** (1.0 / elapsed[:, None]) - 1
+    return pd.DataFrame(out, index=panel.index, columns=panel.columns)
+
+
+def _extreme(frame, pick):
+    """每列的极值及其位置 (全 NaN 的列返回 NaN / None)"""
+    arr = frame.to_numpy(dtype=float)
+    valid = ~np.isnan(arr).all(axis=0)
+    filled = np.where(np.isnan(arr), -np.inf if pick == 'max' else np.inf, arr)
+    pos = filled.argmax(axis=0) if pick == 'max' else filled.argmin(axis=0)
+    value = np.where(valid, arr[pos, np.arange(arr.shape[1])], np.nan)
+    where = [frame.index[p] if v else None for p, v in zip(pos, valid)]
+    return value, where
+
+
+def summarize(panel, monthly, yearly, rolling, years=ROLLING_YEARS):
+    """每个 Ticker 一行: 全区间年化、最好 / 最差月份和年份、滚动 N 年的最好 / 最差窗口 (窗口结束日)"""
+    panel = panel.sort_index()
+    days = panel.index.to_numpy('datetime64[D]').astype(np.int64)
+    values = panel.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    first = valid.argmax(axis=0)
+    last = len(values) - 1 - valid[::-1].argmax(axis=0)
+    cols = np.arange(values.shape[1])
+    span = (days[last] - days[first]) / DAYS_PER_YEAR if len(days) else np.zeros(0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cagr = np.where(valid.any(axis=0) & (span > 0),
+                        (values[last, cols] / values[first, cols]) ** (1.0 / span) - 1, np.nan)
+
+    out = pd.DataFrame({'cagr': cagr}, index=panel.columns)
+    for name, frame in (('month', monthly), ('year', yearly), ('window', rolling)):
+        for pick, label in (('max', 'best'), ('min', 'worst')):
+            value, where = _extreme(frame, pick)
+            out[f'{label}_{name}'] = value
+            out[f'{label}_{name}_at'] = where
+    out['positive_months'] = (monthly > 0).sum() / monthly.notna().sum().replace(0, np.nan)
+    out.attrs['years'] = years
+    return out
+
+
+def compute(panel, years=ROLLING_YEARS):
+    """一次算出页面需要的全部表格: {'monthly', 'yearly', 'rolling', 'summary'}"""
+    with perf_monitor.stage("returns_table.compute", tickers=panel.shape[1]) as s:
+        s.set_frame(panel)
+        monthly = period_returns(panel, 'M')
+        yearly = period_returns(panel, 'Y')
+        rolling = rolling_cagr(panel, years)
+        summary = summarize(panel, monthly, yearly, rolling, years)
+    return {'monthly': monthly, 'yearly': yearly, 'rolling': rolling, 'summary': summary}
+
+
+def cached(panel, years=ROLLING_YEARS, fp=None):
+    """带缓存的 compute；key 为面板内容指纹 (数据版本) + 窗口，返回的表是共享对象，调用方不要修改"""
+    fp = fp or shared_cache.fingerprint(panel)
+    return shared_cache.get_or_load(('returns_table', fp, years), lambda: compute(panel, years), ttl=None)
@@ -0,0 +1,195 @@
+"""进程级共享数据缓存 (所有 Streamlit 会话共用)
+
+多个人同时打开 dashboard 时，每个会话原本都会各自下载 / 计算同一份 BTC-USD、^GSPC 历史。这里把结果放在进程级:
+- 同一个 key 同时只会有一次加载，其他会话等待这次加载的结果 (in-flight 去重)
+- DataFrame 以只读方式共享: 返回的是浅拷贝，pandas 的 Copy-on-Write 保证调用方修改时不会改到缓存里的数据
+- 全局内存预算 (MEMORY_BUDGET_MB)，超出时按 LRU 淘汰
+- 每个条目有过期时间，行情数据默认与 price_store 的刷新间隔一致
+"""
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+import market_data
+import perf_monitor
+
+# pandas 3 起 Copy-on-Write 始终开启；2.x 需要显式打开，否则浅拷贝与缓存共享数据，一个会话的写入会改到所有会话
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.options.mode.copy_on_write = True
+
+# --- 配置区域 ---
+MEMORY_BUDGET_MB = float(os.environ.get("SHARED_CACHE_MB", 512))
+DEFAULT_TTL = 15 * 60  # 秒
+LIVE_TTL = 60  # 实时报价 (period='5d' 之类) 的有效期
+
+_entries = OrderedDict()  # key -> (value, nbytes, expires_at)
+_inflight = {}  # key -> _Flight
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'waits': 0, 'evictions': 0, 'bytes': 0}
+
+
+class _Flight:
+    """一次正在进行的加载；等待者在 event 上阻塞"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def fingerprint(df):
+    """DataFrame 的内容指纹 (索引 + 列名 + 数值)，数据不变则指纹不变"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(list(df.columns)).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+def _sizeof(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if hasattr(value, 'nbytes'):  # numpy 数组 / Arrow 表
+        return int(value.nbytes)
+    if isinstance(value, dict):  # 一组结果表 (例如 returns_table.compute)
+        return sum(_sizeof(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+def _share(value):
+    """共享给调用方的视图: DataFrame / Series 返回浅拷贝 (CoW，写入时才真正复制)"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    return value
+
+
+def _drop(key):
+    _, nbytes, _ = _entries.pop(key)
+    _stats['bytes'] -= nbytes
+
+
+def _store(key, value, ttl):
+    budget = MEMORY_BUDGET_MB * 1024 * 1024
+    nbytes = _sizeof(value)
+    if nbytes > budget:
+        return  # 单个结果就超出预算，不缓存
+    if key in _entries:
+        _drop(key)
+    while _entries and _stats['bytes'] + nbytes > budget:
+        _drop(next(iter(_entries)))
+        _stats['evictions'] += 1
+    expires = time.monotonic() + ttl if ttl is not None else None
+    _entries[key] = (value, nbytes, expires)
+    _stats['bytes'] += nbytes
+
+
+def _cacheable(value):
+    # 空结果通常是网络失败或代码拼错，不缓存，下次重新尝试
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return not value.empty
+    if getattr(value, 'num_rows', None) == 0:
+        return False  # 空的 Arrow 表 (data_service 把空 DataFrame 转成 0 行的 pa.Table)
+    return value is not None
+
+
+def get_or_load(key, loader, ttl=DEFAULT_TTL):
+    """命中则直接返回；同一个 key 正在加载时等待那次加载；否则调用 loader() 并缓存结果
+
+    key 必须可哈希，第一个元素用作 perf_monitor 的标签。loader 抛出的异常会同时抛给所有等待者，且不缓存。
+    """
+    # 查找 / 等待计入 shared_cache 阶段；真正的加载放在阶段之外，loader 自己的阶段不会被重复计时
+    with perf_monitor.stage("shared_cache", kind=str(key[0])) as s:
+        with _lock:
+            entry = _entries.get(key)
+            if entry is not None and (entry[2] is None or entry[2] > time.monotonic()):
+                _entries.move_to_end(key)
+                _stats['hits'] += 1
+                s.cache(True)
+                return _share(entry[0])
+            if entry is not None:
+                _drop(key)
+            flight = _inflight.get(key)
+            owner = flight is None
+            if owner:
+                flight = _inflight[key] = _Flight()
+                _stats['misses'] += 1
+            else:
+                _stats['waits'] += 1
+        s.cache(not owner)
+
+        if not owner:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return _share(flight.value)
+
+    try:
+        flight.value = loader()
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+            if flight.error is None and _cacheable(flight.value):
+                _store(key, flight.value, ttl)
+        flight.event.set()
+    return _share(flight.value)
+
+
+def get(key):
+    """只查不加载: 命中返回共享视图，未命中 / 已过期返回 None (按块批量加载的调用方先查再一次性补齐)"""
+    with perf_monitor.stage("shared_cache", kind=str(key[0])) as s:
+        with _lock:
+            entry = _entries.get(key)
+            hit = entry is not None and (entry[2] is None or entry[2] > time.monotonic())
+            if hit:
+                _entries.move_to_end(key)
+                _stats['hits'] += 1
+            else:
+                _stats['misses'] += 1
+        s.cache(hit)
+    return _share(entry[0]) if hit else None
+
+
+def put(key, value, ttl=DEFAULT_TTL):
+    """直接放入一个结果 (与 get 配合使用)；空结果不缓存"""
+    if _cacheable(value):
+        with _lock:
+            _store(key, value, ttl)
+    return _share(value)
+
+
+def download(tickers, ttl=None, **kwargs):
+    """共享的 yf.download (经 market_data，可录制 / 回放)；参数与 yf.download 相同。period='5d' 这类实时报价用较短的有效期"""
+    key_tickers = tuple(tickers) if isinstance(tickers, (list, tuple)) else tickers
+    key = ('yf.download', key_tickers, tuple(sorted((k, str(v)) for k, v in kwargs.items())))
+    if ttl is None:
+        ttl = LIVE_TTL if kwargs.get('period') in ('1d', '5d') else DEFAULT_TTL
+
+    def load():
+        with perf_monitor.stage("yf.download", tickers=len(key_tickers) if isinstance(key_tickers, tuple) else 1,
+                                **{k: str(v) for k, v in kwargs.items() if k in ('period', 'start', 'end')}) as s:
+            return s.set_frame(market_data.download(tickers, progress=False, **kwargs))
+
+    return get_or_load(key, load, ttl)
+
+
+def stats():
+    """命中 / 未命中 / 等待 / 淘汰次数，当前条目数和占用内存 (MB)"""
+    with _lock:
+        out = dict(_stats, entries=len(_entries), inflight=len(_inflight))
+    out['mb'] = out.pop('bytes') / 1024 / 1024
+    return out
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _stats['bytes'] = 0
@@ -0,0 +1,188 @@
+"""持仓批次 (tax lot) 核算: 买入 / 卖出 / 手续费，FIFO / LIFO / 平均成本，已实现与未实现盈亏
+
+账本约定 (portfolio_store / trade_log.xlsx):
+    买入: Shares > 0，Cost_CNY > 0 (投入的人民币)
+    卖出: Shares < 0，Cost_CNY < 0 (收回的人民币)
+    Fee_CNY: 手续费 (>= 0)，买入时计入该批次成本，卖出时从收回金额里扣除
+这样 Shares 直接求和就是当前持仓，-Cost_CNY 直接就是 XIRR 的现金流，老代码不用区分买卖。
+
+每个 Ticker 一个批次队列 (deque): 每个批次只入队一次、最多出队一次，整本账 O(交易数)；
+LotBook.append 增量追加时只处理涉及到的 Ticker，补录的更早日期的交易只重放那一个 Ticker。
+"""
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# --- 配置区域 ---
+METHODS = ('fifo', 'lifo', 'average')
+METHOD_NAMES = {'fifo': '先进先出 (FIFO)', 'lifo': '后进先出 (LIFO)', 'average': '平均成本'}
+EPS = 1e-9  # 份额小于它视为已经卖完 (浮点误差)
+REALIZED_COLS = ['Date', 'Ticker', 'Shares', 'Proceeds', 'Cost_Basis', 'Realized_PnL', 'Holding_Days']
+
+
+def _to_date(days):
+    """天数 (int 或数组) -> 日期"""
+    if np.ndim(days) == 0:
+        return pd.Timestamp(np.datetime64(int(days), 'D')).date()
+    return pd.to_datetime(np.asarray(days, dtype='datetime64[D]'))
+
+
+class LotBook:
+    """按 Ticker 分开的持仓批次；lots[ticker] 为 deque([买入日期, 剩余份额, 剩余成本])
+
+    日期在内部用 1970-01-01 起的天数 (int) 表示，逐笔处理时不用构造 Timestamp。
+    """
+
+    def __init__(self, method='fifo', cost_col='Cost_CNY', fee_col='Fee_CNY'):
+        if method not in METHODS:
+            raise ValueError(f"未知的成本计算方法: {method} (可选 {', '.join(METHODS)})")
+        self.method = method
+        self.cost_col = cost_col
+        self.fee_col = fee_col
+        self.lots = {}
+        self.realized = {}  # ticker -> [(日期, 份额, 收回金额, 成本, 已实现盈亏, 持有天数), ...]
+        self.invested = {}  # ticker -> 累计买入成本 (含手续费)
+        self.held = {}  # ticker -> 当前持仓份额 (卖出前检查用，不用每次遍历批次)
+        self._history = {}  # ticker -> 已处理的交易 (补录更早的交易时重放用)
+
+    # --- 输入 ---
+    def _rows(self, trades):
+        """DataFrame -> 按 (日期, id) 排序的 (ticker, date, shares, cost, fee) 元组列表"""
+        if trades.empty:
+            return []
+        order = ['Date', 'id'] if 'id' in trades.columns else ['Date']
+        trades = trades.sort_values(order, kind='stable')
+        fee = trades[self.fee_col].fillna(0.0) if self.fee_col in trades.columns else pd.Series(0.0, trades.index)
+        dates = trades['Date']
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates)
+        days = dates.to_numpy('datetime64[D]').astype(np.int64)
+        return list(zip(trades['Ticker'].tolist(), days.tolist(),
+                        trades['Shares'].astype(float).tolist(), trades[self.cost_col].astype(float).tolist(),
+                        fee.astype(float).tolist()))
+
+    def append(self, trades):
+        """追加交易 (DataFrame)；只有涉及到的 Ticker 会被处理，返回受影响的 Ticker 列表"""
+        by_ticker = {}
+        for row in self._rows(trades):
+            by_ticker.setdefault(row[0], []).append(row)
+        for ticker, rows in by_ticker.items():
+            history = self._history.setdefault(ticker, [])
+            if history and rows[0][1] < history[-1][1]:
+                # 补录了更早日期的交易: 这个 Ticker 整段重放 (其他 Ticker 不受影响)
+                rows = sorted(history + rows, key=lambda r: r[1])
+                self._reset(ticker)
+                history = self._history[ticker] = []
+            for row in rows:
+                self._apply(*row)
+            history.extend(rows)
+        return list(by_ticker)
+
+    def _reset(self, ticker):
+        self.lots.pop(ticker, None)
+        self.realized.pop(ticker, None)
+        self.invested.pop(ticker, None)
+        self.held.pop(ticker, None)
+
+    def _apply(self, ticker, date, shares, cost, fee):
+        lots = self.lots.get(ticker)
+        if lots is None:
+            lots = self.lots[ticker] = deque()
+        if cost != cost:  # NaN
+            raise ValueError(f"{ticker} {_to_date(date)} 的交易缺少金额 ({self.cost_col})")
+        if shares > 0:
+            lot_cost = abs(cost) + fee
+            self.invested[ticker] = self.invested.get(ticker, 0.0) + lot_cost
+            self.held[ticker] = self.held.get(ticker, 0.0) + shares
+            if self.method == 'average' and lots:
+                lots[0][1] += shares
+                lots[0][2] += lot_cost
+            else:
+                lots.append([date, shares, lot_cost])
+            return
+        if shares == 0:
+            return
+
+        qty = -shares
+        proceeds = abs(cost) - fee
+        held = self.held.get(ticker, 0.0)
+        if qty > held + EPS:
+            raise ValueError(f"{ticker} {_to_date(date)} 卖出 {qty:.6g} 份，超过当时持仓 {held:.6g} 份")
+        self.held[ticker] = held - qty
+        basis, days = 0.0, 0.0
+        remaining = qty
+        pop = lots.pop if self.method == 'lifo' else lots.popleft
+        while remaining > EPS and lots:
+            lot = lots[-1] if self.method == 'lifo' else lots[0]
+            take = min(remaining, lot[1])
+            part = lot[2] * take / lot[1]
+            basis += part
+            days += (date - lot[0]) * take
+            lot[1] -= take
+            lot[2] -= part
+            remaining -= take
+            if lot[1] <= EPS:
+                pop()
+        pnl = proceeds - basis
+        self.realized.setdefault(ticker, []).append((date, qty, proceeds, basis, pnl, days / qty))
+
+    # --- 输出 ---
+    def positions(self):
+        """当前持仓: Shares / Cost_Basis (剩余批次成本) / Avg_Cost / Invested (累计买入) / Realized_PnL"""
+        tickers = sorted(set(self.lots) | set(self.realized))
+        rows = []
+        for t in tickers:
+            lots = self.lots.get(t, ())
+            shares = sum(lot[1] for lot in lots)
+            basis = sum(lot[2] for lot in lots)
+            realized = sum(r[4] for r in self.realized.get(t, ()))
+            rows.append((t, shares, basis, basis / shares if shares > EPS else np.nan,
+                         self.invested.get(t, 0.0), realized))
+        out = pd.DataFrame(rows, columns=['Ticker', 'Shares', 'Cost_Basis', 'Avg_Cost', 'Invested', 'Realized_PnL'])
+        return out.set_index('Ticker')
+
+    def realized_frame(self):
+        """每笔卖出的已实现盈亏 (按日期排序)"""
+        rows = [(r[0], t, *r[1:]) for t, items in self.realized.items() for r in items]
+        out = pd.DataFrame(rows, columns=REALIZED_COLS)
+        out['Date'] = _to_date(out['Date'].to_numpy(np.int64))
+        return out.sort_values('Date', kind='stable').reset_index(drop=True)
+
+    def open_lots(self):
+        """尚未卖出的批次 (平均成本法下每个 Ticker 只有一个合并批次)"""
+        rows = [(t, lot[0], lot[1], lot[2]) for t, lots in self.lots.items() for lot in lots if lot[1] > EPS]
+        out = pd.DataFrame(rows, columns=['Ticker', 'Date', 'Shares', 'Cost'])
+        out['Date'] = _to_date(out['Date'].to_numpy(np.int64))
+        return out
+
+
+def build(trades, method='fifo', cost_col='Cost_CNY', fee_col='Fee_CNY'):
+    """一次性处理整本账"""
+    book = LotBook(method, cost_col, fee_col)
+    book.append(trades)
+    return book
+
+
+def summarize(trades, method='fifo', cost_col='Cost_CNY', fee_col='Fee_CNY'):
+    """只需要持仓汇总 (LotBook.positions 的格式) 时用: 没有卖出的账本不用逐笔匹配批次，直接 groupby"""
+    if (trades['Shares'] < 0).any():
+        return build(trades, method, cost_col, fee_col).positions()
+    fee = trades[fee_col].fillna(0.0) if fee_col in trades.columns else 0.0
+    out = trades.assign(_cost=trades[cost_col] + fee).groupby('Ticker').agg(
+        Shares=('Shares', 'sum'), Cost_Basis=('_cost', 'sum'))
+    if out['Cost_Basis'].isna().any():
+        raise ValueError(f"有交易缺少金额 ({cost_col})")
+    out['Avg_Cost'] = (out['Cost_Basis'] / out['Shares']).where(out['Shares'] > EPS)
+    out['Invested'] = out['Cost_Basis']
+    out['Realized_PnL'] = 0.0
+    return out
+
+
+def unrealized(positions, prices, rate=1.0):
+    """按最新价格 (× 汇率) 计算未实现盈亏；没有价格的持仓 Market_Value 为 NaN"""
+    out = positions.copy()
+    out['Price'] = pd.Series(prices, dtype=float).reindex(out.index)
+    out['Market_Value'] = out['Shares'] * out['Price'] * rate
+    out['Unrealized_PnL'] = out['Market_Value'] - out['Cost_Basis']
+    return out
@@ -0,0 +1,224 @@
+"""预测准确度的 walk-forward 回测
+
+在历史上选若干个 "预测起点" (cutoff)，每个起点只用它之前的数据训练，预测之后 horizon 天，再和真实价格比较:
+- 训练数据来自 price_store 的本地日线 (只读一次，各折切片复用)
+- 各折在进程池里并行跑 (Prophet 单折要几秒，快速引擎单进程就够)
+- 每折结果按 "Ticker + 引擎 + 参数 + cutoff + 数据指纹" 缓存到 parquet，加折数重跑时只算新增的折
+- 每算完一折调用 progress(已完成, 总数)；progress 抛出异常 (例如后台任务被取消) 时不再开始新的折，
+  已算完的折照样写入缓存
+- 汇总每个预测步长的 MAPE 和区间覆盖率 (实际价格落在 yhat_lower~yhat_upper 的比例，80% 区间理想值为 0.8)
+
+命令行: python walk_forward.py BTC-USD ^GSPC --engine holt_winters --folds 20
+"""
+import argparse
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import fast_forecast
+import perf_monitor
+import price_store
+from shared_cache import fingerprint
+from indicators import prepare_prophet_frame
+
+# --- 配置区域 ---
+CACHE_DIR = os.path.join(price_store.STORE_DIR, "walk_forward")
+ENGINES = fast_forecast.METHODS + ('prophet',)
+HORIZON_BUCKETS = [1, 7, 14, 30, 60, 90, 180, 365]  # 汇总时的步长分段 (天)
+FOLD_COLS = ['key', 'cutoff', 'ds', 'h', 'y', 'yhat', 'yhat_lower', 'yhat_upper']
+
+_file_lock = threading.Lock()
+
+
+def _cache_path(ticker, engine):
+    safe = ticker.replace('^', '_').replace('=', '_').replace('/', '_')
+    return os.path.join(CACHE_DIR, f"{safe}_{engine}.parquet")
+
+
+def _read_cache(ticker, engine):
+    path = _cache_path(ticker, engine)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=FOLD_COLS)
+    return pd.read_parquet(path)
+
+
+def _append_cache(ticker, engine, new_rows):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with _file_lock:
+        merged = pd.concat([_read_cache(ticker, engine), new_rows], ignore_index=True)
+        merged = merged.drop_duplicates(subset=['key', 'ds'], keep='last')
+        path = _cache_path(ticker, engine)
+        merged.to_parquet(path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+
+def fold_cutoffs(last_date, n_folds, horizon, step):
+    """从最近一次能完整验证 horizon 天的起点开始，每隔 step 天往前取一个 cutoff (由远到近排列)
+
+    cutoff 对齐到 step 天的固定网格上，第二天有新数据时已有的折不会整体平移，缓存仍然命中。
+    """
+    newest = pd.Timestamp(last_date).normalize() - pd.Timedelta(days=horizon)
+    newest -= pd.Timedelta(days=(newest - pd.Timestamp(0)).days % step)
+    return [newest - pd.Timedelta(days=step * k) for k in range(n_folds)][::-1]
+
+
+def _fit_predict(df_train, horizon, engine):
+    if engine == 'prophet':
+        from prophet import Prophet
+
+        model = Prophet(daily_seasonality=True)
+        model.fit(df_train)
+        return model.predict(model.make_future_dataframe(periods=horizon))
+    return fast_forecast.forecast(df_train, horizon, method=engine)
+
+
+def _run_fold(key, df_train, actual, horizon, engine):
+    """单折: 训练 -> 预测 -> 与实际值对齐 (在子进程里执行，参数和返回值都要能 pickle)"""
+    forecast = _fit_predict(df_train, horizon, engine)
+    cutoff = df_train['ds'].iloc[-1]
+    out = forecast[forecast['ds'] > cutoff].merge(actual, on='ds', how='inner')
+    out = out[['ds', 'y', 'yhat', 'yhat_lower', 'yhat_upper']].copy()
+    out.insert(0, 'h', (out['ds'] - cutoff).dt.days)
+    out.insert(0, 'cutoff', cutoff)
+    out.insert(0, 'key', key)
+    return out
+
+
+def _prepare_folds(ticker, daily, engine, n_folds, horizon, step, train_years):
+    """把每一折切好 (训练窗口 + 验证窗口)，并算出缓存 key"""
+    frame = prepare_prophet_frame(daily)
+    folds = []
+    for cutoff in fold_cutoffs(frame['ds'].iloc[-1], n_folds, horizon, step):
+        start = cutoff - pd.DateOffset(years=train_years)
+        train = frame[(frame['ds'] > start) & (frame['ds'] <= cutoff)].reset_index(drop=True)
+        actual = frame[(frame['ds'] > cutoff) & (frame['ds'] <= cutoff + pd.Timedelta(days=horizon))]
+        if len(train) < 30 or actual.empty:
+            continue
+        # 数据指纹保证: 历史被复权 / 重建后，旧的折结果自动失效
+        window = frame[(frame['ds'] > start) & (frame['ds'] <= cutoff + pd.Timedelta(days=horizon))]
+        key = f"{engine}|{train_years}y|h{horizon}|{cutoff.date()}|{fingerprint(window.set_index('ds'))}"
+        folds.append((key, train, actual.reset_index(drop=True)))
+    return folds
+
+
+def backtest(ticker, engine='fourier', n_folds=10, horizon=30, step=7, train_years=2, max_workers=None,
+             progress=None):
+    """单个 Ticker 的 walk-forward 回测，返回每折每天的预测 vs 实际 (只计算缓存里没有的折)"""
+    if engine not in ENGINES:
+        raise ValueError(f"未知的预测引擎: {engine} (可选 {', '.join(ENGINES)})")
+    daily = price_store.load_bars(ticker, 'max', resolution='1d')
+    if daily.empty:
+        return pd.DataFrame(columns=FOLD_COLS)
+
+    folds = _prepare_folds(ticker, daily, engine, n_folds, horizon, step, train_years)
+    cached = _read_cache(ticker, engine)
+    done = set(cached['key'])
+    todo = [f for f in folds if f[0] not in done]
+    if progress:
+        progress(len(folds) - len(todo), len(folds))
+
+    with perf_monitor.stage("walk_forward.folds", ticker=ticker, engine=engine,
+                            folds=len(folds), computed=len(todo)) as s:
+        s.cache(not todo)
+        if max_workers is None:
+            # 快速引擎单折只要几十毫秒，进程池的启动开销反而更大
+            max_workers = os.cpu_count() if engine == 'prophet' else 1
+        args = [(key, train, actual, horizon, engine) for key, train, actual in todo]
+        results = []
+        try:
+            if max_workers > 1 and len(args) > 1:
+                pool = ProcessPoolExecutor(max_workers=min(max_workers, len(args)))
+                futures = [pool.submit(_run_fold, *a) for a in args]
+                collected = set()
+                try:
+                    for future in as_completed(futures):
+                        collected.add(future)
+                        results.append(future.result())
+                        if progress:
+                            progress(len(folds) - len(todo) + len(results), len(folds))
+                finally:
+                    pool.shutdown(wait=True, cancel_futures=True)  # 中途退出时还没开始的折直接丢弃
+                    # 退出时正在跑的折会等它们算完，结果一并写入缓存
+                    for future in futures:
+                        if future not in collected and future.done() and not future.cancelled() \
+                                and future.exception() is None:
+                            results.append(future.result())
+            else:
+                for a in args:
+                    results.append(_run_fold(*a))
+                    if progress:
+                        progress(len(folds) - len(todo) + len(results), len(folds))
+        finally:
+            if results:
+                _append_cache(ticker, engine, pd.concat(results, ignore_index=True))
+        if results:
+            cached = _read_cache(ticker, engine)
+
+    keys = [f[0] for f in folds]
+    out = cached[cached['key'].isin(keys)].sort_values(['cutoff', 'ds']).reset_index(drop=True)
+    out.insert(0, 'Ticker', ticker)
+    return out
+
+
+def summarize(folds, buckets=None):
+    """按预测步长分段汇总: MAPE / 区间覆盖率 / 样本数，每个 Ticker 一组"""
+    buckets = [b for b in (buckets or HORIZON_BUCKETS) if b <= folds['h'].max()] if not folds.empty else []
+    if not buckets:
+        return pd.DataFrame(columns=['Ticker', 'horizon', 'MAPE', 'coverage', 'folds', 'n'])
+    edges = [0] + buckets
+    labels = [f"{lo + 1}-{hi}天" if hi > lo + 1 else f"{hi}天" for lo, hi in zip(edges[:-1], edges[1:])]
+    f = folds.assign(
+        horizon=pd.cut(folds['h'], bins=edges, labels=labels),
+        ape=(folds['yhat'] - folds['y']).abs() / folds['y'].abs(),
+        covered=(folds['y'] >= folds['yhat_lower']) & (folds['y'] <= folds['yhat_upper']),
+    ).dropna(subset=['horizon'])
+    summary = f.groupby(['Ticker', 'horizon'], observed=True).agg(
+        MAPE=('ape', 'mean'), coverage=('covered', 'mean'), folds=('cutoff', 'nunique'), n=('ape', 'size'))
+    return summary.reset_index()
+
+
+def evaluate(tickers, engine='fourier', n_folds=10, horizon=30, step=7, train_years=2, max_workers=None,
+             progress=None):
+    """整个观察列表的回测，返回 (逐日明细, 分段汇总)；progress(比例 0~1, 说明) 按折汇报整体进度"""
+    if isinstance(tickers, str):
+        tickers = [tickers]
+    frames = []
+    for i, t in enumerate(tickers):
+        step_progress = None
+        if progress:
+            def step_progress(done, total, i=i, t=t):
+                progress((i + done / max(total, 1)) / len(tickers), f"{t}: 已完成 {done}/{total} 折")
+        frames.append(backtest(t, engine, n_folds, horizon, step, train_years, max_workers, step_progress))
+    folds = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['Ticker'] + FOLD_COLS)
+    return folds, summarize(folds)
+
+
+def evaluate_job(job, tickers, engine='fourier', n_folds=10, horizon=30, step=7, train_years=2, max_workers=None):
+    """evaluate 的后台任务版本 (job_runner.submit 用): 进度写到 job 上，job 被取消时停在下一折之前"""
+    return evaluate(tickers, engine, n_folds, horizon, step, train_years, max_workers, progress=job.report)
+
+
+def error_by_day(folds):
+    """每个步长 (天) 的 MAPE，用于画误差随预测距离增长的曲线"""
+    ape = (folds['yhat'] - folds['y']).abs() / folds['y'].abs()
+    return ape.groupby([folds['Ticker'], folds['h']]).mean().unstack(0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="预测准确度 walk-forward 回测")
+    parser.add_argument("tickers", nargs="+")
+    parser.add_argument("--engine", default="fourier", choices=ENGINES)
+    parser.add_argument("--folds", type=int, default=10)
+    parser.add_argument("--horizon", type=int, default=30)
+    parser.add_argument("--step", type=int, default=7)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=None)
+    a = parser.parse_args()
+
+    _, table = evaluate(a.tickers, a.engine, a.folds, a.horizon, a.step, a.years, a.workers)
+    with pd.option_context('display.float_format', '{:.2%}'.format, 'display.width', 120):
+        print(table.to_string(index=False))
+    print(f"\n理想覆盖率: {fast_forecast.INTERVAL_WIDTH:.0%} (区间宽度)")
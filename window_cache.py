@@ -0,0 +1,96 @@
+"""长历史趋势图的按窗口懒加载
+
+"max" 周期原本要先把整段日线 (^GSPC 约 25k 根) 读进来、算复权、再降采样。这里改为只读当前可见窗口:
+- 历史按日历年切成块 (日线每块 1 年，周线 10 年，月线 100 年)，块从 price_store 按 row group 读取
+- 块放在 shared_cache (有内存上限、LRU 淘汰)；key 带数据版本，只有包含最新几天的块会随增量更新失效
+- 窗口两侧各多取 MARGIN 倍窗口长度的数据: 图上左右拖动时这部分已经在图里，拖到更远处时相邻的块多半已在缓存中
+
+返回的 K 线与 load_bars 的列相同，但不含 Adj Close (趋势图只用价格口径)。
+"""
+import pandas as pd
+
+import price_store
+import shared_cache
+
+# --- 配置区域 ---
+BLOCK_YEARS = {'1d': 1, '1wk': 10, '1mo': 100}  # 每块覆盖的年数
+MARGIN = 0.5  # 窗口两侧各多取的比例
+DEFAULT_WINDOW_YEARS = 3  # 第一次打开时显示最近几年
+
+
+def default_window(first, last, years=DEFAULT_WINDOW_YEARS):
+    """默认可见窗口: 最近 years 年 (历史更短时为整段)"""
+    return max(first, last - pd.DateOffset(years=years)), last
+
+
+def pick_resolution(meta, first, last, start, end):
+    """按窗口长度和该 Ticker 的日线密度 (股票约 0.69 根/天，加密货币 1 根/天) 选分辨率"""
+    density = meta['rows'] / max((last - first).days, 1) if meta.get('rows') else 1.0
+    return price_store.pick_resolution(int((end - start).days * density))
+
+
+def _block_bounds(block, resolution):
+    years = BLOCK_YEARS[resolution]
+    lo = pd.Timestamp(year=max(block * years, 1), month=1, day=1)
+    return lo, lo + pd.DateOffset(years=years)
+
+
+def _block_key(ticker, resolution, block, meta):
+    """块的缓存 key: 历史被整段改写 (history_at) 或块内包含最近更新的几天 (last) 时会变"""
+    _, hi = _block_bounds(block, resolution)
+    last = pd.Timestamp(meta.get('last', '1970-01-01'))
+    recent = hi > last - pd.Timedelta(days=price_store.OVERLAP_DAYS)
+    return ('window', ticker, resolution, block, meta.get('history_at'), meta.get('last') if recent else None)
+
+
+def _blocks(ticker, resolution, blocks, meta):
+    """取出这些块: 先查 shared_cache，缺的块合并成一次 read_window 读出来再按块拆开放回缓存"""
+    keys = {b: _block_key(ticker, resolution, b, meta) for b in blocks}
+    found = {b: shared_cache.get(k) for b, k in keys.items()}
+    missing = [b for b, v in found.items() if v is None]
+    if missing:
+        lo, _ = _block_bounds(missing[0], resolution)
+        _, hi = _block_bounds(missing[-1], resolution)
+        frame = price_store.read_window(ticker, lo, hi, resolution)
+        if frame is not None:
+            block_of = frame.index.year // BLOCK_YEARS[resolution]
+            for b in missing:
+                found[b] = shared_cache.put(keys[b], frame[block_of == b], ttl=price_store.REFRESH_SECONDS)
+    return [found[b] for b in blocks]
+
+
+def load_window(ticker, start=None, end=None, resolution='auto', margin=MARGIN, refresh=True):
+    """读取 [start, end] 可见窗口 (两侧各加 margin 倍窗口长度) 的 K 线
+
+    start / end 缺省为 default_window。返回的 DataFrame attrs 中:
+    resolution = 实际分辨率，window = 可见窗口 (start, end)，history = 整段历史的 (第一根, 最后一根)。
+    """
+    meta = price_store.ensure_fresh(ticker) if refresh else price_store.ticker_meta(ticker)
+    bounds = price_store.history_range(ticker)
+    if bounds is None:
+        return pd.DataFrame()
+    first, last = bounds
+    if start is None or end is None:
+        start, end = default_window(first, last)
+    start, end = max(pd.Timestamp(start), first), min(pd.Timestamp(end), last)
+    if start > end:
+        raise ValueError(f"窗口起点 {start.date()} 晚于终点 {end.date()}")
+    if resolution == 'auto':
+        resolution = pick_resolution(meta, first, last, start, end)
+
+    pad = (end - start) * margin
+    lo, hi = max(start - pad, first), min(end + pad, last)
+    years = BLOCK_YEARS[resolution]
+    parts = _blocks(ticker, resolution, list(range(lo.year // years, hi.year // years + 1)), meta)
+    parts = [p for p in parts if p is not None and not p.empty]
+    if not parts:
+        return pd.DataFrame()
+    bars = pd.concat(parts) if len(parts) > 1 else parts[0]
+    bars = bars[(bars.index >= lo) & (bars.index <= hi)]
+    bars.attrs.update(resolution=resolution, window=(start, end), history=(first, last))
+    return bars
+
+
+def load_full(ticker, refresh=True):
+    """整段历史 (分辨率按长度自动选择，长历史通常为月线)：只读对应分辨率的块，不把整段日线读进来再降采样"""
+    return load_window(ticker, pd.Timestamp.min, pd.Timestamp.max, margin=0, refresh=refresh)
@@ -0,0 +1,203 @@
+"""XIRR / XNPV 批量求解器
+
+一次求解很多条现金流序列 (每个 Ticker、每个月末、每个回测情景...)，全部向量化:
+- 以 x = ln(1 + r) 为变量，NPV(x) = Σ A·e^(-t·x) 是光滑的单调性较好的函数，r 接近 -100% 时也不会数值爆炸
+- 先在网格上同时找出所有序列的变号区间 (bracket)，再做带保护的 Newton 迭代，跳出区间时退回二分法
+- 不再静默返回 0：每条序列都有 converged / iterations / npv / status 诊断信息
+
+status 取值: ok / max_iter (迭代次数用完) / no_sign_change (现金流全同号，无解) / no_bracket (找不到变号区间) / empty
+"""
+import numpy as np
+import pandas as pd
+
+DAYS_PER_YEAR = 365.0
+# x = ln(1+r) 的搜索网格: r 从无限接近 -100% (短期内大亏时年化会非常极端) 到约 +326 万%
+X_GRID = np.concatenate([-np.geomspace(300, 3, 14), np.linspace(-2.5, 2.5, 41), np.linspace(3, 15, 7)])
+_MAX_EXP = 700.0  # e^700 仍是有限浮点数
+
+
+def _pad(flows, series_col, date_col, amount_col):
+    """长表 -> 对齐的二维数组 (每行一条序列，短的序列用 0 补齐)"""
+    flows = flows[[series_col, date_col, amount_col]].dropna(subset=[date_col, amount_col])
+    keys, codes = np.unique(flows[series_col].to_numpy(), return_inverse=True)
+    dates = pd.to_datetime(flows[date_col]).dt.normalize().to_numpy('datetime64[D]')
+    amounts = flows[amount_col].to_numpy(dtype=float)
+
+    order = np.argsort(codes, kind='stable')
+    codes, dates, amounts = codes[order], dates[order], amounts[order]
+    counts = np.bincount(codes, minlength=len(keys))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    pos = np.arange(len(codes)) - starts[codes]
+
+    n, m = len(keys), int(counts.max()) if len(counts) else 0
+    A = np.zeros((n, m))
+    T = np.zeros((n, m))
+    A[codes, pos] = amounts
+
+    # 时间 = 距离本序列最后一笔现金流的年数 (<= 0)；以最后一笔为基准等价于整体乘一个正数，不改变根
+    day_num = dates.astype(np.int64).astype(float)
+    last = np.full(n, -np.inf)
+    np.maximum.at(last, codes, day_num)
+    T[codes, pos] = (day_num - last[codes]) / DAYS_PER_YEAR
+    return keys, A, T
+
+
+def _npv_x(x, A, T):
+    """归一化 NPV 及其对 x 的导数: g(x) = Σ A·e^(-T·x)，T <= 0"""
+    e = np.exp(np.minimum(-T * x[:, None], _MAX_EXP))
+    g = (A * e).sum(axis=1)
+    dg = (-T * A * e).sum(axis=1)
+    return g, dg
+
+
+def _initial_guess(A, T):
+    """简单收益率按资金加权久期年化，作为 Newton 初值"""
+    inflow = np.where(A > 0, A, 0).sum(axis=1)
+    outflow = -np.where(A < 0, A, 0).sum(axis=1)
+    duration = np.where(A < 0, -A * -T, 0).sum(axis=1) / np.where(outflow > 0, outflow, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x0 = np.log(inflow / outflow) / np.maximum(duration, 1 / DAYS_PER_YEAR)
+    return np.clip(np.nan_to_num(x0, nan=0.0, posinf=X_GRID[-1], neginf=X_GRID[0]), X_GRID[0], X_GRID[-1])
+
+
+def _solve(A, T, guess=None, tol=1e-10, max_iter=100):
+    n = A.shape[0]
+    rate = np.full(n, np.nan)
+    converged = np.zeros(n, dtype=bool)
+    iterations = np.zeros(n, dtype=int)
+    npv = np.full(n, np.nan)
+    status = np.full(n, 'no_bracket', dtype=object)
+    if n == 0:
+        return rate, converged, iterations, npv, status
+
+    has_pos = (A > 0).any(axis=1)
+    has_neg = (A < 0).any(axis=1)
+    status[~(has_pos & has_neg)] = 'no_sign_change'
+    status[~(A != 0).any(axis=1)] = 'empty'
+
+    x0 = _initial_guess(A, T) if guess is None else np.broadcast_to(np.log1p(np.asarray(guess, float)), n).copy()
+
+    # 1. 在网格上同时寻找变号区间，多个根时取离初值最近的一个
+    G = np.stack([_npv_x(np.full(n, xg), A, T)[0] for xg in X_GRID], axis=1)
+    sign_change = np.sign(G[:, :-1]) * np.sign(G[:, 1:]) <= 0
+    mid = (X_GRID[:-1] + X_GRID[1:]) / 2
+    dist = np.where(sign_change, np.abs(mid[None, :] - x0[:, None]), np.inf)
+    k = dist.argmin(axis=1)
+    active = np.isfinite(dist[np.arange(n), k]) & has_pos & has_neg
+
+    lo, hi = X_GRID[k], X_GRID[k + 1]
+    g_lo = G[np.arange(n), k]
+    x = np.clip(x0, lo, hi)
+    scale = np.abs(A).sum(axis=1)
+    scale[scale == 0] = 1.0
+
+    # 2. 带保护的 Newton：只迭代尚未收敛的序列
+    for it in range(1, max_iter + 1):
+        idx = np.flatnonzero(active & ~converged)
+        if idx.size == 0:
+            break
+        g, dg = _npv_x(x[idx], A[idx], T[idx])
+        iterations[idx] = it
+
+        done = np.abs(g) <= tol * scale[idx]
+        same = np.sign(g) == np.sign(g_lo[idx])
+        lo[idx] = np.where(same, x[idx], lo[idx])
+        g_lo[idx] = np.where(same, g, g_lo[idx])
+        hi[idx] = np.where(same, hi[idx], x[idx])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = x[idx] - g / dg
+        bad = ~np.isfinite(step) | (step <= lo[idx]) | (step >= hi[idx])
+        x_new = np.where(bad, (lo[idx] + hi[idx]) / 2, step)
+        done |= np.abs(x_new - x[idx]) <= 1e-14 * np.maximum(1.0, np.abs(x[idx]))
+        x[idx] = np.where(done, x[idx], x_new)
+        converged[idx] = done
+
+    g, _ = _npv_x(x, A, T)
+    rate[active] = np.expm1(x[active])
+    npv[active] = g[active]
+    status[active & converged] = 'ok'
+    status[active & ~converged] = 'max_iter'
+    return rate, converged, iterations, npv, status
+
+
+def xirr_batch(flows, series_col='Series', date_col='Date', amount_col='Amount', guess=None,
+               tol=1e-10, max_iter=100):
+    """批量 XIRR：flows 为长表 (序列键 / 日期 / 金额)，投入为负、收回为正
+
+    返回以序列键为索引的 DataFrame: rate (小数, 0.1 = 10%) / converged / iterations / npv / status。
+    """
+    keys, A, T = _pad(flows, series_col, date_col, amount_col)
+    rate, converged, iterations, npv, status = _solve(A, T, guess, tol, max_iter)
+    return pd.DataFrame({
+        'rate': rate, 'converged': converged, 'iterations': iterations, 'npv': npv, 'status': status,
+    }, index=pd.Index(keys, name=series_col))
+
+
+def xirr(dates, amounts, guess=None):
+    """单条现金流的 XIRR，返回带诊断信息的 Series (rate / converged / iterations / npv / status)"""
+    flows = pd.DataFrame({'Series': 0, 'Date': list(dates), 'Amount': list(amounts)})
+    return xirr_batch(flows, guess=guess).iloc[0]
+
+
+def xnpv(rate, dates, amounts):
+    """XNPV: 以第一笔现金流日期为基准折现"""
+    dates = pd.to_datetime(pd.Series(list(dates))).dt.normalize()
+    years = (dates - dates.min()).dt.days.to_numpy() / DAYS_PER_YEAR
+    return float((np.asarray(list(amounts), float) / (1 + rate) ** years).sum())
+
+
+# --- 时间序列: XIRR 随时间的演变 ---
+def holdings_value_curve(trades, prices, fx=None):
+    """每天的持仓市值 (CNY)：累计份额 × 收盘价 × 汇率
+
+    trades: Date / Ticker / Shares；prices: 以日期为索引、Ticker 为列的收盘价面板 (USD)；
+    fx: 以日期为索引的 USD/CNY 汇率 Series 或常数，缺省为 1。
+    """
+    shares = trades.pivot_table(index='Date', columns='Ticker', values='Shares', aggfunc='sum')
+    shares.index = pd.to_datetime(shares.index).normalize()
+    prices = prices.sort_index().ffill()
+    shares = shares.reindex(prices.index.union(shares.index)).fillna(0).cumsum().reindex(prices.index)
+    shares = shares.reindex(columns=prices.columns, fill_value=0)
+    value = (shares * prices).sum(axis=1, min_count=1)
+    if fx is None:
+        return value
+    if isinstance(fx, pd.Series):
+        fx = fx.sort_index().reindex(prices.index, method='ffill').bfill()
+    return value * fx
+
+
+def xirr_curve(trades, value_curve, freq='ME'):
+    """一次调用算出每个月末 (或其他频率) 的累计 XIRR 曲线
+
+    trades: Date / Cost_CNY (投入记为正数)；value_curve: holdings_value_curve 的结果。
+    每个观察日 d 的现金流 = d 之前的全部投入 (负) + d 当天的持仓市值 (正)，所有观察日一起批量求解。
+    """
+    trades = trades.assign(Date=pd.to_datetime(trades['Date']).dt.normalize()).sort_values('Date')
+    value_curve = value_curve.dropna()
+    obs = value_curve.resample(freq).last().dropna()
+    obs = obs[obs.index >= trades['Date'].iloc[0]]
+    # resample 的标签是自然月末，换成当月最后一个有数据的日期
+    obs.index = value_curve.index[value_curve.index.searchsorted(obs.index, side='right') - 1]
+
+    obs_dates = obs.index.to_numpy()
+    n_trades = trades['Date'].searchsorted(obs_dates, side='right')
+    series = np.repeat(np.arange(len(obs)), n_trades)
+    trade_pos = np.concatenate([np.arange(k) for k in n_trades]) if len(obs) else np.array([], int)
+
+    flows = pd.concat([
+        pd.DataFrame({'Series': series,
+                      'Date': trades['Date'].to_numpy()[trade_pos],
+                      'Amount': -trades['Cost_CNY'].to_numpy(dtype=float)[trade_pos]}),
+        pd.DataFrame({'Series': np.arange(len(obs)), 'Date': obs_dates, 'Amount': obs.to_numpy()}),
+    ], ignore_index=True)
+    result = xirr_batch(flows)
+
+    invested = trades['Cost_CNY'].cumsum().to_numpy()[n_trades - 1]
+    return pd.DataFrame({
+        'value': obs.to_numpy(),
+        'invested': invested,
+        'xirr': result['rate'].to_numpy(),
+        'converged': result['converged'].to_numpy(),
+        'status': result['status'].to_numpy(),
+    }, index=pd.Index(obs.index, name='Date'))